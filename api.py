@@ -1,15 +1,33 @@
 """
 FastAPI REST API 服务
+
+启动时只创建轻量对象即开始服务，知识库与模型在后台预热：
+/livez 表示进程存活，/readyz 在预热完成后才返回200。
 """
+import asyncio
+import hmac
+import json
 import os
+import time
 from typing import Optional, List
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+
+_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import Depends, FastAPI, Header, HTTPException
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from contextlib import asynccontextmanager
 
 from core.main import EnterpriseQueryBot
+from core import metrics
+from core.config import ADMIN_API_TOKEN, BATCH_MAX_CONCURRENCY, BATCH_MAX_ITEMS
+from core.metrics import STARTUP_DURATION
+
+# 导入耗时与到就绪的总耗时（均从本模块开始导入算起）
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+STARTUP_DURATION.labels("import").set(IMPORT_SECONDS)
+ready_seconds: Optional[float] = None
 
 
 # 请求模型
@@ -19,6 +37,21 @@ class ChatRequest(BaseModel):
     session_id: Optional[str] = Field(None, description="会话ID，如果为空则创建新会话")
 
 
+class BatchChatItem(BaseModel):
+    """批量聊天中的一条消息"""
+    message: str = Field(..., description="用户输入的消息", min_length=1)
+    session_id: Optional[str] = Field(None, description="会话ID，如果为空则创建新会话")
+
+
+class BatchChatRequest(BaseModel):
+    """批量聊天请求模型"""
+    items: List[BatchChatItem] = Field(..., description="消息列表", min_length=1, max_length=BATCH_MAX_ITEMS)
+    concurrency: Optional[int] = Field(
+        None, description=f"同时执行的消息数，默认且最大为 {BATCH_MAX_CONCURRENCY}", ge=1
+    )
+    include_logs: bool = Field(False, description="结果中是否附带执行日志")
+
+
 class SessionRequest(BaseModel):
     """创建会话请求模型"""
     user_id: Optional[str] = Field(None, description="用户ID，如果为空则自动生成")
@@ -41,6 +74,19 @@ class SessionResponse(BaseModel):
     message: str = Field(..., description="提示信息")
 
 
+class ReloadResponse(BaseModel):
+    """知识库重新加载响应模型"""
+    total: int = Field(..., description="重新加载后的文档块总数")
+    reused: int = Field(..., description="复用已有向量的文档块数")
+    embedded: int = Field(..., description="重新embedding的文档块数")
+    removed: int = Field(..., description="删除的文档块数")
+    changed: bool = Field(..., description="知识库文件内容是否有变化")
+    elapsed_ms: float = Field(..., description="耗时（毫秒）")
+    workers: int = Field(..., description="worker进程数；本次重新加载只作用于处理该请求的worker")
+    watch_interval: float = Field(..., description="知识库文件监视间隔（秒），其余worker在该间隔内自动跟进；0表示不监视")
+    message: str = Field(..., description="提示信息")
+
+
 class HealthResponse(BaseModel):
     """健康检查响应模型"""
     status: str = Field(..., description="服务状态")
@@ -51,23 +97,33 @@ class HealthResponse(BaseModel):
 bot: Optional[EnterpriseQueryBot] = None
 
 
+async def warm_up(instance: EnterpriseQueryBot):
+    """在后台线程中预热，完成后记录到就绪的总耗时"""
+    global ready_seconds
+    if await asyncio.to_thread(instance.warm_up):
+        ready_seconds = time.perf_counter() - _IMPORT_STARTED
+        STARTUP_DURATION.labels("ready").set(ready_seconds)
+        print(f"服务已就绪，导入 {IMPORT_SECONDS:.2f} 秒，距开始导入共 {ready_seconds:.2f} 秒")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
-    # 启动时初始化机器人
+    # 启动时只创建机器人实例，知识库与模型在后台预热（期间 /readyz 返回503）
     global bot
-    print("正在初始化企业内部查询助手...")
-    bot = EnterpriseQueryBot()
-
-    # 生成状态图PNG
-    print("正在生成状态图...")
-    bot.save_graph_to_png("customer_service_graph.png")
-    print("状态图已生成")
+    print(f"模块导入耗时 {IMPORT_SECONDS:.2f} 秒")
+    bot = EnterpriseQueryBot(warm_up=False)
+    warm_up_task = asyncio.create_task(warm_up(bot))
 
     yield
 
+    if not warm_up_task.done():
+        print("预热尚未完成，等待预热结束后关闭...")
+        await warm_up_task
+
     # 关闭时清理资源
     print("正在关闭企业内部查询助手...")
+    bot.close()
 
 
 # 创建FastAPI应用
@@ -97,6 +153,49 @@ async def root():
     }
 
 
+def require_ready():
+    """机器人尚未完成预热时返回503"""
+    if bot is None:
+        raise HTTPException(status_code=503, detail="机器人尚未初始化")
+    if not bot.ready.is_set():
+        raise HTTPException(
+            status_code=503,
+            detail=f"机器人正在预热（{bot.warmup_stage}）",
+            headers={"Retry-After": "5"}
+        )
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """管理接口鉴权：未配置 ADMIN_API_TOKEN 时返回403，令牌不一致时返回401"""
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=403, detail="管理接口未启用（未配置 ADMIN_API_TOKEN）")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), ADMIN_API_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="管理接口令牌无效")
+
+
+@app.get("/livez")
+async def livez():
+    """存活探针：进程能处理请求即返回200（不等待预热）"""
+    return {"status": "alive"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """
+    就绪探针：知识库与模型预热完成后返回200，否则返回503
+
+    Returns:
+        预热阶段、各阶段耗时、导入耗时与到就绪的总耗时
+    """
+    status = bot.warmup_status() if bot is not None else {"ready": False, "stage": "initializing"}
+    body = {
+        **status,
+        "import_ms": round(IMPORT_SECONDS * 1000, 1),
+        "ready_ms": round(ready_seconds * 1000, 1) if ready_seconds is not None else None,
+    }
+    return JSONResponse(body, status_code=200 if status["ready"] else 503)
+
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """健康检查端点"""
@@ -124,12 +223,13 @@ async def create_session(request: SessionRequest):
         raise HTTPException(status_code=503, detail="机器人尚未初始化")
 
     try:
-        session_id = bot.create_session(user_id=request.user_id)
-        session = bot.sessions[session_id]
+        # 会话存储（SQLite）读写可能等待数据库锁，放到线程池执行
+        session_id = await asyncio.to_thread(bot.create_session, request.user_id)
+        session = await asyncio.to_thread(bot.sessions.get, session_id)
 
         return {
             "session_id": session_id,
-            "user_id": session["user_id"],
+            "user_id": session.user_id,
             "message": "会话创建成功"
         }
     except Exception as e:
@@ -147,12 +247,11 @@ async def chat(request: ChatRequest):
     Returns:
         机器人的回复，包含完整的执行日志
     """
-    if bot is None:
-        raise HTTPException(status_code=503, detail="机器人尚未初始化")
+    require_ready()
 
     try:
-        # 调用机器人，捕获日志
-        result = bot.chat(
+        # 异步调用机器人，捕获日志（等待LLM期间不阻塞其他请求）
+        result = await bot.achat(
             user_input=request.message,
             session_id=request.session_id,
             capture_logs=True
@@ -172,24 +271,91 @@ async def chat(request: ChatRequest):
         )
 
 
+def _sse(event: dict) -> str:
+    """格式化为一条Server-Sent Events消息"""
+    return f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+@app.post("/api/v1/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    企业内部查询（Server-Sent Events流式响应）
+
+    事件类型：
+    - session: 会话ID
+    - node: 节点完成（意图识别结果、检索到的文档数等）
+    - token: 回复片段
+    - done: 完整回复
+    - error: 处理出错
+
+    Args:
+        request: 聊天请求，包含消息和可选的会话ID
+    """
+    require_ready()
+
+    async def event_stream():
+        async for event in bot.astream_chat(request.message, request.session_id):
+            yield _sse(event)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/api/v1/chat/batch")
+async def chat_batch(request: BatchChatRequest):
+    """
+    批量企业内部查询（NDJSON流式响应）
+
+    所有查询的embedding合并为一次批量推理，状态图按并发上限同时执行，
+    每条消息完成后立即返回一行JSON（按完成顺序，index 为该消息在请求中的位置）。
+
+    Args:
+        request: 批量聊天请求，包含消息列表与可选的并发上限
+    """
+    require_ready()
+
+    concurrency = min(request.concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    items = [(item.message, item.session_id) for item in request.items]
+
+    async def result_stream():
+        async for result in bot.abatch_chat(items, concurrency, request.include_logs):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+
 @app.get("/api/v1/graph")
-async def get_graph():
+async def get_graph(format: str = "png"):
     """
-    获取状态图PNG图像
+    获取状态图
+
+    PNG在首次请求时渲染（依赖 mermaid.ink 远程服务）并缓存；
+    渲染服务不可用时返回预先生成的 customer_service_graph.png（make graph）。
+
+    Args:
+        format: png（默认）或 mermaid（Mermaid源码，本地生成）
 
     Returns:
-        PNG图像文件
+        PNG图像或Mermaid源码
     """
-    graph_path = "customer_service_graph.png"
+    if bot is None:
+        raise HTTPException(status_code=503, detail="机器人尚未初始化")
 
-    if not os.path.exists(graph_path):
-        raise HTTPException(status_code=404, detail="状态图文件不存在")
+    if format == "mermaid":
+        return PlainTextResponse(bot.graph_mermaid())
 
-    return FileResponse(
-        graph_path,
-        media_type="image/png",
-        filename="customer_service_graph.png"
-    )
+    try:
+        png = await asyncio.to_thread(bot.graph_png)
+    except Exception as e:
+        graph_path = "customer_service_graph.png"
+        if not os.path.exists(graph_path):
+            raise HTTPException(status_code=503, detail=f"状态图渲染失败: {e}")
+        return FileResponse(graph_path, media_type="image/png", filename="customer_service_graph.png")
+
+    return Response(png, media_type="image/png")
 
 
 @app.get("/api/v1/sessions/{session_id}")
@@ -206,15 +372,14 @@ async def get_session(session_id: str):
     if bot is None:
         raise HTTPException(status_code=503, detail="机器人尚未初始化")
 
-    if session_id not in bot.sessions:
-        raise HTTPException(status_code=404, detail="会话不存在")
-
-    session = bot.sessions[session_id]
+    session = await asyncio.to_thread(bot.sessions.get, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="会话不存在或已过期")
 
     return {
         "session_id": session_id,
-        "user_id": session["user_id"],
-        "message_count": len(session["messages"])
+        "user_id": session.user_id,
+        "message_count": len(session.messages)
     }
 
 
@@ -244,8 +409,68 @@ async def get_knowledge_base():
         raise HTTPException(status_code=500, detail=f"读取知识库失败: {str(e)}")
 
 
+@app.get("/api/v1/stats")
+async def get_stats():
+    """
+    获取运行统计
+
+    Returns:
+        会话数、各级缓存命中率等统计信息
+    """
+    if bot is None:
+        raise HTTPException(status_code=503, detail="机器人尚未初始化")
+
+    # 会话统计需要查询SQLite，放到线程池执行
+    return await asyncio.to_thread(bot.get_stats)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus指标
+
+    Returns:
+        节点/检索/embedding/LLM耗时直方图，意图与路由计数，出错次数，LLM token用量
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.post("/api/v1/admin/knowledge-base/reload", response_model=ReloadResponse,
+          dependencies=[Depends(require_admin)])
+def reload_knowledge_base():
+    """
+    增量重新加载知识库
+
+    只对新增或修改的文档块重新embedding，未变化的文档块复用已有向量。
+    需要在请求头 X-Admin-Token 中携带 ADMIN_API_TOKEN。
+    只重新加载处理该请求的worker进程，不会通知其他worker。多worker部署时（WEB_CONCURRENCY > 1）
+    每个worker都自动开启知识库文件监视，各自在 watch_interval 秒内发现文件变化后重新加载；
+    在此之前不同worker可能使用新旧两个版本的知识库回答。
+
+    Returns:
+        复用与重新embedding的文档块统计
+    """
+    require_ready()
+
+    from core.config import KB_WATCH_INTERVAL, WEB_CONCURRENCY
+    from core.knowledge_base import knowledge_base
+
+    try:
+        stats = knowledge_base.reload_knowledge_base()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"重新加载知识库失败: {str(e)}")
+
+    message = "知识库已重新加载" if stats["changed"] else "知识库内容未变化"
+    if WEB_CONCURRENCY > 1:
+        message += (f"（仅当前worker；其余 {WEB_CONCURRENCY - 1} 个worker不会收到通知，由各自的文件监视"
+                    f"在 {KB_WATCH_INTERVAL:g} 秒内发现文件变化后重新加载，期间各worker的知识库版本可能不一致）")
+    return {**stats, "workers": WEB_CONCURRENCY, "watch_interval": KB_WATCH_INTERVAL, "message": message}
+
+
 if __name__ == "__main__":
     import uvicorn
     # 支持 Railway 等 PaaS 平台的 PORT 环境变量
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # 多worker部署（会话保存在共享的SQLite中，无需粘滞路由）；多worker时必须以导入字符串传入应用
+    from core.config import WEB_CONCURRENCY
+    uvicorn.run("api:app", host="0.0.0.0", port=port, workers=WEB_CONCURRENCY)
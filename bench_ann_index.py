@@ -0,0 +1,91 @@
+"""
+IVF近似检索 召回率@K / 延迟 报告
+
+以精确检索（flat）结果为标准答案，统计不同 nprobe 下 IVF 检索的召回率与延迟分位数。
+数据为带簇结构的合成向量（模拟真实文本embedding的分布），不加载embedding模型。
+
+用法:
+    python bench_ann_index.py
+    python bench_ann_index.py --n 300000 --nprobe 1 4 8 16 32 --k 3
+"""
+import argparse
+import time
+
+import numpy as np
+from langchain_core.embeddings import FakeEmbeddings
+
+from core.vector_store import NumpyVectorStore, normalize_rows
+
+
+def make_dataset(n: int, n_queries: int, dim: int, n_topics: int, noise: float, seed: int = 0):
+    """生成带主题簇结构的归一化向量与查询"""
+    rng = np.random.default_rng(seed)
+    topics = normalize_rows(rng.standard_normal((n_topics, dim)).astype(np.float32))
+    labels = rng.integers(0, n_topics, n)
+    vectors = normalize_rows(topics[labels] + noise * rng.standard_normal((n, dim)).astype(np.float32))
+    query_labels = rng.integers(0, n_topics, n_queries)
+    queries = normalize_rows(
+        topics[query_labels] + noise * rng.standard_normal((n_queries, dim)).astype(np.float32)
+    )
+    return vectors, queries
+
+
+def measure(store: NumpyVectorStore, queries: np.ndarray, k: int, nprobe=None):
+    """返回 (每个查询的Top-K文档ID集合, 延迟数组ms)"""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = store.similarity_search_with_score_by_vector(query, k=k, nprobe=nprobe)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append({doc.id for doc, _ in hits})
+    return results, np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF近似检索召回率/延迟报告")
+    parser.add_argument("--n", type=int, default=200000, help="文档块数量")
+    parser.add_argument("--dim", type=int, default=384, help="向量维度")
+    parser.add_argument("--queries", type=int, default=200, help="查询数")
+    parser.add_argument("--k", type=int, default=3, help="Top-K")
+    parser.add_argument("--nlist", type=int, default=0, help="IVF簇数，0为自动")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="探查簇数")
+    parser.add_argument("--topics", type=int, default=2000, help="合成数据的主题数")
+    parser.add_argument("--noise", type=float, default=0.03, help="合成数据每维噪声标准差")
+    args = parser.parse_args()
+
+    vectors, queries = make_dataset(args.n, args.queries, args.dim, args.topics, args.noise)
+    ids = [str(i) for i in range(args.n)]
+    texts = [f"doc-{i}" for i in range(args.n)]
+    embedding = FakeEmbeddings(size=args.dim)
+
+    flat = NumpyVectorStore(embedding)
+    flat.add_embeddings(texts, vectors, ids=ids)
+
+    ivf = NumpyVectorStore(embedding, index_type="ivf", nlist=args.nlist, min_index_size=0)
+    ivf.add_embeddings(texts, vectors, ids=ids)
+    start = time.perf_counter()
+    ivf.build_index()
+    train_seconds = time.perf_counter() - start
+
+    truth, flat_latencies = measure(flat, queries, args.k)
+
+    print("=" * 72)
+    print(f"召回率@{args.k} / 延迟（N={args.n}, dim={args.dim}, 查询数={args.queries}, "
+          f"nlist={len(ivf.ann_index.centroids)}, 训练耗时={train_seconds:.1f}s）")
+    print("=" * 72)
+    print(f"{'索引':>12} | {f'recall@{args.k}':>10} | {'p50(ms)':>9} | {'p90(ms)':>9} | {'p99(ms)':>9}")
+    print("-" * 72)
+    print(f"{'flat':>12} | {1.0:10.4f} | {np.percentile(flat_latencies, 50):9.3f} | "
+          f"{np.percentile(flat_latencies, 90):9.3f} | {np.percentile(flat_latencies, 99):9.3f}")
+
+    for nprobe in args.nprobe:
+        results, latencies = measure(ivf, queries, args.k, nprobe=nprobe)
+        recall = np.mean([len(r & t) / len(t) for r, t in zip(results, truth)])
+        print(f"{f'ivf/{nprobe}':>12} | {recall:10.4f} | {np.percentile(latencies, 50):9.3f} | "
+              f"{np.percentile(latencies, 90):9.3f} | {np.percentile(latencies, 99):9.3f}")
+
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+查询embedding微批处理基准测试
+
+在不同并发数下，对比逐条推理（每个请求单独调用 embed_query）与微批处理的吞吐与延迟。
+每个并发线程循环发送不同的查询，不经过查询向量缓存。
+
+用法:
+    python bench_embedding_batcher.py
+    python bench_embedding_batcher.py --concurrency 1 4 16 64 --requests 512 --max-wait-ms 2
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from core.embedding_batcher import MicroBatchingEmbeddings
+
+QUESTIONS = [
+    "如何申请年假？", "差旅费怎么报销？", "VPN连不上怎么办？", "新员工入职需要准备什么材料？",
+    "公司的考勤制度是什么？", "如何申请办公用品？", "合同审批流程是怎样的？", "IT部门的联系方式是什么？",
+]
+
+
+def run(embeddings, concurrency: int, requests: int):
+    """返回 (吞吐 查询/秒, p50毫秒, p99毫秒)"""
+    latencies = []
+    lock = threading.Lock()
+    per_thread = max(1, requests // concurrency)
+
+    def worker(offset: int):
+        local = []
+        for i in range(per_thread):
+            text = f"{QUESTIONS[(offset + i) % len(QUESTIONS)]} #{offset}-{i}"
+            start = time.perf_counter()
+            embeddings.embed_query(text)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    return len(latencies) / elapsed, np.percentile(latencies_ms, 50), np.percentile(latencies_ms, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询embedding微批处理基准测试")
+    parser.add_argument("--model", default="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+                        help="embedding模型")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64], help="并发线程数")
+    parser.add_argument("--requests", type=int, default=512, help="每轮查询总数")
+    parser.add_argument("--max-batch-size", type=int, default=32, help="微批处理最大批大小")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="微批处理最长等待（毫秒）")
+    args = parser.parse_args()
+
+    model = HuggingFaceEmbeddings(
+        model_name=args.model,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+    model.embed_documents(QUESTIONS)  # 预热
+
+    print("=" * 86)
+    print(f"查询embedding吞吐（{args.model}，批大小≤{args.max_batch_size}，等待≤{args.max_wait_ms}ms）")
+    print("=" * 86)
+    print(f"{'并发':>6} | {'逐条(查询/秒)':>14} | {'逐条p50/p99(ms)':>16} | "
+          f"{'微批(查询/秒)':>14} | {'微批p50/p99(ms)':>16} | {'平均批大小':>10}")
+    print("-" * 86)
+
+    for concurrency in args.concurrency:
+        single_qps, single_p50, single_p99 = run(model, concurrency, args.requests)
+
+        batcher = MicroBatchingEmbeddings(model, args.max_batch_size, args.max_wait_ms)
+        batch_qps, batch_p50, batch_p99 = run(batcher, concurrency, args.requests)
+        avg_batch = batcher.stats()["avg_batch_size"]
+        batcher.close()
+
+        print(f"{concurrency:>6} | {single_qps:14.1f} | {single_p50:7.1f}/{single_p99:<8.1f} | "
+              f"{batch_qps:14.1f} | {batch_p50:7.1f}/{batch_p99:<8.1f} | {avg_batch:10.2f}")
+
+    print("=" * 86)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+混合检索基准测试
+
+对比 vector / bm25 / hybrid 三种检索方式在依赖精确词的查询（分机号、系统模块名、专有名词）上的命中率：
+每个查询给出答案片段中必然出现的关键文本，检索结果的Top-K中任一文档块包含该文本即为命中。
+同时报告检索延迟与查询embedding次数（短查询只走BM25时不调用embedding模型）：
+- 检索: 只计 KnowledgeBase.search
+- 对话一轮: 一轮对话在调用LLM之前的全部查询embedding，即语义缓存查找（SEMANTIC_CACHE_ENABLED）、
+  意图识别（规则未命中时的embedding分类器）、FAQ直接回答匹配与检索；同一查询的向量经查询向量缓存共享，最多推理一次
+
+使用当前配置的embedding后端（EMBEDDING_BACKEND），检索前清空查询向量缓存。
+
+用法:
+    python bench_hybrid_retrieval.py
+    python bench_hybrid_retrieval.py --k 1 3 5 --repeats 20
+"""
+import argparse
+import time
+
+import numpy as np
+
+from core.config import (
+    embeddings, SEMANTIC_CACHE_ENABLED, FAST_INTENT_ENABLED, EMBEDDING_INTENT_ENABLED, EMBEDDING_INTENT_THRESHOLD
+)
+from core.faq import faq_fast_path
+from core.intent_classifier import intent_classifier, bootstrap_examples
+from core.intent_rules import rule_classifier
+from core.knowledge_base import knowledge_base
+from core.main import EnterpriseQueryBot
+
+# (查询, 答案中必然出现的文本)
+CASES = [
+    ("8888", "分机8888"),
+    ("6666", "分机6666"),
+    ("备用金", "备用金申请流程"),
+    ("VPN", "VPN连接步骤"),
+    ("停车位", "停车位申请"),
+    ("离职申请表", "离职申请表"),
+    ("会议室预订的电话是多少", "分机8888"),
+    ("忘记密码找IT服务台", "分机6666"),
+    ("如何申请备用金", "备用金申请流程"),
+    ("VPN连不上怎么办", "VPN连接步骤"),
+    ("匿名投诉热线", "8888-1234"),
+    ("纳税服务热线", "12366"),
+    ("专利申请表在哪里提交", "专利申请表"),
+    ("内部转岗申请表怎么填", "内部转岗申请表"),
+    ("体检预约", "体检预约"),
+    ("财务部分机号", "分机8866"),
+]
+
+
+def turn(query: str, k: int) -> None:
+    """一轮对话在调用LLM之前的步骤：语义缓存查找、意图识别、FAQ匹配与检索"""
+    if SEMANTIC_CACHE_ENABLED and EnterpriseQueryBot.answer_cache_applies(query):
+        embeddings.embed_query(query)
+    if not (FAST_INTENT_ENABLED and rule_classifier.classify(query)) and EMBEDDING_INTENT_ENABLED:
+        intent_classifier.classify(query, EMBEDDING_INTENT_THRESHOLD)
+    faq_fast_path.match(query)
+    knowledge_base.search(query, k=k)
+
+
+def turn_embeddings(k: int) -> float:
+    """每轮对话的embedding次数"""
+    embeddings.clear()
+    misses_before = embeddings.stats()["misses"]
+    for query, _ in CASES:
+        turn(query, k)
+    return (embeddings.stats()["misses"] - misses_before) / len(CASES)
+
+
+def evaluate(mode: str, k: int, repeats: int):
+    """返回 (命中率, p50毫秒, 每个查询检索的embedding次数, 每轮对话的embedding次数)"""
+    knowledge_base.retrieval_mode = mode
+    embeddings.clear()
+    misses_before = embeddings.stats()["misses"]
+
+    hits = 0
+    latencies = []
+    for query, needle in CASES:
+        docs = knowledge_base.search(query, k=k)
+        hits += any(needle in doc.page_content for doc in docs)
+        for _ in range(repeats):
+            start = time.perf_counter()
+            knowledge_base.search(query, k=k)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    embedded = (embeddings.stats()["misses"] - misses_before) / len(CASES)
+    return hits / len(CASES), float(np.percentile(latencies, 50)), embedded, turn_embeddings(k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="混合检索命中率/延迟基准测试")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5], help="Top-K")
+    parser.add_argument("--modes", nargs="+", default=["vector", "bm25", "hybrid"], help="检索方式")
+    parser.add_argument("--repeats", type=int, default=10, help="每个查询的延迟测量次数")
+    args = parser.parse_args()
+
+    if not knowledge_base.load_knowledge_base():
+        return
+    print(f"BM25索引: {knowledge_base.bm25_index.stats()}")
+    if EMBEDDING_INTENT_ENABLED:
+        intent_classifier.fit(bootstrap_examples(knowledge_base.file_path, knowledge_base.qa_pairs()))
+
+    print("=" * 72)
+    print(f"混合检索基准测试（{len(CASES)} 个依赖精确词的查询）")
+    print("=" * 72)
+    print(f"{'检索方式':<8} | {'K':>3} | {'命中率':>8} | {'p50(ms)':>8} | {'embedding次数/检索':>16} | {'embedding次数/轮':>14}")
+    print("-" * 72)
+    for mode in args.modes:
+        for k in args.k:
+            hit_rate, p50, embedded, per_turn = evaluate(mode, k, args.repeats)
+            print(f"{mode:<12} | {k:>3} | {hit_rate:8.0%} | {p50:8.3f} | {embedded:16.2f} | {per_turn:14.2f}")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
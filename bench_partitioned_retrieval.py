@@ -0,0 +1,81 @@
+"""
+分区检索 延迟报告
+
+文档块按部门分区，对比：
+- 全局检索（对全部文档块打分）
+- 单分区检索，分区连续存放（知识库按分区排列文档块，逐段在矩阵切片上打分）
+- 单分区检索，分区分散存放（需要先复制选中的行再打分，作为对照）
+数据为带簇结构的合成向量，不加载embedding模型。
+
+用法:
+    python bench_partitioned_retrieval.py
+    python bench_partitioned_retrieval.py --n 200000 --partitions 7 --precision int8
+"""
+import argparse
+import time
+
+import numpy as np
+from langchain_core.embeddings import FakeEmbeddings
+
+from bench_ann_index import make_dataset
+from core.vector_store import NumpyVectorStore
+
+
+def build_store(vectors: np.ndarray, sections: np.ndarray, order: np.ndarray, precision: str) -> NumpyVectorStore:
+    store = NumpyVectorStore(FakeEmbeddings(size=vectors.shape[1]), precision=precision)
+    store.add_embeddings(
+        [f"doc-{i}" for i in order], vectors[order],
+        metadatas=[{"section": f"dept-{sections[i]}"} for i in order], ids=[str(i) for i in order]
+    )
+    return store
+
+
+def measure(store: NumpyVectorStore, queries: np.ndarray, k: int, filter=None) -> np.ndarray:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        store.similarity_search_with_score_by_vector(query, k=k, filter=filter)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分区检索延迟报告")
+    parser.add_argument("--n", type=int, default=100000, help="文档块数量")
+    parser.add_argument("--dim", type=int, default=384, help="向量维度")
+    parser.add_argument("--queries", type=int, default=200, help="查询数")
+    parser.add_argument("--k", type=int, default=3, help="Top-K")
+    parser.add_argument("--partitions", type=int, default=7, help="分区（部门）数")
+    parser.add_argument("--precision", default="float32", help="向量精度 float32 / float16 / int8")
+    parser.add_argument("--topics", type=int, default=2000, help="合成数据的主题数")
+    parser.add_argument("--noise", type=float, default=0.03, help="合成数据每维噪声标准差")
+    args = parser.parse_args()
+
+    vectors, queries = make_dataset(args.n, args.queries, args.dim, args.topics, args.noise)
+    sections = np.random.default_rng(1).integers(0, args.partitions, args.n)
+    contiguous = build_store(vectors, sections, np.argsort(sections, kind="stable"), args.precision)
+    scattered = build_store(vectors, sections, np.arange(args.n), args.precision)
+    partition = {"section": "dept-0"}
+    fan_out = {"section": [f"dept-{p}" for p in range(args.partitions)]}
+
+    rows = [
+        ("全局检索", measure(contiguous, queries, args.k)),
+        ("单分区（连续存放）", measure(contiguous, queries, args.k, partition)),
+        ("单分区（分散存放）", measure(scattered, queries, args.k, partition)),
+        ("全部分区扇出（连续存放）", measure(contiguous, queries, args.k, fan_out)),
+    ]
+
+    print("=" * 72)
+    print(f"分区检索（n={args.n}, 分区={args.partitions}, dim={args.dim}, {args.precision}）")
+    print("=" * 72)
+    print(f"{'检索方式':<20} | {'p50(ms)':>8} | {'p99(ms)':>8} | {'相对全局':>8}")
+    print("-" * 72)
+    base = np.percentile(rows[0][1], 50)
+    for label, latency in rows:
+        p50 = np.percentile(latency, 50)
+        print(f"{label:<20} | {p50:8.3f} | {np.percentile(latency, 99):8.3f} | {p50 / base:7.2f}x")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+向量存储检索性能基准测试
+
+对比 langchain InMemoryVectorStore 与 NumpyVectorStore 在不同文档块数量下的检索延迟。
+使用随机归一化向量，不加载embedding模型。
+
+用法:
+    python bench_vector_store.py
+    python bench_vector_store.py --sizes 1000 10000 100000 --dim 384
+"""
+import argparse
+import time
+
+import numpy as np
+from langchain_core.embeddings import FakeEmbeddings
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from core.vector_store import NumpyVectorStore, normalize_rows
+
+
+def timed(fn, repeats: int) -> float:
+    """返回单次调用的平均耗时（毫秒）"""
+    fn()  # 预热
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def bench(n: int, dim: int, k: int, batch: int, baseline_max: int):
+    rng = np.random.default_rng(0)
+    vectors = normalize_rows(rng.standard_normal((n, dim)).astype(np.float32))
+    queries = normalize_rows(rng.standard_normal((batch, dim)).astype(np.float32))
+    texts = [f"doc-{i}" for i in range(n)]
+    embedding = FakeEmbeddings(size=dim)
+
+    store = NumpyVectorStore(embedding)
+    store.add_embeddings(texts, vectors)
+    query = queries[0]
+
+    numpy_ms = timed(lambda: store.similarity_search_with_score_by_vector(query, k=k), repeats=50)
+    batch_ms = timed(lambda: store.batch_similarity_search_with_score_by_vectors(queries, k=k), repeats=10)
+
+    baseline_ms = None
+    if n <= baseline_max:
+        baseline = InMemoryVectorStore(embedding)
+        for i, (text, vector) in enumerate(zip(texts, vectors.tolist())):
+            baseline.store[str(i)] = {"id": str(i), "vector": vector, "text": text, "metadata": {}}
+        query_list = query.tolist()
+        baseline_ms = timed(
+            lambda: baseline.similarity_search_with_score_by_vector(query_list, k=k),
+            repeats=3 if n > 10000 else 10
+        )
+
+        # 校验两者Top-K结果一致
+        expected = [doc.page_content for doc, _ in baseline.similarity_search_with_score_by_vector(query_list, k=k)]
+        actual = [doc.page_content for doc, _ in store.similarity_search_with_score_by_vector(query, k=k)]
+        assert expected == actual, f"Top-K不一致: {expected} != {actual}"
+
+    return baseline_ms, numpy_ms, batch_ms / batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量存储检索性能基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="文档块数量")
+    parser.add_argument("--dim", type=int, default=384, help="向量维度")
+    parser.add_argument("--k", type=int, default=3, help="Top-K")
+    parser.add_argument("--batch", type=int, default=32, help="批量检索的查询数")
+    parser.add_argument("--baseline-max", type=int, default=100000,
+                        help="超过该规模时跳过 InMemoryVectorStore（太慢）")
+    args = parser.parse_args()
+
+    print("=" * 78)
+    print(f"向量检索延迟（dim={args.dim}, k={args.k}, 批量={args.batch}）")
+    print("=" * 78)
+    print(f"{'文档块数':>10} | {'InMemory(ms)':>13} | {'Numpy(ms)':>10} | {'Numpy批量(ms/查询)':>18} | {'加速比':>8}")
+    print("-" * 78)
+
+    for n in args.sizes:
+        baseline_ms, numpy_ms, batch_ms = bench(n, args.dim, args.k, args.batch, args.baseline_max)
+        baseline_str = f"{baseline_ms:13.3f}" if baseline_ms is not None else f"{'跳过':>11}"
+        speedup = f"{baseline_ms / numpy_ms:7.1f}x" if baseline_ms is not None else f"{'-':>8}"
+        print(f"{n:>10} | {baseline_str} | {numpy_ms:10.3f} | {batch_ms:18.4f} | {speedup}")
+
+    print("=" * 78)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+BM25倒排索引与混合检索融合
+
+- tokenize: 中日韩字符切分为字符二元组（单字的片段保留单字），英文与数字按单词小写，
+  不依赖分词词典，分机号、"VPN"、"备用金"这类精确词都能命中
+- BM25Index: 倒排索引按词项连续存放（CSR格式）：每个词项的倒排表是 doc_rows(int32) 与
+  weights(float32) 上的一段，weights 为预先算好的BM25词项得分，查询时只需按文档累加
+- reciprocal_rank_fusion: 按名次融合多路检索结果（RRF），不需要对齐向量相似度与BM25分数的量纲
+"""
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .vector_store import top_k_indices
+
+# 中日韩字符范围（假名、汉字及扩展A、兼容汉字、韩文音节），切词、特征哈希与token估算共用
+CJK_CHARS = r"\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+# 连续的中日韩字符与英文小写单词/数字
+CJK_RUN = re.compile(rf"[{CJK_CHARS}]+")
+WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """中日韩字符二元组 + 英文小写单词/数字"""
+    tokens = []
+    for run in CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.extend(WORD.findall(text.lower()))
+    return tokens
+
+
+def text_length(text: str) -> int:
+    """查询的有效长度（中日韩字符数 + 英文单词/数字的字符数，不计空白与标点）"""
+    return sum(len(run) for run in CJK_RUN.findall(text)) + sum(len(w) for w in WORD.findall(text.lower()))
+
+
+class BM25Index:
+    """
+    BM25倒排索引（构建后只读，知识库重新加载时整体重建）
+
+    Args:
+        ids: 文档ID（与向量存储中的ID一致）
+        texts: 文档内容
+        k1: 词频饱和参数
+        b: 文档长度归一化参数
+    """
+
+    def __init__(self, ids: Sequence[str], texts: Sequence[str], k1: float = 1.2, b: float = 0.75):
+        self.ids = list(ids)
+        self._row_of = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.k1 = k1
+        self.b = b
+
+        vocab: Dict[str, int] = {}
+        term_ids, doc_rows, tfs = [], [], []
+        lengths = np.zeros(len(self.ids), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[row] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_rows.append(row)
+                tfs.append(tf)
+        self._vocab = vocab
+
+        # 按词项排序（稳定排序，倒排表内文档保持升序），得到每个词项在数组中的连续区间
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable")
+        df = np.bincount(term_ids, minlength=len(vocab))
+        self._offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=self._offsets[1:])
+        self._doc_rows = np.asarray(doc_rows, dtype=np.int32)[order]
+
+        n = len(self.ids)
+        self.avgdl = float(lengths.mean()) if n else 0.0
+        tf = np.asarray(tfs, dtype=np.float32)[order]
+        dl = lengths[self._doc_rows]
+        idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = k1 * (1 - b + b * dl / (self.avgdl or 1.0))
+        self._weights = (np.repeat(idf, df) * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query: str, k: int, ids: Optional[Sequence[str]] = None) -> List[Tuple[str, float]]:
+        """
+        返回BM25分数最高的k个 (文档ID, 分数)，没有任何词项命中时返回空列表
+
+        Args:
+            query: 查询
+            k: 返回结果数
+            ids: 只在这些文档中检索（metadata过滤的结果），None表示全部文档
+        """
+        slices = []
+        for term in set(tokenize(query)):
+            term_id = self._vocab.get(term)
+            if term_id is not None:
+                slices.append(slice(self._offsets[term_id], self._offsets[term_id + 1]))
+        if not slices:
+            return []
+
+        rows = np.concatenate([self._doc_rows[s] for s in slices])
+        weights = np.concatenate([self._weights[s] for s in slices])
+        scores = np.bincount(rows, weights=weights, minlength=len(self.ids))
+        if ids is not None:
+            allowed = np.zeros(len(self.ids), dtype=bool)
+            allowed[[self._row_of[doc_id] for doc_id in ids if doc_id in self._row_of]] = True
+            scores[~allowed] = 0.0
+        return [(self.ids[i], float(scores[i])) for i in top_k_indices(scores, k) if scores[i] > 0]
+
+    def stats(self) -> dict:
+        """索引规模与内存占用"""
+        return {
+            "documents": len(self.ids),
+            "terms": len(self._vocab),
+            "postings": int(len(self._doc_rows)),
+            "avg_doc_tokens": round(self.avgdl, 1),
+            "postings_bytes": int(self._doc_rows.nbytes + self._weights.nbytes + self._offsets.nbytes),
+        }
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Tuple[Document, float]]], k: int,
+                           rrf_k: int = 60) -> List[Tuple[Document, float]]:
+    """
+    倒数排名融合：文档得分为各路结果中 1 / (rrf_k + 名次) 之和
+
+    Args:
+        rankings: 各路检索结果，每路按分数降序
+        k: 返回的文档数
+        rrf_k: 平滑常数，越大名次差异的影响越小
+
+    Returns:
+        Top-K (文档, 融合分数)
+    """
+    fused: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, (doc, _) in enumerate(ranking, 1):
+            fused[doc.id] = fused.get(doc.id, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(doc.id, doc)
+    ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+    return [(documents[doc_id], score) for doc_id, score in ranked]
@@ -0,0 +1,135 @@
+"""
+知识库分块
+
+- RecursiveChunker: 按分隔符递归切分为不超过 chunk_size 的块（通用文本）
+- QAChunker: 按 "一、行政管理" 这样的章节标题与 "问：/答：" 问答对切分，一个问答对一个块，
+  问题与答案不会被切开；metadata 记录章节、问题以及分块在知识库文件中的字节偏移 [start_byte, end_byte)。
+  问答对以外的段落（如文件开头的说明）超过 chunk_size 时按 RecursiveChunker 切分
+
+split(text) 返回 (分块文本列表, metadata列表)，settings() 返回分块配置（作为索引包键的一部分）。
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", "。", "！", "？", "；", "，", " "]
+
+# 章节标题（"一、行政管理"）、分隔线（"====="）、问题行（"问：..."）
+# SECTION_PATTERN / QUESTION_PATTERN 是知识库格式的唯一定义，意图分类器提取样例时也使用
+SECTION_PATTERN = re.compile(r"^\s*[一二三四五六七八九十百]+、\s*(\S.*?)\s*$")
+_RULE = re.compile(r"^\s*[=\-—]{3,}\s*$")
+QUESTION_PATTERN = re.compile(r"^\s*问[：:]\s*(.*?)\s*$")
+
+
+class RecursiveChunker:
+    """按分隔符递归切分（RecursiveCharacterTextSplitter）"""
+
+    name = "recursive"
+
+    def __init__(self, chunk_size: int = 500, chunk_overlap: int = 50,
+                 separators: Optional[List[str]] = None):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = separators or DEFAULT_SEPARATORS
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            separators=self.separators
+        )
+
+    def settings(self) -> dict:
+        return {
+            "type": type(self.text_splitter).__name__,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "separators": self.separators,
+        }
+
+    def split(self, text: str) -> Tuple[List[str], List[dict]]:
+        chunks = self.text_splitter.split_text(text)
+        return chunks, [{} for _ in chunks]
+
+
+class QAChunker:
+    """按章节与问答对切分"""
+
+    name = "qa"
+
+    def __init__(self, chunk_size: int = 500, chunk_overlap: int = 50,
+                 separators: Optional[List[str]] = None):
+        self.fallback = RecursiveChunker(chunk_size, chunk_overlap, separators)
+
+    def settings(self) -> dict:
+        return {"type": type(self).__name__, "fallback": self.fallback.settings()}
+
+    def split(self, text: str) -> Tuple[List[str], List[dict]]:
+        chunks: List[str] = []
+        metadatas: List[dict] = []
+        section = ""
+        block: List[str] = []  # 当前块的行
+        block_start = 0  # 当前块起始字节偏移
+        question: Optional[str] = None  # 当前块为问答对时的问题
+
+        def flush():
+            content = "".join(block)
+            if content.strip():
+                self._emit(chunks, metadatas, content, block_start, section, question)
+
+        offset = 0
+        for line in text.splitlines(keepends=True):
+            size = len(line.encode("utf-8"))
+            section_match = SECTION_PATTERN.match(line)
+            question_match = QUESTION_PATTERN.match(line)
+            if section_match or _RULE.match(line) or question_match:
+                flush()
+                block, block_start, question = [], offset + size, None
+                if section_match:
+                    section = section_match.group(1)
+                elif question_match:
+                    block, block_start, question = [line], offset, question_match.group(1)
+            else:
+                block.append(line)
+            offset += size
+        flush()
+        return chunks, metadatas
+
+    def _emit(self, chunks: List[str], metadatas: List[dict], content: str, start: int,
+              section: str, question: Optional[str]) -> None:
+        """去掉首尾空白后输出分块（非问答段落过长时继续切分），计算字节偏移"""
+        lead = len(content) - len(content.lstrip())
+        start += len(content[:lead].encode("utf-8"))
+        content = content.strip()
+
+        pieces: List[Tuple[str, int]] = [(content, start)]
+        if question is None and len(content) > self.fallback.chunk_size:
+            pieces, cursor = [], 0
+            for piece in self.fallback.split(content)[0]:
+                position = content.find(piece, cursor)
+                if position < 0:
+                    position = cursor
+                pieces.append((piece, start + len(content[:position].encode("utf-8"))))
+                cursor = position + 1
+
+        for piece, piece_start in pieces:
+            chunks.append(piece)
+            metadatas.append({
+                "section": section,
+                "question": question or "",
+                "start_byte": piece_start,
+                "end_byte": piece_start + len(piece.encode("utf-8")),
+            })
+
+
+CHUNKERS: Dict[str, type] = {
+    RecursiveChunker.name: RecursiveChunker,
+    QAChunker.name: QAChunker,
+}
+
+
+def create_chunker(name: str, chunk_size: int = 500, chunk_overlap: int = 50):
+    """按名称创建分块器（qa / recursive）"""
+    chunker = CHUNKERS.get(name)
+    if chunker is None:
+        raise ValueError(f"未知的分块方式: {name}（可选: {', '.join(CHUNKERS)}）")
+    return chunker(chunk_size, chunk_overlap)
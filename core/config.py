@@ -1,11 +1,19 @@
 """
 配置文件
+
+LLM 与 embedding 模型在首次使用（或后台预热）时才创建，导入本模块不会加载模型。
 """
 import os
+import threading
 from pathlib import Path
-from langchain_openai import ChatOpenAI
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_core.vectorstores import InMemoryVectorStore
+
+from .embedding_cache import CachedQueryEmbeddings
+from .embedding_batcher import MicroBatchingEmbeddings
+from .embedding_backends import create_embeddings, embedding_model_id
+from .lazy import LazyEmbeddings
+from .metrics import llm_metrics_callback
+from .vector_store import NumpyVectorStore
+from .session_store import InMemorySessionStore, SQLiteSessionStore, SessionStore
 
 # ===== 项目根目录 =====
 PROJECT_ROOT = Path(__file__).parent.parent
@@ -15,15 +23,34 @@ openai_api_key = os.getenv("OPENAI_API_KEY", "sk-c62c4cde8fe747faa4d919780339295
 base_url = os.getenv("OPENAI_BASE_URL", "https://api.deepseek.com/v1")
 model_name = os.getenv("LLM_MODEL", "deepseek-chat")
 
-# 创建LLM实例
-llm = ChatOpenAI(
-    model=model_name,
-    temperature=0,
-    timeout=30,  # 增加超时时间适应云环境
-    max_tokens=1000,
-    openai_api_key=openai_api_key,
-    base_url=base_url
-)
+_llm = None
+_llm_lock = threading.Lock()
+
+
+def get_llm():
+    """获取LLM实例（首次调用时导入 langchain_openai 并创建）"""
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                from langchain_openai import ChatOpenAI
+                _llm = ChatOpenAI(
+                    model=model_name,
+                    temperature=0,
+                    timeout=30,  # 增加超时时间适应云环境
+                    max_tokens=1000,
+                    openai_api_key=openai_api_key,
+                    base_url=base_url,
+                    callbacks=[llm_metrics_callback]  # 记录LLM调用耗时与token用量
+                )
+    return _llm
+
+
+def __getattr__(name):
+    """兼容 from core.config import llm（访问时才创建）"""
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ===== Embedding模型配置 =====
 # 使用中文优化的embedding模型（推荐）
@@ -31,14 +58,116 @@ llm = ChatOpenAI(
 # 选项2: sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2 - 多语言支持
 # 选项3: sentence-transformers/all-mpnet-base-v2 - 英文模型（原始配置，中文效果较差）
 
-embeddings = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",  # 多语言模型，支持中文
-    model_kwargs={'device': 'cpu'},
-    encode_kwargs={'normalize_embeddings': True}
+EMBEDDING_MODEL_NAME = os.getenv(
+    "EMBEDDING_MODEL",
+    "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"  # 多语言模型，支持中文
+)
+# 推理后端: huggingface（float32）/ int8（动态int8量化）/ onnx（ONNX Runtime）/ hashing（确定性哈希，离线测试用）
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "huggingface")
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "")  # onnx后端使用的模型文件，如 onnx/model_qint8_avx2.onnx
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "0"))  # hashing后端的向量维度，0表示默认384
+_embedding_options = {"onnx_file": EMBEDDING_ONNX_FILE, "dim": EMBEDDING_DIM}
+# 向量空间标识（后端+模型），用于查询向量缓存与索引包的键
+EMBEDDING_MODEL_ID = embedding_model_id(EMBEDDING_BACKEND, EMBEDDING_MODEL_NAME, **_embedding_options)
+
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))  # 查询向量LRU缓存容量，0表示关闭
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))  # 查询embedding微批处理最大批大小，1表示关闭
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "2"))  # 微批处理收集查询的最长等待（毫秒）
+
+
+def _create_embedding_model():
+    return create_embeddings(EMBEDDING_BACKEND, EMBEDDING_MODEL_NAME, **_embedding_options)
+
+
+# 模型在首次embedding或后台预热时才加载
+embedding_model = LazyEmbeddings(_create_embedding_model)
+query_embedding_model = embedding_model
+
+# 并发到达的查询合并为一次批量推理
+if EMBEDDING_BATCH_MAX_SIZE > 1:
+    query_embedding_model = MicroBatchingEmbeddings(
+        query_embedding_model,
+        max_batch_size=EMBEDDING_BATCH_MAX_SIZE,
+        max_wait_ms=EMBEDDING_BATCH_MAX_WAIT_MS
+    )
+
+# 查询向量经过LRU缓存，高频问题无需重复推理（缓存未命中时才进入微批处理）
+embeddings = CachedQueryEmbeddings(
+    query_embedding_model,
+    model_name=EMBEDDING_MODEL_ID,
+    max_size=QUERY_EMBEDDING_CACHE_SIZE
 )
 
 # ===== Vector Store配置 =====
-vector_store = InMemoryVectorStore(embeddings)
+# 所有向量保存在连续的float32矩阵中，一次矩阵乘法完成检索
+# 索引类型: flat（精确检索）/ ivf（IVF-Flat近似检索，适合数十万以上文档块）
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "flat")
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))  # IVF簇数，0表示约为sqrt(文档块数)
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))  # 每次检索探查的簇数，越大召回率越高、越慢
+IVF_MIN_TRAIN_SIZE = int(os.getenv("IVF_MIN_TRAIN_SIZE", "10000"))  # 文档块数少于该值时仍使用精确检索
+# 向量精度: float32（全部常驻内存）/ float16 / int8（常驻量化向量，精确向量放在内存映射文件中用于重排序）
+VECTOR_PRECISION = os.getenv("VECTOR_PRECISION", "float32")
+VECTOR_RERANK_FACTOR = int(os.getenv("VECTOR_RERANK_FACTOR", "8"))  # 量化模式下重排序的候选数为Top-K的倍数
+VECTOR_MMAP_DIR = os.getenv("VECTOR_MMAP_DIR", "")  # 精确向量内存映射文件目录，默认为系统临时目录
+
+
+def create_vector_store() -> NumpyVectorStore:
+    """按配置创建空的向量存储"""
+    return NumpyVectorStore(
+        embeddings,
+        index_type=VECTOR_INDEX_TYPE,
+        nlist=IVF_NLIST,
+        nprobe=IVF_NPROBE,
+        min_index_size=IVF_MIN_TRAIN_SIZE,
+        precision=VECTOR_PRECISION,
+        rerank_factor=VECTOR_RERANK_FACTOR,
+        mmap_dir=VECTOR_MMAP_DIR or None
+    )
+
+
+vector_store = create_vector_store()
+
+# ===== 检索配置 =====
+# 检索方式: vector（向量检索）/ bm25（字符二元组BM25关键词检索）/ hybrid（两路检索按倒数排名融合）
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))  # BM25词频饱和参数
+BM25_B = float(os.getenv("BM25_B", "0.75"))  # BM25文档长度归一化参数
+BM25_SHORT_QUERY_CHARS = int(os.getenv("BM25_SHORT_QUERY_CHARS", "4"))  # 有效字数不超过该值的查询只走BM25（不调用embedding模型），0表示关闭
+HYBRID_CANDIDATE_FACTOR = int(os.getenv("HYBRID_CANDIDATE_FACTOR", "4"))  # 混合检索每路召回的候选数为Top-K的倍数
+RRF_K = int(os.getenv("RRF_K", "60"))  # 倒数排名融合的平滑常数
+PARTITIONED_RETRIEVAL = os.getenv("PARTITIONED_RETRIEVAL", "true").lower() == "true"  # 按意图只检索对应部门的分区
+PARTITION_MIN_SCORE = float(os.getenv("PARTITION_MIN_SCORE", "0.3"))  # 分区内最高相似度低于该值时退回全局检索
+
+# ===== FAQ直接回答配置 =====
+# 查询与某个问答对的问题高度相似且明显领先第二名时，直接返回知识库答案，跳过LLM响应生成
+FAQ_FAST_PATH_ENABLED = os.getenv("FAQ_FAST_PATH_ENABLED", "true").lower() == "true"
+FAQ_MIN_SCORE = float(os.getenv("FAQ_MIN_SCORE", "0.9"))  # 直接回答所需的最小问题相似度
+FAQ_MIN_MARGIN = float(os.getenv("FAQ_MIN_MARGIN", "0.05"))  # 直接回答所需的领先第二相似问题的最小相似度差
+FAQ_ANSWER_TEMPLATE = os.getenv("FAQ_ANSWER_TEMPLATE", "{answer}")  # 回答模板，可用 {answer} {question} {section}
+
+# ===== 会话存储配置 =====
+# memory: 进程内存储（单进程）；sqlite: SQLite（WAL）存储，同一主机上的多个worker共享同一个数据库文件（不能跨主机的副本共享）
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", str(PROJECT_ROOT / ".sessions" / "sessions.db"))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))  # 最多保留的会话数，超出时淘汰最久未活跃的会话
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))  # 会话空闲过期时间（秒），0表示不过期
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "50"))  # 每个会话保留的最近消息数
+
+
+def create_session_store() -> SessionStore:
+    """按配置创建会话存储"""
+    if SESSION_BACKEND == "memory":
+        return InMemorySessionStore(
+            max_sessions=SESSION_MAX_SESSIONS,
+            ttl=SESSION_TTL,
+            max_messages=SESSION_MAX_MESSAGES
+        )
+    return SQLiteSessionStore(
+        SESSION_DB_PATH,
+        max_sessions=SESSION_MAX_SESSIONS,
+        ttl=SESSION_TTL,
+        max_messages=SESSION_MAX_MESSAGES
+    )
 
 # ===== 系统配置 =====
 # 使用相对路径，支持云部署
@@ -46,5 +175,39 @@ KNOWLEDGE_BASE_PATH = os.getenv(
     "KNOWLEDGE_BASE_PATH",
     str(PROJECT_ROOT / "customer_service_kb.txt")
 )
+KB_WATCH_INTERVAL = float(os.getenv("KB_WATCH_INTERVAL", "0"))  # 知识库文件监视间隔（秒），0表示不监视
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))  # API服务worker进程数
+# 多worker时管理接口的重新加载只作用于处理该请求的worker，不会通知其他worker；
+# 未配置监视间隔时每个worker自动以该间隔（秒）监视知识库文件，各自发现文件变化后重新加载，
+# 最长在一个间隔内各worker的知识库版本可能不一致
+MULTI_WORKER_KB_WATCH_INTERVAL = float(os.getenv("MULTI_WORKER_KB_WATCH_INTERVAL", "5"))
+if WEB_CONCURRENCY > 1 and KB_WATCH_INTERVAL <= 0:
+    KB_WATCH_INTERVAL = MULTI_WORKER_KB_WATCH_INTERVAL
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN", "")  # 管理接口令牌（请求头 X-Admin-Token），未配置时管理接口不可用
+# 分块方式: qa（按章节与问答对切分，一个问答对一个块）/ recursive（按长度递归切分）
+CHUNKER = os.getenv("CHUNKER", "qa")
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "500"))  # 文档分块大小（qa方式下只用于切分过长的非问答段落）
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))  # 相邻分块重叠字符数
 TOP_K_RESULTS = int(os.getenv("TOP_K_RESULTS", "3"))  # 知识库检索返回结果数
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))  # 响应生成时检索内容的token预算，0表示不限制
 INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.6"))  # 意图识别置信度阈值
+TRACE_LEVEL = os.getenv("TRACE_LEVEL", "INFO")  # 请求追踪记录的最低级别（DEBUG/INFO/WARNING/ERROR）
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))  # 批量对话接口单次最多消息数
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))  # 批量对话同时执行的消息数上限（限制对LLM的并发）
+GRAPH_MODE = os.getenv("GRAPH_MODE", "serial")  # serial: 意图识别后再检索；speculative: 检索与意图识别并行
+FAST_INTENT_ENABLED = os.getenv("FAST_INTENT_ENABLED", "true").lower() == "true"  # 意图识别前先用规则快速分类
+EMBEDDING_INTENT_ENABLED = os.getenv("EMBEDDING_INTENT_ENABLED", "true").lower() == "true"  # 使用本地向量意图分类器
+EMBEDDING_INTENT_THRESHOLD = float(os.getenv("EMBEDDING_INTENT_THRESHOLD", "0.7"))  # 低于该置信度时调用LLM识别意图
+
+# ===== 索引包配置 =====
+# 预先计算好的分块与向量，启动时直接加载，避免重新embedding
+INDEX_BUNDLE_DIR = os.getenv("INDEX_BUNDLE_DIR", str(PROJECT_ROOT / ".kb_index"))
+INDEX_BUNDLE_ENABLED = os.getenv("INDEX_BUNDLE_ENABLED", "true").lower() == "true"  # 是否使用索引包
+INDEX_BUNDLE_AUTO_SAVE = os.getenv("INDEX_BUNDLE_AUTO_SAVE", "true").lower() == "true"  # 重建后是否自动写回索引包
+
+# ===== 语义答案缓存配置 =====
+# 与已回答问题的向量相似度超过阈值时直接返回缓存回复，跳过整个状态图
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))  # 命中所需的最小余弦相似度
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))  # 条目有效期（秒）
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2048"))  # 最多缓存条目数
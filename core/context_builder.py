@@ -0,0 +1,143 @@
+"""
+响应生成上下文组装
+
+检索到的文档块直接拼接会带来两类冗余：
+相邻文档块之间有 CHUNK_OVERLAP 个字符的重叠，不同文档块之间也常有完全相同的行（标题、联系方式等）。
+ContextBuilder 先去掉重叠片段和重复行，再按相似度从高到低把内容装入 token 预算，
+并报告组装前后的 token 数。token 数用本地规则估算（不依赖具体模型的分词器）。
+"""
+import math
+import re
+from typing import List, Sequence
+
+from langchain_core.documents import Document
+
+from .bm25_index import CJK_CHARS
+from .config import CONTEXT_TOKEN_BUDGET, CHUNK_OVERLAP
+
+# 中日韩字符（每个字约计1个token）
+_CJK = re.compile(f"[{CJK_CHARS}]")
+# 连续的字母数字（约每4个字符1个token）
+_WORD = re.compile(r"[A-Za-z0-9_]+")
+_SPACE = re.compile(r"\s+")
+
+# 认定为重叠所需的最小公共长度，避免把偶然相同的短片段当作重叠
+MIN_OVERLAP = 8
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数：中日韩字符按1个，字母数字按每4个字符1个，其他符号按1个"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    words = _WORD.findall(text)
+    word_tokens = sum(math.ceil(len(word) / 4) for word in words)
+    symbols = len(_SPACE.sub("", text)) - cjk - sum(len(word) for word in words)
+    return cjk + word_tokens + max(symbols, 0)
+
+
+def _overlap(left: str, right: str, max_overlap: int) -> int:
+    """left 的后缀与 right 的前缀的最长公共长度（不小于 MIN_OVERLAP 时才算重叠）"""
+    limit = min(len(left), len(right), max_overlap)
+    for size in range(limit, MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+class ContextResult:
+    """组装结果"""
+
+    __slots__ = ("text", "docs", "raw_tokens", "tokens", "overlap_chars", "duplicate_lines", "truncated")
+
+    def __init__(self, text: str, docs: List[Document], raw_tokens: int, tokens: int,
+                 overlap_chars: int, duplicate_lines: int, truncated: bool):
+        self.text = text
+        self.docs = docs
+        self.raw_tokens = raw_tokens
+        self.tokens = tokens
+        self.overlap_chars = overlap_chars
+        self.duplicate_lines = duplicate_lines
+        self.truncated = truncated
+
+
+class ContextBuilder:
+    """去重叠、去重复行、按token预算装入检索内容"""
+
+    def __init__(self, token_budget: int = 1200, max_overlap: int = 200):
+        """
+        Args:
+            token_budget: 检索内容的token预算，0表示不限制
+            max_overlap: 检测文档块之间重叠的最大长度（应不小于分块的 CHUNK_OVERLAP）
+        """
+        self.token_budget = token_budget
+        self.max_overlap = max_overlap
+
+    def build(self, docs: Sequence[Document]) -> ContextResult:
+        """
+        组装上下文
+
+        Args:
+            docs: 检索到的文档（metadata 中的 score 为相似度，没有时保持原顺序）
+
+        Returns:
+            ContextResult：text 为每个文档一段、以"- "开头的上下文
+        """
+        raw_tokens = sum(estimate_tokens(doc.page_content) for doc in docs)
+        ranked = sorted(docs, key=lambda doc: doc.metadata.get("score", 0.0), reverse=True)
+
+        originals: List[str] = []  # 已选文档块原文（用于检测重叠）
+        chunks: List[str] = []      # 装入上下文的内容
+        kept_docs: List[Document] = []
+        seen_lines = set()
+        overlap_chars = duplicate_lines = 0
+        tokens = 0
+        truncated = False
+
+        for doc in ranked:
+            original = doc.page_content.strip()
+            text = original
+
+            # 去掉与已选文档块首尾重叠的片段
+            for kept in originals:
+                head = _overlap(kept, text, self.max_overlap)
+                if head:
+                    text, overlap_chars = text[head:], overlap_chars + head
+                tail = _overlap(text, kept, self.max_overlap)
+                if tail:
+                    text, overlap_chars = text[:-tail], overlap_chars + tail
+            originals.append(original)
+
+            # 去掉已出现过的行
+            lines = []
+            for line in text.splitlines():
+                key = line.strip()
+                if not key:
+                    continue
+                if key in seen_lines:
+                    duplicate_lines += 1
+                    continue
+                seen_lines.add(key)
+                lines.append(key)
+
+            # 按预算装入；装不下时按行截断并停止
+            packed = []
+            for line in lines:
+                cost = estimate_tokens(line)
+                if self.token_budget and tokens + cost > self.token_budget:
+                    truncated = True
+                    break
+                packed.append(line)
+                tokens += cost
+            if packed:
+                chunks.append("\n".join(packed))
+                kept_docs.append(doc)
+            if truncated:
+                break
+
+        text = "\n".join(f"- {chunk}" for chunk in chunks)
+        return ContextResult(text, kept_docs, raw_tokens, tokens, overlap_chars, duplicate_lines, truncated)
+
+
+# 全局上下文组装器（重叠检测长度取分块重叠的两倍，容忍分块边界处的空白差异）
+context_builder = ContextBuilder(CONTEXT_TOKEN_BUDGET, max_overlap=max(CHUNK_OVERLAP * 2, MIN_OVERLAP))
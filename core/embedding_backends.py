@@ -0,0 +1,147 @@
+"""
+Embedding后端注册表
+
+通过 EMBEDDING_BACKEND 选择embedding实现：
+
+- huggingface: sentence-transformers（PyTorch，float32），默认
+- int8: 同一模型的线性层做 PyTorch 动态int8量化，CPU推理更快，向量与float32版本高度一致
+- onnx: sentence-transformers 的 ONNX Runtime 后端（需要 pip install "sentence-transformers[onnx]"），
+  可用 EMBEDDING_ONNX_FILE 指定模型仓库中的量化ONNX文件（如 onnx/model_qint8_avx2.onnx）
+- hashing: 确定性的特征哈希向量（字符二元组+英文单词），不加载模型，用于离线测试与基准测试
+
+不同后端（以及不同模型）产生的向量不可混用，embedding_model_id 返回的标识用于查询向量缓存与索引包的键。
+"""
+import zlib
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .bm25_index import CJK_RUN, WORD
+
+DEFAULT_BACKEND = "huggingface"
+
+_BACKENDS: Dict[str, Callable[..., Embeddings]] = {}
+
+
+def register_backend(name: str):
+    """注册embedding后端（装饰创建函数：factory(model_name, **options) -> Embeddings）"""
+    def decorator(factory: Callable[..., Embeddings]):
+        _BACKENDS[name] = factory
+        return factory
+    return decorator
+
+
+def available_backends() -> List[str]:
+    """已注册的后端名称"""
+    return list(_BACKENDS)
+
+
+def create_embeddings(backend: str, model_name: str, **options) -> Embeddings:
+    """
+    按后端名称创建embedding对象
+
+    Args:
+        backend: 后端名称
+        model_name: 模型名称（hashing 后端忽略）
+        options: 后端参数（如 onnx_file、dim）
+    """
+    factory = _BACKENDS.get(backend)
+    if factory is None:
+        raise ValueError(f"未知的embedding后端: {backend}（可选: {', '.join(_BACKENDS)}）")
+    return factory(model_name, **options)
+
+
+def embedding_model_id(backend: str, model_name: str, **options) -> str:
+    """
+    向量空间标识：默认后端沿用模型名称（兼容已有索引包），其他后端加上后端前缀
+
+    onnx 后端还包含模型文件（不同文件可能是不同的量化版本，向量不同），
+    更换文件后不会复用旧的索引包与查询向量缓存。
+    """
+    if backend == "hashing":
+        return f"hashing:{options.get('dim') or HashingEmbeddings.DEFAULT_DIM}"
+    if backend == DEFAULT_BACKEND:
+        return model_name
+    if backend == "onnx" and options.get("onnx_file"):
+        return f"onnx:{model_name}:{options['onnx_file']}"
+    return f"{backend}:{model_name}"
+
+
+def _huggingface(model_name: str, model_kwargs: Optional[dict] = None):
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs={'device': 'cpu', **(model_kwargs or {})},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+
+
+@register_backend("huggingface")
+def create_huggingface(model_name: str, **options) -> Embeddings:
+    return _huggingface(model_name)
+
+
+@register_backend("int8")
+def create_int8(model_name: str, **options) -> Embeddings:
+    import torch
+
+    embeddings = _huggingface(model_name)
+    # 只量化线性层（Transformer计算量的主体），权重int8、激活按批动态量化
+    embeddings._client = torch.ao.quantization.quantize_dynamic(
+        embeddings._client, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    return embeddings
+
+
+@register_backend("onnx")
+def create_onnx(model_name: str, onnx_file: str = "", **options) -> Embeddings:
+    model_kwargs = {"backend": "onnx"}
+    if onnx_file:
+        model_kwargs["model_kwargs"] = {"file_name": onnx_file}
+    try:
+        return _huggingface(model_name, model_kwargs)
+    except ImportError as e:
+        raise ImportError(f'onnx 后端需要 ONNX Runtime: pip install "sentence-transformers[onnx]"（{e}）') from e
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    确定性的特征哈希向量
+
+    特征为中日韩字符的单字与二元组、英文小写单词，按 crc32 哈希到固定维度并带符号累加，最后L2归一化。
+    同一文本在任何进程、任何机器上得到相同的向量；字面相近的文本相似度高，但不理解语义。
+    """
+
+    DEFAULT_DIM = 384
+
+    def __init__(self, dim: int = DEFAULT_DIM):
+        self.dim = dim
+
+    @staticmethod
+    def _features(text: str) -> List[str]:
+        features = []
+        for run in CJK_RUN.findall(text):
+            features.extend(run)
+            features.extend(run[i:i + 2] for i in range(len(run) - 1))
+        features.extend(WORD.findall(text.lower()))
+        return features
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text).tolist()
+
+
+@register_backend("hashing")
+def create_hashing(model_name: str, dim: int = 0, **options) -> Embeddings:
+    return HashingEmbeddings(dim or HashingEmbeddings.DEFAULT_DIM)
@@ -0,0 +1,154 @@
+"""
+查询embedding动态微批处理
+
+并发请求各自调用 embedding 模型时每次只推理1条查询，CPU的矩阵运算吞吐大部分被浪费。
+MicroBatchingEmbeddings 把同一时间窗口内（几毫秒）到达的查询合并为一次批量前向推理，
+再把结果分发回各个等待的调用方：
+
+- 后台线程取到第一条查询后，继续收集队列中的查询，直到凑满 max_batch_size 或等待超过 max_wait_ms
+- 模型推理期间到达的查询在队列中排队，下一批直接带走，负载越高批次越大
+- 上一批只有1条查询（低负载）时不等待，单个请求不会因为攒批增加延迟
+- 同步调用方阻塞等待结果，异步调用方 await 结果，都不额外占用线程池
+
+embed_documents（知识库建库）本身就是批量调用，直接转发给被包装的模型。
+"""
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from .metrics import EMBEDDING_BATCH_SIZE, EMBEDDING_BATCH_WAIT, EMBEDDING_QUEUE_DEPTH
+
+# 关闭后台线程的哨兵
+_STOP = object()
+
+
+class MicroBatchingEmbeddings(Embeddings):
+    """把并发的 embed_query 合并为批量推理"""
+
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = 32, max_wait_ms: float = 2.0):
+        """
+        Args:
+            embeddings: 被包装的embedding对象
+            max_batch_size: 单次批量推理最多的查询数
+            max_wait_ms: 取到第一条查询后最多再等待多久收集后续查询（毫秒）
+        """
+        self.embeddings = embeddings
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+
+        self._queue: "queue.SimpleQueue[Tuple[str, Future, float]]" = queue.SimpleQueue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._last_batch_size = 1
+        self.batches = 0
+        self.queries = 0
+        self.max_observed_batch = 0
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._worker.start()
+
+    def _submit(self, text: str) -> Future:
+        """把查询放入队列，返回结果Future"""
+        if self._closed:
+            raise RuntimeError("MicroBatchingEmbeddings 已关闭")
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        EMBEDDING_QUEUE_DEPTH.set(self._queue.qsize())
+        return future
+
+    def _collect(self, first) -> list:
+        """从第一条查询开始收集一批"""
+        batch = [first]
+        # 低负载时不等待，只带走已在排队的查询
+        wait = self.max_wait if self._last_batch_size > 1 else 0.0
+        deadline = time.perf_counter() + wait
+        while len(batch) < self.max_batch_size:
+            try:
+                # 先取走已在排队的查询，队列空了再等到截止时间
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is _STOP:
+                self._queue.put(_STOP)  # 处理完本批后再退出
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = self._collect(first)
+            self._last_batch_size = len(batch)
+            EMBEDDING_QUEUE_DEPTH.set(self._queue.qsize())
+
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                EMBEDDING_BATCH_WAIT.observe(started - enqueued)
+            EMBEDDING_BATCH_SIZE.observe(len(batch))
+            self.batches += 1
+            self.queries += len(batch)
+            self.max_observed_batch = max(self.max_observed_batch, len(batch))
+
+            try:
+                vectors = self.embeddings.embed_documents([text for text, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def embed_query(self, text: str) -> List[float]:
+        """embedding查询文本（与其他并发查询合并推理）"""
+        return self._submit(text).result()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """异步embedding查询文本，等待期间不占用线程"""
+        return await asyncio.wrap_future(self._submit(text))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """embedding文档（本身已是批量，直接转发）"""
+        return self.embeddings.embed_documents(texts)
+
+    def close(self) -> None:
+        """处理完已排队的查询后停止后台线程"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            worker = self._worker
+        if worker is not None:
+            self._queue.put(_STOP)
+            worker.join()
+
+    def stats(self) -> dict:
+        """批处理统计"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0,
+            "max_observed_batch": self.max_observed_batch,
+            "queue_depth": self._queue.qsize(),
+        }
@@ -0,0 +1,138 @@
+"""
+查询向量LRU缓存
+
+业务流量集中在几百个高频问题上（"如何申请年假？"、"如何报销差旅费？"……），
+对同一个问题反复调用embedding模型是纯粹的浪费。
+CachedQueryEmbeddings 包装任意 Embeddings 对象，embed_query 先查缓存，命中时完全跳过模型推理。
+embed_documents（知识库建库）不经过缓存。
+"""
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+from langchain_core.embeddings import Embeddings
+
+from .metrics import EMBEDDING_DURATION
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """规范化查询文本：NFKC（全角转半角）、合并空白、去除首尾空白"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """带LRU缓存的查询embedding"""
+
+    def __init__(self, embeddings: Embeddings, model_name: str, max_size: int = 2048):
+        """
+        Args:
+            embeddings: 被包装的embedding对象
+            model_name: 模型名称（作为缓存键的一部分，切换模型后旧缓存自动失效）
+            max_size: 最多缓存的查询数，0表示不缓存
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_size = max_size
+
+        self._cache: "OrderedDict[tuple, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, text: str) -> tuple:
+        return self.model_name, normalize_query(text)
+
+    def _get(self, key: tuple) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return list(vector)
+
+    def _put(self, key: tuple, vector: Sequence[float]) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._cache[key] = list(vector)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+
+    def embed_query(self, text: str) -> List[float]:
+        """embedding查询文本（优先使用缓存）"""
+        key = self._key(text)
+        vector = self._get(key)
+        if vector is None:
+            start = time.perf_counter()
+            vector = self.embeddings.embed_query(key[1])
+            EMBEDDING_DURATION.observe(time.perf_counter() - start)
+            self._put(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """异步embedding查询文本，缓存命中时不占用线程池"""
+        key = self._key(text)
+        vector = self._get(key)
+        if vector is None:
+            start = time.perf_counter()
+            # 被包装对象若支持原生异步（如微批处理），等待期间不占用线程池
+            vector = await self.embeddings.aembed_query(key[1])
+            EMBEDDING_DURATION.observe(time.perf_counter() - start)
+            self._put(key, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """embedding文档（不经过缓存）"""
+        return self.embeddings.embed_documents(texts)
+
+    def prime(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """用已计算好的查询向量预热缓存"""
+        for text, vector in zip(texts, vectors):
+            self._put(self._key(text), vector)
+
+    def prime_queries(self, texts: Sequence[str]) -> int:
+        """
+        批量预热查询向量：未缓存的查询（去重后）合并为一次 embed_documents 调用
+
+        Returns:
+            实际embedding的查询数
+        """
+        with self._lock:
+            missing = list(dict.fromkeys(key for key in map(self._key, texts) if key not in self._cache))
+        if not missing:
+            return 0
+
+        start = time.perf_counter()
+        vectors = self.embeddings.embed_documents([key[1] for key in missing])
+        EMBEDDING_DURATION.observe(time.perf_counter() - start)
+        for key, vector in zip(missing, vectors):
+            self._put(key, vector)
+        return len(missing)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        """缓存统计"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._cache),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,197 @@
+"""
+FAQ直接回答
+
+很多问题与知识库中的某个 "问：/答：" 问答对一一对应。查询与某个问答对的问题足够相似（不低于 FAQ_MIN_SCORE），
+且明显高于第二相似的问题（领先不少于 FAQ_MIN_MARGIN）时，直接返回知识库中的答案（按 FAQ_ANSWER_TEMPLATE 套用模板），
+跳过LLM响应生成。
+
+相似度为查询与问答对问题向量的余弦相似度（KnowledgeBase.search_questions）；混合检索的融合分数、
+BM25分数没有固定的取值范围，不能与固定阈值比较。
+与检索相同，按意图只匹配对应部门分区的问答对；分区内没有问答对或最高相似度低于 PARTITION_MIN_SCORE 时退回全部分区。
+短查询（有效字数不超过 BM25_SHORT_QUERY_CHARS）不做匹配，保持只走BM25、不调用embedding模型。
+"""
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from .bm25_index import text_length
+from .config import (
+    FAQ_FAST_PATH_ENABLED, FAQ_MIN_SCORE, FAQ_MIN_MARGIN, FAQ_ANSWER_TEMPLATE, BM25_SHORT_QUERY_CHARS,
+    PARTITION_MIN_SCORE
+)
+from .knowledge_base import PARTITION_FIELD, knowledge_base
+from .metrics import ANSWER_DURATION, FAQ_FAST_PATH
+
+# 答案行（"答：..."）
+_ANSWER = re.compile(r"^\s*答[：:]\s*", re.MULTILINE)
+
+
+def extract_answer(text: str) -> Optional[str]:
+    """取出问答对分块中 "答：" 之后的答案，没有答案时返回None"""
+    match = _ANSWER.search(text)
+    if match is None:
+        return None
+    return text[match.end():].strip() or None
+
+
+@dataclass
+class FAQMatch:
+    """命中的问答对"""
+    question: str
+    answer: str
+    section: str
+    score: float  # 查询与问题的余弦相似度
+    margin: float  # 领先第二相似问题的相似度
+    document: Document
+
+
+class _IntentTally:
+    """单个意图的计数与耗时"""
+
+    def __init__(self):
+        self.checks = 0
+        self.hits = 0
+        self.check_seconds = 0.0
+        self.generations = 0
+        self.generation_seconds = 0.0
+
+
+class FAQFastPath:
+    """FAQ直接回答：匹配问答对，并按意图统计直答率与节省的耗时"""
+
+    def __init__(self, kb=knowledge_base, enabled: bool = True, min_score: float = 0.9,
+                 min_margin: float = 0.05, template: str = "{answer}"):
+        """
+        Args:
+            kb: 知识库
+            enabled: 是否启用
+            min_score: 直接回答所需的最小问题相似度
+            min_margin: 直接回答所需的领先第二相似问题的最小相似度差
+            template: 回答模板，可用 {answer} {question} {section}
+        """
+        self.kb = kb
+        self.enabled = enabled
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.template = template
+        self._tallies: Dict[str, _IntentTally] = {}
+        self._lock = threading.Lock()
+
+    def match(self, query: str, partitions: Optional[Sequence[str]] = None) -> Tuple[Optional[FAQMatch], str]:
+        """
+        查找可以直接回答的问答对
+
+        Args:
+            partitions: 只匹配这些分区（章节）的问答对，None表示全部分区
+
+        Returns:
+            (FAQMatch, 结果)，结果为 hit / miss（相似度不足或没有答案）/ ambiguous（与第二名差距不足）/ skipped（未启用或短查询）
+        """
+        if not self.enabled or text_length(query) <= BM25_SHORT_QUERY_CHARS:
+            return None, "skipped"
+
+        hits = []
+        if partitions is not None:
+            hits = self.kb.search_questions(query, k=2, filter={PARTITION_FIELD: list(partitions)})
+        if not hits or hits[0][1] < PARTITION_MIN_SCORE:
+            hits = self.kb.search_questions(query, k=2)
+        if not hits or hits[0][1] < self.min_score:
+            return None, "miss"
+
+        document, score = hits[0]
+        margin = score - hits[1][1] if len(hits) > 1 else score
+        if margin < self.min_margin:
+            return None, "ambiguous"
+
+        answer = extract_answer(document.page_content)
+        if answer is None:
+            return None, "miss"
+        metadata = document.metadata or {}
+        return FAQMatch(metadata.get("question", ""), answer, metadata.get("section", ""),
+                        float(score), float(margin), document), "hit"
+
+    def render(self, match: FAQMatch) -> str:
+        """按模板生成回答"""
+        return self.template.format(answer=match.answer, question=match.question, section=match.section)
+
+    def _tally(self, intent: str) -> _IntentTally:
+        tally = self._tallies.get(intent)
+        if tally is None:
+            tally = self._tallies.setdefault(intent, _IntentTally())
+        return tally
+
+    def record_check(self, intent: str, result: str, seconds: float) -> None:
+        """记录一次匹配（skipped 不计入直答率）"""
+        FAQ_FAST_PATH.labels(intent, result).inc()
+        if result == "skipped":
+            return
+        if result == "hit":
+            ANSWER_DURATION.labels(intent, "faq").observe(seconds)
+        with self._lock:
+            tally = self._tally(intent)
+            tally.checks += 1
+            tally.check_seconds += seconds
+            if result == "hit":
+                tally.hits += 1
+
+    def record_generation(self, intent: str, seconds: float) -> None:
+        """记录一次LLM响应生成的耗时（用于估算直接回答节省的耗时）"""
+        ANSWER_DURATION.labels(intent, "llm").observe(seconds)
+        with self._lock:
+            tally = self._tally(intent)
+            tally.generations += 1
+            tally.generation_seconds += seconds
+
+    def stats(self) -> dict:
+        """
+        按意图统计直答率与节省的耗时
+
+        节省的耗时 = 直答次数 × (该意图平均LLM生成耗时 − 平均匹配耗时)；
+        该意图还没有生成记录时使用全部意图的平均生成耗时。
+        """
+        with self._lock:
+            tallies = {intent: vars(tally).copy() for intent, tally in self._tallies.items()}
+
+        generations = sum(t["generations"] for t in tallies.values())
+        overall_generation = sum(t["generation_seconds"] for t in tallies.values()) / generations if generations else 0.0
+
+        by_intent = {}
+        total_checks = total_hits = 0
+        total_saved = 0.0
+        for intent, t in sorted(tallies.items()):
+            check = t["check_seconds"] / t["checks"] if t["checks"] else 0.0
+            generation = t["generation_seconds"] / t["generations"] if t["generations"] else overall_generation
+            saved = t["hits"] * max(generation - check, 0.0)
+            by_intent[intent] = {
+                "checks": t["checks"],
+                "hits": t["hits"],
+                "hit_rate": round(t["hits"] / t["checks"], 4) if t["checks"] else 0.0,
+                "check_ms": round(check * 1000, 2),
+                "generation_ms": round(generation * 1000, 1),
+                "latency_saved_ms": round(saved * 1000, 1),
+            }
+            total_checks += t["checks"]
+            total_hits += t["hits"]
+            total_saved += saved
+
+        return {
+            "enabled": self.enabled,
+            "min_score": self.min_score,
+            "min_margin": self.min_margin,
+            "checks": total_checks,
+            "hits": total_hits,
+            "hit_rate": round(total_hits / total_checks, 4) if total_checks else 0.0,
+            "latency_saved_ms": round(total_saved * 1000, 1),
+            "by_intent": by_intent,
+        }
+
+
+faq_fast_path = FAQFastPath(
+    enabled=FAQ_FAST_PATH_ENABLED,
+    min_score=FAQ_MIN_SCORE,
+    min_margin=FAQ_MIN_MARGIN,
+    template=FAQ_ANSWER_TEMPLATE
+)
@@ -1,41 +1,107 @@
 """
 LangGraph状态图定义
 """
-from langgraph.graph import StateGraph, END
+import time
 
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import StateGraph, START, END
+
+from .config import GRAPH_MODE
 from .models import EnterpriseQueryState
+from . import tracing
+from .metrics import NODE_DURATION, NODE_ERRORS
 from .nodes import (
     intent_recognition_node,
+    aintent_recognition_node,
     router_node,
+    retrieval_router,
     greeting_handler_node,
     knowledge_retrieval_node,
+    aknowledge_retrieval_node,
     chitchat_handler_node,
+    achitchat_handler_node,
     response_generation_node,
-    transfer_to_human_node
+    aresponse_generation_node,
+    transfer_to_human_node,
+    speculative_retrieval_node,
+    aspeculative_retrieval_node,
+    intent_join_node
 )
 
 
-def create_enterprise_query_graph():
+def _node(name: str, func, afunc=None):
+    """
+    包装节点：记录节点耗时与输出大小（tracing span），以及耗时直方图和出错次数
+
+    提供异步实现的节点在 graph.ainvoke 时走异步实现（LLM走ainvoke，检索放到线程池），
+    其余轻量节点由LangGraph在线程池中执行同步实现。
+    """
+    duration = NODE_DURATION.labels(name)
+    errors = NODE_ERRORS.labels(name)
+
+    def record(start, update):
+        duration.observe(time.perf_counter() - start)
+        if update is None or update.get("error"):
+            errors.inc()
+
+    def traced(state):
+        start, update = time.perf_counter(), None
+        try:
+            with tracing.span("node", "%s", name, name=name) as span:
+                span.payload = update = func(state)
+            return update
+        finally:
+            record(start, update)
+
+    async def atraced(state):
+        start, update = time.perf_counter(), None
+        try:
+            with tracing.span("node", "%s", name, name=name) as span:
+                span.payload = update = await afunc(state)
+            return update
+        finally:
+            record(start, update)
+
+    return RunnableLambda(traced, afunc=atraced if afunc else None, name=name)
+
+
+def create_enterprise_query_graph(mode: str = GRAPH_MODE):
     """
     创建企业内部查询助手状态图
+
+    Args:
+        mode: serial（意图识别后再检索）或 speculative（检索与意图识别并行执行）
     """
     # 创建状态图
     workflow = StateGraph(EnterpriseQueryState)
 
+    def add_node(name, func, afunc=None):
+        workflow.add_node(name, _node(name, func, afunc))
+
     # 添加节点
-    workflow.add_node("intent_recognition", intent_recognition_node)
-    workflow.add_node("greeting_handler", greeting_handler_node)
-    workflow.add_node("knowledge_retrieval", knowledge_retrieval_node)
-    workflow.add_node("chitchat_handler", chitchat_handler_node)
-    workflow.add_node("response_generation", response_generation_node)
-    workflow.add_node("transfer_to_human", transfer_to_human_node)
+    add_node("intent_recognition", intent_recognition_node, aintent_recognition_node)
+    add_node("greeting_handler", greeting_handler_node)
+    add_node("knowledge_retrieval", knowledge_retrieval_node, aknowledge_retrieval_node)
+    add_node("chitchat_handler", chitchat_handler_node, achitchat_handler_node)
+    add_node("response_generation", response_generation_node, aresponse_generation_node)
+    add_node("transfer_to_human", transfer_to_human_node)
 
-    # 设置入口点
-    workflow.set_entry_point("intent_recognition")
+    if mode == "speculative":
+        # 意图识别与知识库检索同时开始，两者都完成后再路由
+        add_node("speculative_retrieval", speculative_retrieval_node, aspeculative_retrieval_node)
+        add_node("intent_join", intent_join_node)
+        workflow.add_edge(START, "intent_recognition")
+        workflow.add_edge(START, "speculative_retrieval")
+        workflow.add_edge(["intent_recognition", "speculative_retrieval"], "intent_join")
+        route_source = "intent_join"
+    else:
+        # 设置入口点
+        workflow.set_entry_point("intent_recognition")
+        route_source = "intent_recognition"
 
     # 添加条件路由边（从意图识别到各个处理器）
     workflow.add_conditional_edges(
-        "intent_recognition",
+        route_source,
         router_node,
         {
             "greeting_handler": "greeting_handler",
@@ -47,7 +113,15 @@ def create_enterprise_query_graph():
 
     # 各处理节点到响应生成或结束
     workflow.add_edge("greeting_handler", END)
-    workflow.add_edge("knowledge_retrieval", "response_generation")
+    # FAQ直接回答时跳过响应生成
+    workflow.add_conditional_edges(
+        "knowledge_retrieval",
+        retrieval_router,
+        {
+            "response_generation": "response_generation",
+            "end": END
+        }
+    )
     workflow.add_edge("chitchat_handler", END)
     workflow.add_edge("response_generation", END)
     workflow.add_edge("transfer_to_human", END)
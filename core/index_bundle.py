@@ -0,0 +1,229 @@
+"""
+知识库索引包（Index Bundle）
+
+把知识库的分块文本、元数据、float32向量矩阵以及问答对问题的向量矩阵预先计算好并保存到磁盘，
+进程启动时直接加载（向量矩阵以内存映射方式打开），无需再次调用embedding模型。
+
+索引包以三项内容作为键，任意一项变化都会导致索引包失效并重建：
+- 知识库文件内容的SHA-256
+- embedding模型名称
+- 分块器配置
+
+目录结构：
+    .kb_index/
+    ├── manifest.json     # 版本、键、分块数、向量维度
+    ├── chunks.json       # 分块文本与元数据
+    ├── embeddings.npy    # float32 向量矩阵 (n_chunks, dim)
+    └── question_embeddings.npy  # 问答对问题的float32向量矩阵 (n_questions, dim)，按分块顺序
+
+命令行用法：
+    python -m core.index_bundle build            # 构建索引包
+    python -m core.index_bundle build --force    # 忽略已有索引包，强制重建
+    python -m core.index_bundle info             # 查看索引包信息
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+# 索引包格式版本，格式不兼容变更时递增
+BUNDLE_FORMAT_VERSION = 2
+
+MANIFEST_FILE = "manifest.json"
+CHUNKS_FILE = "chunks.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+QUESTION_EMBEDDINGS_FILE = "question_embeddings.npy"
+
+
+def content_sha256(content: bytes) -> str:
+    """计算内容的SHA-256"""
+    return hashlib.sha256(content).hexdigest()
+
+
+def make_bundle_key(kb_sha256: str, model_name: str, splitter_settings: dict) -> dict:
+    """
+    生成索引包的键
+
+    Args:
+        kb_sha256: 知识库文件内容的SHA-256
+        model_name: embedding模型名称
+        splitter_settings: 分块器配置
+    """
+    return {
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "kb_sha256": kb_sha256,
+        "embedding_model": model_name,
+        "splitter": splitter_settings,
+    }
+
+
+class IndexBundle:
+    """已加载的索引包"""
+
+    def __init__(self, key: dict, texts: List[str], metadatas: List[dict], vectors: np.ndarray,
+                 question_vectors: np.ndarray):
+        self.key = key
+        self.texts = texts
+        self.metadatas = metadatas
+        self.vectors = vectors  # (n_chunks, dim) float32，通常为只读内存映射
+        self.question_vectors = question_vectors  # (n_questions, dim) float32，按分块顺序对应带问题的分块
+
+    def __len__(self):
+        return len(self.texts)
+
+
+def read_manifest(bundle_dir: str) -> Optional[dict]:
+    """读取索引包清单，不存在或损坏时返回None"""
+    path = Path(bundle_dir) / MANIFEST_FILE
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_bundle(bundle_dir: str, expected_key: dict) -> Optional[IndexBundle]:
+    """
+    加载索引包
+
+    Args:
+        bundle_dir: 索引包目录
+        expected_key: 期望的键，与清单中记录的键不一致时视为失效
+
+    Returns:
+        键匹配时返回IndexBundle，否则返回None
+    """
+    manifest = read_manifest(bundle_dir)
+    if manifest is None or manifest.get("key") != expected_key:
+        return None
+
+    bundle_path = Path(bundle_dir)
+    try:
+        with open(bundle_path / CHUNKS_FILE, "r", encoding="utf-8") as f:
+            chunks = json.load(f)
+        vectors = np.load(bundle_path / EMBEDDINGS_FILE, mmap_mode="r")
+        question_vectors = np.load(bundle_path / QUESTION_EMBEDDINGS_FILE, mmap_mode="r")
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 索引包损坏，将重建: {e}")
+        return None
+
+    n_chunks = manifest.get("n_chunks")
+    if len(chunks) != n_chunks or vectors.shape != (n_chunks, manifest.get("dim")) \
+            or vectors.dtype != np.float32 \
+            or question_vectors.shape != (manifest.get("n_questions"), manifest.get("dim")):
+        print("⚠️ 索引包内容与清单不一致，将重建")
+        return None
+
+    return IndexBundle(
+        key=manifest["key"],
+        texts=[chunk["text"] for chunk in chunks],
+        metadatas=[chunk["metadata"] for chunk in chunks],
+        vectors=vectors,
+        question_vectors=question_vectors
+    )
+
+
+def save_bundle(bundle_dir: str, key: dict, texts: List[str], metadatas: List[dict], vectors,
+                question_vectors=None) -> None:
+    """
+    保存索引包
+
+    question_vectors 为带问题的分块（按分块顺序）的问题向量，没有时保存空矩阵。
+
+    各文件先写入临时文件再原子替换，清单最后写入，
+    因此多个进程同时写入或写入中途崩溃都不会留下半成品。
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectors.ndim != 2 or vectors.shape[0] != len(texts):
+        raise ValueError(f"向量矩阵形状 {vectors.shape} 与分块数 {len(texts)} 不一致")
+    dim = int(vectors.shape[1]) if len(texts) else 0
+    question_vectors = np.ascontiguousarray(question_vectors if question_vectors is not None else [],
+                                            dtype=np.float32)
+    if not question_vectors.size:
+        question_vectors = np.empty((0, dim), dtype=np.float32)
+    elif question_vectors.ndim != 2 or question_vectors.shape[1] != dim:
+        raise ValueError(f"问题向量矩阵形状 {question_vectors.shape} 与向量维度 {dim} 不一致")
+
+    bundle_path = Path(bundle_dir)
+    bundle_path.mkdir(parents=True, exist_ok=True)
+    suffix = f".tmp-{os.getpid()}"
+
+    # 先使旧清单失效，避免新旧文件混用
+    manifest_path = bundle_path / MANIFEST_FILE
+    if manifest_path.exists():
+        manifest_path.unlink()
+
+    embeddings_tmp = bundle_path / (EMBEDDINGS_FILE + suffix)
+    with open(embeddings_tmp, "wb") as f:
+        np.save(f, vectors)
+    os.replace(embeddings_tmp, bundle_path / EMBEDDINGS_FILE)
+
+    questions_tmp = bundle_path / (QUESTION_EMBEDDINGS_FILE + suffix)
+    with open(questions_tmp, "wb") as f:
+        np.save(f, question_vectors)
+    os.replace(questions_tmp, bundle_path / QUESTION_EMBEDDINGS_FILE)
+
+    chunks_tmp = bundle_path / (CHUNKS_FILE + suffix)
+    with open(chunks_tmp, "w", encoding="utf-8") as f:
+        json.dump(
+            [{"text": text, "metadata": metadata} for text, metadata in zip(texts, metadatas)],
+            f, ensure_ascii=False
+        )
+    os.replace(chunks_tmp, bundle_path / CHUNKS_FILE)
+
+    manifest = {
+        "key": key,
+        "n_chunks": len(texts),
+        "n_questions": len(question_vectors),
+        "dim": dim,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    manifest_tmp = bundle_path / (MANIFEST_FILE + suffix)
+    with open(manifest_tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(manifest_tmp, manifest_path)
+
+
+def main(argv=None):
+    """命令行入口"""
+    from .config import INDEX_BUNDLE_DIR, KNOWLEDGE_BASE_PATH
+
+    parser = argparse.ArgumentParser(description="知识库索引包工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="构建索引包")
+    build_parser.add_argument("--kb", default=KNOWLEDGE_BASE_PATH, help="知识库文件路径")
+    build_parser.add_argument("--out", default=INDEX_BUNDLE_DIR, help="索引包输出目录")
+    build_parser.add_argument("--force", action="store_true", help="忽略已有索引包，强制重新embedding")
+
+    info_parser = subparsers.add_parser("info", help="查看索引包信息")
+    info_parser.add_argument("--out", default=INDEX_BUNDLE_DIR, help="索引包目录")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        manifest = read_manifest(args.out)
+        if manifest is None:
+            print(f"❌ 未找到索引包: {args.out}")
+            return 1
+        print(json.dumps(manifest, ensure_ascii=False, indent=2))
+        return 0
+
+    from .knowledge_base import KnowledgeBase
+
+    kb = KnowledgeBase(bundle_dir=args.out)
+    start = time.perf_counter()
+    if not kb.load_knowledge_base(args.kb, use_bundle=not args.force, save_bundle=True):
+        return 1
+    print(f"✅ 索引包已就绪: {args.out} ({time.perf_counter() - start:.2f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+基于embedding的本地意图分类器
+
+为每个意图准备一组标注样例（部门类样例取自知识库问答对的问题，按所在章节归入意图，
+问候/闲聊/转人工使用内置样例），用已加载的embedding模型计算各意图的中心向量，
+按与中心向量的余弦相似度分类。置信度为带温度的softmax，
+温度在训练样例上用留一法（leave-one-out）做温度缩放校准。
+
+置信度达到阈值时直接给出意图，否则交由LLM识别。
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .chunker import QUESTION_PATTERN, SECTION_PATTERN
+from .config import embeddings
+from .intent_rules import DEPARTMENT_KEYWORDS
+
+# 知识库章节标题 -> 意图
+SECTION_INTENTS = {
+    "行政管理": "admin_inquiry",
+    "人力资源": "hr_inquiry",
+    "IT办公": "it_inquiry",
+    "法务合规": "legal_inquiry",
+    "财务报销": "finance_inquiry",
+    "采购管理": "procurement_inquiry",
+    "其他常见问题": "general_inquiry",
+}
+
+# 知识库中没有的意图使用内置样例
+SEED_EXAMPLES: Dict[str, List[str]] = {
+    "greeting": [
+        "你好", "您好", "在吗", "早上好", "下午好", "hello", "嗨，有人吗", "你好，请问在吗",
+    ],
+    "chitchat": [
+        "今天天气怎么样", "讲个笑话", "你是谁", "你叫什么名字", "谢谢你", "再见",
+        "周末去哪里玩", "推荐一部电影", "你吃饭了吗", "好无聊啊",
+    ],
+    "transfer_human": [
+        "转人工", "我要找人工客服", "帮我转接人工", "我想和真人聊", "联系HR", "找行政的人",
+        "不要机器人，给我转人工", "能帮我联系一下IT部门的同事吗",
+    ],
+}
+
+# 温度缩放的候选温度
+TEMPERATURE_GRID = (0.01, 0.02, 0.03, 0.05, 0.07, 0.1, 0.15, 0.2, 0.3, 0.5)
+
+
+def section_examples(qa_pairs: Iterable[Tuple[str, str]]) -> Dict[str, List[str]]:
+    """把 (章节, 问题) 按章节归入意图，不在 SECTION_INTENTS 中的章节忽略"""
+    examples: Dict[str, List[str]] = {}
+    for section, question in qa_pairs:
+        intent = SECTION_INTENTS.get(section)
+        if intent and question:
+            examples.setdefault(intent, []).append(question)
+    return examples
+
+
+def extract_kb_examples(content: str) -> Dict[str, List[str]]:
+    """从知识库文本中按章节提取"问："样例（与QA分块器使用相同的格式定义）"""
+    qa_pairs = []
+    section = None
+    for line in content.splitlines():
+        section_match = SECTION_PATTERN.match(line)
+        if section_match:
+            section = section_match.group(1)
+            continue
+        question = QUESTION_PATTERN.match(line)
+        if question and section is not None:
+            qa_pairs.append((section, question.group(1)))
+    return section_examples(qa_pairs)
+
+
+def bootstrap_examples(kb_path: str, qa_pairs: Optional[Sequence[Tuple[str, str]]] = None) -> Dict[str, List[str]]:
+    """
+    知识库样例 + 内置样例
+
+    Args:
+        kb_path: 知识库文件路径
+        qa_pairs: 已加载知识库分块metadata中的 (章节, 问题)；为空（如非QA分块）时从知识库文件解析
+    """
+    if qa_pairs:
+        examples = section_examples(qa_pairs)
+    else:
+        with open(kb_path, "r", encoding="utf-8") as f:
+            examples = extract_kb_examples(f.read())
+    for intent, texts in SEED_EXAMPLES.items():
+        examples.setdefault(intent, []).extend(texts)
+    return examples
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+class EmbeddingIntentClassifier:
+    """最近中心向量意图分类器"""
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+        self.intents: List[str] = []
+        self.centroids: Optional[np.ndarray] = None  # (n_intents, dim)
+        self.temperature = 0.05
+
+        self._lock = threading.Lock()
+        self.total = 0
+        self.accepted: Dict[str, int] = {}
+
+    @property
+    def fitted(self) -> bool:
+        return self.centroids is not None
+
+    def fit(self, examples: Dict[str, List[str]]) -> None:
+        """
+        根据标注样例计算各意图中心向量并校准温度
+
+        Args:
+            examples: 意图 -> 样例文本列表
+        """
+        intents = [intent for intent, texts in examples.items() if texts]
+        texts = [text for intent in intents for text in examples[intent]]
+        labels = np.array([i for i, intent in enumerate(intents) for _ in examples[intent]])
+
+        vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+        sums = np.zeros((len(intents), vectors.shape[1]), dtype=np.float32)
+        np.add.at(sums, labels, vectors)
+        counts = np.bincount(labels, minlength=len(intents))
+        centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+
+        temperature = self._calibrate(vectors, labels, sums, counts)
+
+        with self._lock:
+            self.intents = intents
+            self.centroids = centroids
+            self.temperature = temperature
+
+    @staticmethod
+    def _calibrate(vectors: np.ndarray, labels: np.ndarray, sums: np.ndarray, counts: np.ndarray) -> float:
+        """
+        温度缩放：用留一法相似度选出使负对数似然最小的温度
+
+        每个样例与自身所属意图的相似度用去掉该样例后的中心向量计算，避免过度自信。
+        """
+        sims = vectors @ (sums / np.linalg.norm(sums, axis=1, keepdims=True)).T
+        rows = np.arange(len(vectors))
+        own_sum = sums[labels]
+        own_dot = np.einsum("ij,ij->i", vectors, own_sum) - 1.0
+        own_norm_sq = np.einsum("ij,ij->i", own_sum, own_sum) - 2 * (own_dot + 1.0) + 1.0
+        has_others = counts[labels] > 1
+        sims[rows[has_others], labels[has_others]] = \
+            own_dot[has_others] / np.sqrt(np.maximum(own_norm_sq[has_others], 1e-12))
+
+        best_temperature, best_nll = TEMPERATURE_GRID[0], np.inf
+        for temperature in TEMPERATURE_GRID:
+            probs = _softmax(sims / temperature)
+            nll = -np.mean(np.log(probs[rows, labels] + 1e-12))
+            if nll < best_nll:
+                best_temperature, best_nll = temperature, nll
+        return best_temperature
+
+    def classify(self, message: str, threshold: float) -> Optional[dict]:
+        """
+        对消息分类
+
+        Args:
+            message: 用户消息
+            threshold: 接受分类结果所需的最小置信度
+
+        Returns:
+            置信度达到阈值时返回 {"intent", "confidence", "entities", "similarity"}，否则返回None
+        """
+        if not self.fitted:
+            return None
+
+        query = np.asarray(self.embeddings.embed_query(message), dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+
+        with self._lock:
+            intents, centroids, temperature = self.intents, self.centroids, self.temperature
+
+        sims = centroids @ query
+        probs = _softmax(sims / temperature)
+        best = int(np.argmax(probs))
+        intent, confidence = intents[best], float(probs[best])
+
+        with self._lock:
+            self.total += 1
+            if confidence >= threshold:
+                self.accepted[intent] = self.accepted.get(intent, 0) + 1
+
+        if confidence < threshold:
+            return None
+
+        department = DEPARTMENT_KEYWORDS.get(intent, {}).get("部门")
+        return {
+            "intent": intent,
+            "confidence": confidence,
+            "entities": {"部门": department} if department else {},
+            "similarity": float(sims[best]),
+        }
+
+    def stats(self) -> dict:
+        """分类统计"""
+        with self._lock:
+            accepted = sum(self.accepted.values())
+            return {
+                "fitted": self.fitted,
+                "intents": len(self.intents),
+                "temperature": self.temperature,
+                "total": self.total,
+                "accepted": accepted,
+                "accept_rate": round(accepted / self.total, 4) if self.total else 0.0,
+                "by_intent": dict(self.accepted),
+            }
+
+
+# 创建全局意图分类器实例（知识库加载后训练）
+intent_classifier = EmbeddingIntentClassifier(embeddings)
@@ -0,0 +1,152 @@
+"""
+基于规则的意图快速分类
+
+在调用LLM做意图识别之前先用关键词表和正则做一次确定性分类：
+问候、转人工、闲聊以及只命中单一部门词表的问题直接在本地给出意图，
+无法确定时返回None，交由LLM识别。
+"""
+import re
+import threading
+from typing import Dict, List, Optional
+
+# 整句匹配的问候语
+GREETING_PATTERN = re.compile(
+    r"^(你好|您好|你们好|hi|hello|hey|嗨|哈喽|在吗|在不在|有人吗|早上好|上午好|中午好|下午好|晚上好|早安)"
+    r"[呀啊哦吖~～!！。,，.?？\s]*$",
+    re.IGNORECASE
+)
+
+# 明确要求转人工
+TRANSFER_PATTERN = re.compile(
+    r"(转人工|转接人工|人工客服|人工服务|找人工|要人工|真人|"
+    r"联系(一下)?(HR|人事|人力|行政|IT|法务|财务|采购)(部|部门)?$)",
+    re.IGNORECASE
+)
+
+# 整句匹配的致谢/告别等闲聊
+CHITCHAT_PATTERN = re.compile(
+    r"^(谢谢|多谢|感谢|谢了|thanks|thank you|再见|拜拜|bye|好的|好|嗯|嗯嗯|哦|ok|收到|明白了|知道了)"
+    r"[呀啊哦啦了~～!！。,，.\s]*$",
+    re.IGNORECASE
+)
+
+# 非业务话题
+CHITCHAT_TOPIC_PATTERN = re.compile(r"(讲个笑话|说个笑话|天气怎么样|今天天气|你是谁|你叫什么|你几岁)")
+
+# 各部门词表（取自意图识别提示词中的示例）
+DEPARTMENT_KEYWORDS: Dict[str, Dict[str, List[str]]] = {
+    "admin_inquiry": {
+        "部门": "行政部",
+        "keywords": ["办公用品", "会议室", "班车", "工牌", "快递", "寄件", "门禁", "停车", "工位", "食堂"],
+    },
+    "hr_inquiry": {
+        "部门": "人力资源部",
+        "keywords": ["年假", "请假", "病假", "事假", "婚假", "产假", "工资", "薪资", "社保", "公积金",
+                     "转岗", "培训", "离职", "入职", "考勤", "加班", "调休", "体检"],
+    },
+    "it_inquiry": {
+        "部门": "IT部",
+        "keywords": ["OA密码", "密码", "软件", "权限", "电脑", "VPN", "邮箱", "Wi-Fi", "WiFi", "无线网",
+                     "网络", "打印机", "蓝屏", "死机"],
+    },
+    "legal_inquiry": {
+        "部门": "法务部",
+        "keywords": ["合同", "保密协议", "知识产权", "专利", "商标", "著作权", "举报", "合规", "侵权"],
+    },
+    "finance_inquiry": {
+        "部门": "财务部",
+        "keywords": ["报销", "差旅", "发票", "个税", "个人所得税", "备用金", "借款", "预算"],
+    },
+    "procurement_inquiry": {
+        "部门": "采购部",
+        "keywords": ["采购", "供应商", "验收", "询价", "比价", "招标"],
+    },
+}
+
+# 超过该长度的消息往往包含多个诉求，交给LLM处理
+MAX_RULE_MESSAGE_LENGTH = 60
+
+
+def _compile_keywords(keywords: List[str]):
+    return re.compile("|".join(re.escape(keyword) for keyword in keywords), re.IGNORECASE)
+
+
+class RuleIntentClassifier:
+    """关键词/正则意图分类器"""
+
+    def __init__(self, department_keywords: Dict[str, Dict[str, List[str]]] = DEPARTMENT_KEYWORDS):
+        self._departments = [
+            (intent, spec["部门"], _compile_keywords(spec["keywords"]))
+            for intent, spec in department_keywords.items()
+        ]
+        self._lock = threading.Lock()
+        self.total = 0
+        self.resolved: Dict[str, int] = {}
+
+    def classify(self, message: str, record: bool = True) -> Optional[dict]:
+        """
+        对消息做规则分类
+
+        Args:
+            record: 是否计入统计（在意图识别节点之外预先分类时传 False，避免重复计数）
+
+        Returns:
+            确定时返回 {"intent", "confidence", "entities", "rule"}，否则返回None
+        """
+        result = self._classify(message.strip())
+        if not record:
+            return result
+        with self._lock:
+            self.total += 1
+            if result is not None:
+                self.resolved[result["intent"]] = self.resolved.get(result["intent"], 0) + 1
+        return result
+
+    def _classify(self, message: str) -> Optional[dict]:
+        if not message:
+            return None
+
+        if GREETING_PATTERN.match(message):
+            return {"intent": "greeting", "confidence": 0.99, "entities": {}, "rule": "greeting"}
+
+        if TRANSFER_PATTERN.search(message):
+            return {"intent": "transfer_human", "confidence": 0.95, "entities": {}, "rule": "transfer"}
+
+        if CHITCHAT_PATTERN.match(message) or CHITCHAT_TOPIC_PATTERN.search(message):
+            return {"intent": "chitchat", "confidence": 0.9, "entities": {}, "rule": "chitchat"}
+
+        if len(message) > MAX_RULE_MESSAGE_LENGTH:
+            return None
+
+        # 只命中一个部门的词表时才确定分类，跨部门的问题交给LLM
+        matches = []
+        for intent, department, pattern in self._departments:
+            found = pattern.findall(message)
+            if found:
+                matches.append((intent, department, found))
+        if len(matches) != 1:
+            return None
+
+        intent, department, found = matches[0]
+        return {
+            "intent": intent,
+            "confidence": 0.85,
+            "entities": {"部门": department, "关键词": found[0]},
+            "rule": "keyword",
+        }
+
+    def stats(self) -> dict:
+        """本地分类统计"""
+        with self._lock:
+            resolved = sum(self.resolved.values())
+            return {
+                "total": self.total,
+                "resolved": resolved,
+                "fallthrough": self.total - resolved,
+                "local_rate": round(resolved / self.total, 4) if self.total else 0.0,
+                "by_intent": dict(self.resolved),
+            }
+
+
+# 全局规则分类器实例
+rule_classifier = RuleIntentClassifier()
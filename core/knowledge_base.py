@@ -1,98 +1,603 @@
 """
 知识库RAG系统
 """
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
 from langchain_core.documents import Document
-from typing import List
-from .config import vector_store, KNOWLEDGE_BASE_PATH, TOP_K_RESULTS
+from typing import Dict, List, Optional, Sequence, Tuple
+from .bm25_index import BM25Index, reciprocal_rank_fusion, text_length
+from .chunker import create_chunker
+from .config import (
+    vector_store, create_vector_store, KNOWLEDGE_BASE_PATH, TOP_K_RESULTS, EMBEDDING_MODEL_ID,
+    CHUNKER, CHUNK_SIZE, CHUNK_OVERLAP, INDEX_BUNDLE_DIR, INDEX_BUNDLE_ENABLED, INDEX_BUNDLE_AUTO_SAVE,
+    KB_WATCH_INTERVAL, RETRIEVAL_MODE, BM25_K1, BM25_B, BM25_SHORT_QUERY_CHARS,
+    HYBRID_CANDIDATE_FACTOR, RRF_K, PARTITION_MIN_SCORE
+)
+from . import index_bundle, tracing
+from .metrics import RETRIEVAL_DURATION, RETRIEVALS, PARTITION_RETRIEVALS
+from .vector_store import NumpyVectorStore
+
+# 知识库分区字段：同一章节的分块在向量存储中连续存放，按分区检索时只对该段打分
+PARTITION_FIELD = "section"
+
+
+def chunk_ids(chunks: List[str]) -> List[str]:
+    """
+    根据分块内容生成稳定的文档ID
+
+    相同内容的分块得到相同ID，重复出现的分块追加序号以保证唯一。
+    """
+    ids = []
+    seen = {}
+    for chunk in chunks:
+        digest = hashlib.sha256(chunk.encode('utf-8')).hexdigest()[:24]
+        count = seen.get(digest, 0)
+        seen[digest] = count + 1
+        ids.append(digest if count == 0 else f"{digest}-{count}")
+    return ids
+
+
+class _Preview:
+    """文档预览（只在日志渲染时才截断、替换换行）"""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __str__(self) -> str:
+        return self.text[:100].replace('\n', ' ')
 
 
 class KnowledgeBase:
     """知识库管理类"""
 
-    def __init__(self):
+    def __init__(self, bundle_dir: str = INDEX_BUNDLE_DIR):
         self.vector_store = vector_store
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=50,
-            separators=["\n\n", "\n", "。", "！", "？", "；", "，", " "]
-        )
+        self.question_store: Optional[NumpyVectorStore] = None  # 问答对问题的向量（ID与所属分块相同）
+        self.bm25_index: Optional[BM25Index] = None
+        self.retrieval_mode = RETRIEVAL_MODE
+        self.chunker = create_chunker(CHUNKER, CHUNK_SIZE, CHUNK_OVERLAP)
+        self.bundle_dir = bundle_dir
+        self.file_path = None
+        self.kb_sha256 = None  # 当前已加载知识库内容的哈希，可作为知识库版本号
         self.initialized = False
 
-    def load_knowledge_base(self, file_path: str = KNOWLEDGE_BASE_PATH):
-        """加载知识库文件"""
+        self._file_mtime = None
+        self._listeners = []
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._stop_watching = threading.Event()
+
+        # 替换下来的向量存储在正在使用它的检索结束后才关闭（量化模式下释放内存映射文件）
+        self._store_lock = threading.Lock()
+        self._store_readers: Dict[int, int] = {}  # id(存储) -> 正在使用的检索数
+        self._retired_stores: List[NumpyVectorStore] = []
+
+    def splitter_settings(self) -> dict:
+        """分块器配置（作为索引包键的一部分）"""
+        return self.chunker.settings()
+
+    def _split(self, raw: bytes, file_path: str) -> Tuple[List[str], List[dict]]:
+        """分块，metadata 附加来源文件"""
+        chunks, metadatas = self.chunker.split(raw.decode('utf-8'))
+        return chunks, [dict(metadata, source=file_path) for metadata in metadatas]
+
+    @staticmethod
+    def _question_rows(metadatas: Sequence[dict]) -> List[int]:
+        """带问题（问答对）的分块下标"""
+        return [i for i, metadata in enumerate(metadatas) if metadata.get("question")]
+
+    def load_knowledge_base(self, file_path: str = KNOWLEDGE_BASE_PATH,
+                            use_bundle: bool = INDEX_BUNDLE_ENABLED,
+                            save_bundle: bool = INDEX_BUNDLE_AUTO_SAVE):
+        """
+        加载知识库文件
+
+        Args:
+            file_path: 知识库文件路径
+            use_bundle: 是否优先从索引包加载（键匹配时无需调用embedding模型）
+            save_bundle: 重新embedding后是否写回索引包
+        """
         try:
-            # 清空旧的向量存储数据（重要！避免旧数据干扰）
-            # 由于InMemoryVectorStore没有clear方法，我们需要重新创建实例
             from .config import embeddings
-            from langchain_core.vectorstores import InMemoryVectorStore
-            self.vector_store = InMemoryVectorStore(embeddings)
 
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            mtime = os.stat(file_path).st_mtime_ns
+            with open(file_path, 'rb') as f:
+                raw = f.read()
 
-            # 分割文档
-            chunks = self.text_splitter.split_text(content)
+            kb_sha256 = index_bundle.content_sha256(raw)
+            key = self._bundle_key(kb_sha256)
 
-            # 创建Document对象
-            documents = [
-                Document(page_content=chunk, metadata={"source": file_path})
-                for chunk in chunks
-            ]
+            # 每次加载都构建新的向量存储再整体替换（重要！避免旧数据干扰）
+            # 替换是原子的，加载期间的检索请求仍使用旧数据
+            bundle = index_bundle.load_bundle(self.bundle_dir, key) if use_bundle else None
+            if bundle is not None:
+                # 索引包命中：直接使用预先计算的向量
+                chunks = bundle.texts
+                metadatas = [dict(metadata, source=file_path) for metadata in bundle.metadatas]
+                vectors, question_vectors = bundle.vectors, bundle.question_vectors
+                print(f"📦 从索引包加载，跳过embedding: {self.bundle_dir}")
+            else:
+                # 分块
+                chunks, metadatas = self._split(raw, file_path)
+                questions = [metadatas[i]["question"] for i in self._question_rows(metadatas)]
 
-            # 添加到向量存储
-            self.vector_store.add_documents(documents)
+                # 分块与问题一次批量embedding
+                all_vectors = embeddings.embed_documents(chunks + questions)
+                vectors, question_vectors = all_vectors[:len(chunks)], all_vectors[len(chunks):]
+
+                if save_bundle:
+                    self._save_bundle(key, chunks, metadatas, vectors, question_vectors)
+
+            ids = chunk_ids(chunks)
+            new_store, new_questions = self._build_stores(chunks, ids, metadatas, vectors, question_vectors)
+            self.bm25_index = self._build_bm25(ids, chunks)
+            self._swap_stores(new_store, new_questions)
+            self.file_path = file_path
+            self.kb_sha256 = kb_sha256
+            self._file_mtime = mtime
             self.initialized = True
 
-            print(f"✅ 成功加载知识库，共 {len(documents)} 个文档块")
+            print(f"✅ 成功加载知识库，共 {len(metadatas)} 个文档块")
             print(f"📄 知识库文件: {file_path}")
+            self._notify_listeners()
             return True
 
         except Exception as e:
             print(f"❌ 加载知识库失败: {e}")
             return False
 
-    def search(self, query: str, k: int = TOP_K_RESULTS) -> List[Document]:
-        """搜索相关文档"""
+    def reload_knowledge_base(self, file_path: str = None,
+                              save_bundle: bool = INDEX_BUNDLE_AUTO_SAVE) -> dict:
+        """
+        增量重新加载知识库
+
+        按分块内容哈希对比新旧分块：未变化的分块复用已有向量，
+        只对新增或修改的分块调用embedding模型，已删除的分块直接丢弃。
+
+        Args:
+            file_path: 知识库文件路径，默认为上次加载的文件
+            save_bundle: 重新加载后是否写回索引包
+
+        Returns:
+            统计信息 {"total", "reused", "embedded", "removed", "changed", "elapsed_ms"}
+        """
+        file_path = file_path or self.file_path
+        start = time.perf_counter()
+
+        with self._reload_lock:
+            if not self.initialized or file_path != self.file_path:
+                if not self.load_knowledge_base(file_path, save_bundle=save_bundle):
+                    raise RuntimeError(f"加载知识库失败: {file_path}")
+                total = len(self.vector_store)
+                return self._reload_stats(total, 0, total, 0, True, start)
+
+            from .config import embeddings
+
+            mtime = os.stat(file_path).st_mtime_ns
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+
+            kb_sha256 = index_bundle.content_sha256(raw)
+            old_store = self.vector_store
+            if kb_sha256 == self.kb_sha256:
+                self._file_mtime = mtime
+                return self._reload_stats(len(old_store), len(old_store), 0, 0, False, start)
+
+            chunks, metadatas = self._split(raw, file_path)
+            ids = chunk_ids(chunks)
+            question_rows = self._question_rows(metadatas)
+            question_ids = [ids[i] for i in question_rows]
+            old_questions = self.question_store
+
+            # 只embedding新增或修改的分块（及其问题），一次批量调用
+            added = [i for i, doc_id in enumerate(ids) if doc_id not in old_store]
+            added_questions = [i for i in question_rows if old_questions is None or ids[i] not in old_questions]
+            texts = [chunks[i] for i in added] + [metadatas[i]["question"] for i in added_questions]
+            new_vectors = embeddings.embed_documents(texts) if texts else []
+
+            # 复用未变化分块的向量，与新分块的向量合并后构建新的向量存储
+            dim = old_store.dim if old_store.dim is not None else len(new_vectors[0]) if texts else 0
+            vectors = self._merge_vectors(ids, old_store, new_vectors[:len(added)], dim)
+            question_vectors = self._merge_vectors(question_ids, old_questions, new_vectors[len(added):], dim)
+            new_store, new_questions = self._build_stores(chunks, ids, metadatas, vectors, question_vectors)
+            removed = len(old_store) - (len(ids) - len(added))
+
+            self.bm25_index = self._build_bm25(ids, chunks)
+            self._swap_stores(new_store, new_questions)
+            self.kb_sha256 = kb_sha256
+            self._file_mtime = mtime
+
+            if save_bundle:
+                self._save_bundle(self._bundle_key(kb_sha256), chunks, metadatas, vectors, question_vectors)
+
+            stats = self._reload_stats(len(ids), len(ids) - len(added), len(added), removed, True, start)
+            print(f"🔄 知识库增量重新加载完成: 共 {stats['total']} 个文档块，"
+                  f"复用 {stats['reused']}，重新embedding {stats['embedded']}，"
+                  f"删除 {stats['removed']}，耗时 {stats['elapsed_ms']}ms")
+            self._notify_listeners()
+            return stats
+
+    def _build_stores(self, chunks: List[str], ids: List[str], metadatas: List[dict], vectors,
+                      question_vectors) -> Tuple[NumpyVectorStore, NumpyVectorStore]:
+        """
+        构建分块向量存储与问题向量存储（问题的ID、metadata与所属分块相同）
+
+        两个存储中的文档都按分区（章节首次出现的顺序）排列，使每个分区在矩阵中占连续的一段行。
+        """
+        first_seen = {}
+        for metadata in metadatas:
+            first_seen.setdefault(metadata.get(PARTITION_FIELD), len(first_seen))
+        order = sorted(range(len(chunks)), key=lambda i: first_seen[metadatas[i].get(PARTITION_FIELD)])
+
+        store = create_vector_store()
+        if order:
+            store.add_embeddings(
+                [chunks[i] for i in order], np.asarray(vectors, dtype=np.float32)[order],
+                metadatas=[metadatas[i] for i in order], ids=[ids[i] for i in order]
+            )
+        store.build_index()
+
+        # question_vectors 按原分块顺序对应带问题的分块
+        question_position = {i: j for j, i in enumerate(self._question_rows(metadatas))}
+        question_rows = [i for i in order if i in question_position]
+        questions = create_vector_store()
+        if question_rows:
+            question_vectors = np.asarray(question_vectors, dtype=np.float32)
+            questions.add_embeddings(
+                [metadatas[i]["question"] for i in question_rows],
+                question_vectors[[question_position[i] for i in question_rows]],
+                metadatas=[metadatas[i] for i in question_rows], ids=[ids[i] for i in question_rows]
+            )
+        return store, questions
+
+    def _swap_stores(self, store: NumpyVectorStore, questions: NumpyVectorStore) -> None:
+        """替换向量存储；旧存储没有正在进行的检索时立即关闭，否则由最后一个检索结束时关闭"""
+        with self._store_lock:
+            old = [s for s in (self.vector_store, self.question_store) if s is not None]
+            self.question_store = questions
+            self.vector_store = store
+            idle = []
+            for old_store in old:
+                if self._store_readers.get(id(old_store)):
+                    self._retired_stores.append(old_store)
+                else:
+                    idle.append(old_store)
+        for old_store in idle:
+            old_store.close()
+
+    @contextmanager
+    def _pinned_stores(self):
+        """
+        取得当前的 (分块向量存储, 问题向量存储)，使用期间不会被重新加载关闭
+
+        检索应在整个过程中使用同一组存储，不要中途再读 self.vector_store。
+        """
+        with self._store_lock:
+            stores = [s for s in (self.vector_store, self.question_store) if s is not None]
+            for store in stores:
+                self._store_readers[id(store)] = self._store_readers.get(id(store), 0) + 1
+            pinned = self.vector_store, self.question_store
+        try:
+            yield pinned
+        finally:
+            closing = []
+            with self._store_lock:
+                for store in stores:
+                    count = self._store_readers[id(store)] - 1
+                    if count:
+                        self._store_readers[id(store)] = count
+                        continue
+                    del self._store_readers[id(store)]
+                    if store in self._retired_stores:
+                        self._retired_stores.remove(store)
+                        closing.append(store)
+            for store in closing:
+                store.close()
+
+    @staticmethod
+    def _merge_vectors(ids: List[str], old_store: Optional[NumpyVectorStore], new_vectors, dim: int) -> np.ndarray:
+        """按ID复用旧存储中的向量，不在旧存储中的ID依次使用 new_vectors"""
+        vectors = np.empty((len(ids), dim), dtype=np.float32)
+        is_new = np.array([old_store is None or doc_id not in old_store for doc_id in ids], dtype=bool)
+        if len(ids) and not is_new.all():
+            vectors[~is_new] = old_store.get_vectors([doc_id for doc_id, new in zip(ids, is_new) if not new])
+        if is_new.any():
+            vectors[is_new] = np.asarray(new_vectors, dtype=np.float32)
+        return vectors
+
+    @staticmethod
+    def _build_bm25(ids: Sequence[str], chunks: Sequence[str]) -> BM25Index:
+        """构建与向量存储对应的BM25倒排索引（与向量存储同时替换）"""
+        return BM25Index(ids, chunks, k1=BM25_K1, b=BM25_B)
+
+    def add_reload_listener(self, callback) -> None:
+        """
+        注册知识库内容变化的回调
+
+        Args:
+            callback: 加载或增量重新加载成功后调用，参数为知识库实例
+        """
+        self._listeners.append(callback)
+
+    def _notify_listeners(self) -> None:
+        """通知知识库内容已变化"""
+        for callback in self._listeners:
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"⚠️ 知识库变化回调执行失败: {e}")
+
+    @staticmethod
+    def _reload_stats(total: int, reused: int, embedded: int, removed: int,
+                      changed: bool, start: float) -> dict:
+        """重新加载统计信息"""
+        return {
+            "total": total,
+            "reused": reused,
+            "embedded": embedded,
+            "removed": removed,
+            "changed": changed,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+
+    def start_watching(self, interval: float = KB_WATCH_INTERVAL) -> bool:
+        """
+        启动知识库文件监视线程，文件修改后自动增量重新加载
+
+        Args:
+            interval: 轮询间隔（秒），小于等于0时不启动
+        """
+        if interval <= 0 or self._watcher is not None:
+            return False
+
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(
+            target=self._watch_loop, args=(interval,), name="kb-watcher", daemon=True
+        )
+        self._watcher.start()
+        print(f"👀 正在监视知识库文件变化（每 {interval}s 检查一次）")
+        return True
+
+    def stop_watching(self):
+        """停止知识库文件监视线程"""
+        if self._watcher is not None:
+            self._stop_watching.set()
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch_loop(self, interval: float):
+        """轮询文件修改时间，变化时触发增量重新加载"""
+        while not self._stop_watching.wait(interval):
+            if not self.initialized:
+                continue
+            try:
+                if os.stat(self.file_path).st_mtime_ns != self._file_mtime:
+                    self.reload_knowledge_base()
+            except Exception as e:
+                print(f"⚠️ 知识库自动重新加载失败: {e}")
+
+    def _bundle_key(self, kb_sha256: str) -> dict:
+        """当前配置下的索引包键"""
+        return index_bundle.make_bundle_key(kb_sha256, EMBEDDING_MODEL_ID, self.splitter_settings())
+
+    def _save_bundle(self, key: dict, texts: List[str], metadatas: List[dict], vectors,
+                     question_vectors) -> None:
+        """写回索引包，失败不影响使用"""
+        try:
+            index_bundle.save_bundle(self.bundle_dir, key, texts, metadatas, vectors, question_vectors)
+            print(f"📦 索引包已更新: {self.bundle_dir}")
+        except OSError as e:
+            print(f"⚠️ 写入索引包失败（不影响使用）: {e}")
+
+    def _bm25_search(self, query: str, k: int, store: NumpyVectorStore,
+                     filter: Optional[dict] = None) -> List[Tuple[Document, float]]:
+        """BM25关键词检索，返回 (文档, BM25分数)"""
+        allowed = store.filter_ids(filter) if filter else None
+        hits = self.bm25_index.search(query, k, ids=allowed)
+        documents = {doc.id: doc for doc in store.get_by_ids([doc_id for doc_id, _ in hits])}
+        return [(documents[doc_id], score) for doc_id, score in hits if doc_id in documents]
+
+    def _retrieve(self, query: str, k: int,
+                  filter: Optional[dict] = None) -> Tuple[str, List[Tuple[Document, float]], Optional[float]]:
+        """
+        按检索方式检索，返回 (实际使用的检索方式, [(文档, 分数)], 向量检索的最高相似度)
+
+        只走BM25时没有向量相似度，最高相似度为None。
+
+        - vector: 向量相似度
+        - bm25: 只走BM25（不调用embedding模型）；hybrid 模式下有效字数不超过
+          BM25_SHORT_QUERY_CHARS 的短查询也只走BM25，没有任何词项命中时退回向量检索
+        - hybrid: 两路各召回 k * HYBRID_CANDIDATE_FACTOR 个候选，按倒数排名融合，分数为融合分数
+
+        指定 filter 时两路都只在满足条件的分块中检索。
+        """
+        with self._pinned_stores() as (store, _):
+            return self._retrieve_from(store, query, k, filter)
+
+    def _retrieve_from(self, store: NumpyVectorStore, query: str, k: int,
+                       filter: Optional[dict]) -> Tuple[str, List[Tuple[Document, float]], Optional[float]]:
+        """在指定的向量存储上检索（见 _retrieve）"""
+        mode = self.retrieval_mode if self.bm25_index is not None else "vector"
+        if mode == "hybrid" and 0 < text_length(query) <= BM25_SHORT_QUERY_CHARS:
+            hits = self._bm25_search(query, k, store, filter)
+            if hits:
+                return "bm25", hits, None
+            mode = "vector"
+        if mode == "bm25":
+            return mode, self._bm25_search(query, k, store, filter), None
+        if mode == "hybrid":
+            candidates = k * max(HYBRID_CANDIDATE_FACTOR, 1)
+            vector_hits = store.similarity_search_with_score(query, k=candidates, filter=filter)
+            rankings = [vector_hits, self._bm25_search(query, candidates, store, filter)]
+            best = vector_hits[0][1] if vector_hits else None
+            return mode, reciprocal_rank_fusion(rankings, k, rrf_k=RRF_K), best
+        hits = store.similarity_search_with_score(query, k=k, filter=filter)
+        return "vector", hits, hits[0][1] if hits else None
+
+    def _retrieve_partitioned(self, query: str, k: int, filter: Optional[dict],
+                              partitions: Optional[Sequence[str]], intent: str
+                              ) -> Tuple[str, List[Tuple[Document, float]]]:
+        """
+        只在指定分区内检索，分区内没有结果或最高相似度低于 PARTITION_MIN_SCORE 时退回全局检索
+
+        不指定分区时检索全部分区：所有分区在同一个矩阵中，一次打分即得到各分区Top-K合并后的结果。
+
+        Args:
+            partitions: 分区（章节）列表，None表示全部分区
+            intent: 用于统计的意图
+        """
+        if partitions is None:
+            PARTITION_RETRIEVALS.labels(intent, "global").inc()
+            mode, hits, _ = self._retrieve(query, k, filter)
+            return mode, hits
+
+        mode, hits, best = self._retrieve(query, k, {**(filter or {}), PARTITION_FIELD: list(partitions)})
+        if hits and (best is None or best >= PARTITION_MIN_SCORE):
+            PARTITION_RETRIEVALS.labels(intent, "partition").inc()
+            return mode, hits
+
+        tracing.info("[RAG检索] 分区 %s 内%s，退回全局检索", list(partitions),
+                     f"最高相似度 {best:.2f} 低于 {PARTITION_MIN_SCORE}" if hits else "没有结果")
+        PARTITION_RETRIEVALS.labels(intent, "fallback").inc()
+        mode, hits, _ = self._retrieve(query, k, filter)
+        return mode, hits
+
+    def search(self, query: str, k: int = TOP_K_RESULTS, filter: Optional[dict] = None,
+               partitions: Optional[Sequence[str]] = None, intent: Optional[str] = None) -> List[Document]:
+        """
+        搜索相关文档
+
+        Args:
+            query: 查询
+            k: 返回结果数
+            filter: metadata过滤条件，如 {"section": "人力资源"}、{"section": ["财务报销", "采购管理"]}，
+                只对满足条件的分块打分
+            partitions: 只在这些分区（章节）内检索，结果较弱时退回全局检索；None表示全部分区
+            intent: 检索所属的意图（指定时按意图统计分区检索与退回全局检索的次数）
+        """
         if not self.initialized:
-            print("警告: 知识库未初始化")
+            tracing.warning("警告: 知识库未初始化")
             return []
 
         try:
-            print(f"\n{'='*60}")
-            print(f"[RAG检索] 开始检索")
-            print(f"[RAG检索] 查询: {query}")
-            print(f"[RAG检索] 检索Top-{k}结果")
-
-            results = self.vector_store.similarity_search(query, k=k)
-
-            print(f"[RAG检索] 找到 {len(results)} 个相关文档")
-            if results:
-                for i, doc in enumerate(results, 1):
-                    preview = doc.page_content[:100].replace('\n', ' ')
-                    print(f"[RAG检索] 文档{i}: {preview}...")
-            else:
-                print(f"[RAG检索] 未找到相关文档")
-            print(f"{'='*60}\n")
+            tracing.info("[RAG检索] 查询: %s (Top-%d%s%s)", query, k,
+                         f", 过滤: {filter}" if filter else "", f", 分区: {list(partitions)}" if partitions else "")
+
+            start = time.perf_counter()
+            with tracing.span("retrieval", "检索Top-%d", k, name="search") as span:
+                if partitions is not None or intent is not None:
+                    mode, scored = self._retrieve_partitioned(query, k, filter, partitions, intent or "none")
+                else:
+                    mode, scored, _ = self._retrieve(query, k, filter)
+                # 分数写入metadata副本（向量库中的metadata是共享的），供上下文组装按分数排序
+                results = [
+                    Document(id=doc.id, page_content=doc.page_content, metadata={**doc.metadata, "score": score})
+                    for doc, score in scored
+                ]
+                span.payload = results
+            RETRIEVAL_DURATION.labels("search").observe(time.perf_counter() - start)
+            RETRIEVALS.labels(mode).inc()
+
+            tracing.info("[RAG检索] 找到 %d 个相关文档（%s）", len(results), mode)
+            for i, doc in enumerate(results, 1):
+                tracing.debug("[RAG检索] 文档%d: %s...", i, _Preview(doc.page_content))
 
             return results
         except Exception as e:
-            print(f"搜索失败: {e}")
+            tracing.error("搜索失败: %s", e)
             return []
 
-    def search_with_score(self, query: str, k: int = TOP_K_RESULTS):
-        """搜索相关文档并返回相似度分数"""
+    def search_with_score(self, query: str, k: int = TOP_K_RESULTS, filter: Optional[dict] = None):
+        """
+        向量检索并返回余弦相似度
+
+        不受检索方式影响，分数始终是可与固定阈值比较的余弦相似度；
+        需要按当前检索方式排序的分数时使用 search_with_fused_score。
+        """
         if not self.initialized:
-            print("警告: 知识库未初始化")
+            tracing.warning("警告: 知识库未初始化")
             return []
 
         try:
-            results = self.vector_store.similarity_search_with_score(query, k=k)
+            start = time.perf_counter()
+            with tracing.span("retrieval", "检索Top-%d（带分数）", k, name="search_with_score") as span:
+                with self._pinned_stores() as (store, _):
+                    results = store.similarity_search_with_score(query, k=k, filter=filter)
+                span.payload = [doc for doc, _ in results]
+            RETRIEVAL_DURATION.labels("search_with_score").observe(time.perf_counter() - start)
+            RETRIEVALS.labels("vector").inc()
             return results
         except Exception as e:
-            print(f"搜索失败: {e}")
+            tracing.error("搜索失败: %s", e)
             return []
 
+    def search_with_fused_score(self, query: str, k: int = TOP_K_RESULTS, filter: Optional[dict] = None):
+        """
+        按当前检索方式检索并返回排序分数
+
+        向量检索为相似度，BM25为BM25分数，混合检索为倒数排名融合分数；
+        后两者没有固定的取值范围，只能用于同一次检索内的排序，不能与固定阈值比较。
+        """
+        if not self.initialized:
+            tracing.warning("警告: 知识库未初始化")
+            return []
+
+        try:
+            start = time.perf_counter()
+            with tracing.span("retrieval", "检索Top-%d（排序分数）", k, name="search_with_fused_score") as span:
+                mode, results, _ = self._retrieve(query, k, filter)
+                span.payload = [doc for doc, _ in results]
+            RETRIEVAL_DURATION.labels("search_with_fused_score").observe(time.perf_counter() - start)
+            RETRIEVALS.labels(mode).inc()
+            return results
+        except Exception as e:
+            tracing.error("搜索失败: %s", e)
+            return []
+
+    def partitions(self) -> List[str]:
+        """当前知识库的全部分区（章节）"""
+        with self._pinned_stores() as (store, _):
+            return store.metadata_values(PARTITION_FIELD)
+
+    def qa_pairs(self) -> List[Tuple[str, str]]:
+        """当前知识库全部问答对的 (章节, 问题)，取自分块metadata"""
+        with self._pinned_stores() as (_, questions):
+            if questions is None or not len(questions):
+                return []
+            return [
+                (doc.metadata.get(PARTITION_FIELD, ""), doc.metadata.get("question", ""))
+                for doc in questions.get_by_ids(questions.ids)
+            ]
+
+    def search_questions(self, query: str, k: int = TOP_K_RESULTS,
+                         filter: Optional[dict] = None) -> List[Tuple[Document, float]]:
+        """
+        按问题检索问答对：查询只与各问答对的问题向量比较
+
+        Returns:
+            [(问答对分块, 查询与问题的余弦相似度)]，知识库没有问答对时返回空列表
+        """
+        if not self.initialized:
+            return []
+
+        start = time.perf_counter()
+        with self._pinned_stores() as (store, questions):
+            if questions is None or not len(questions):
+                return []
+            with tracing.span("retrieval", "问题检索Top-%d", k, name="search_questions") as span:
+                hits = questions.similarity_search_with_score(query, k=k, filter=filter)
+                documents = {doc.id: doc for doc in store.get_by_ids([doc.id for doc, _ in hits])}
+                results = [(documents[doc.id], score) for doc, score in hits if doc.id in documents]
+                span.payload = [doc for doc, _ in results]
+        RETRIEVAL_DURATION.labels("search_questions").observe(time.perf_counter() - start)
+        return results
+
 
 # 创建全局知识库实例
 knowledge_base = KnowledgeBase()
@@ -0,0 +1,45 @@
+"""
+延迟创建的embedding模型
+
+导入配置时只记录如何创建模型，真正加载（读取权重、初始化推理框架）推迟到首次使用或后台预热，
+服务进程可以先启动、先响应存活探针，再在后台完成模型加载。
+"""
+import threading
+import time
+from typing import Callable, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+class LazyEmbeddings(Embeddings):
+    """首次使用时才创建被包装的embedding对象"""
+
+    def __init__(self, factory: Callable[[], Embeddings]):
+        """
+        Args:
+            factory: 创建embedding对象的函数（只调用一次）
+        """
+        self._factory = factory
+        self._instance: Optional[Embeddings] = None
+        self._lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def load(self) -> Embeddings:
+        """创建（或返回已创建的）embedding对象；并发调用时只加载一次"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    start = time.perf_counter()
+                    self._instance = self._factory()
+                    self.load_seconds = time.perf_counter() - start
+        return self._instance
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.load().embed_query(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.load().embed_documents(texts)
@@ -1,36 +1,37 @@
 """
-日志收集器 - 用于捕获所有print输出
+日志收集器
+
+已弃用：请求日志改由 core.tracing 按请求记录结构化事件，本模块仅为兼容保留。
+
+LogCollector 只是 core.tracing 的一层包装：开始捕获时在当前上下文开始一个 Trace，
+停止捕获时返回渲染后的事件日志行。不再替换 sys.stdout，print 输出不会被收集。
 """
-import sys
-from io import StringIO
-from typing import List
+import warnings
 from contextlib import contextmanager
+from typing import List, Optional
+
+from . import tracing
 
 
 class LogCollector:
-    """收集程序运行过程中的所有输出"""
+    """收集当前上下文中通过 core.tracing 记录的日志"""
 
     def __init__(self):
+        warnings.warn("LogCollector 已弃用，请使用 core.tracing", DeprecationWarning, stacklevel=2)
         self.logs: List[str] = []
-        self._original_stdout = None
-        self._string_io = None
+        self._trace: Optional[tracing.Trace] = None
 
     def start_capture(self):
-        """开始捕获输出"""
+        """开始捕获日志"""
         self.logs = []
-        self._original_stdout = sys.stdout
-        self._string_io = StringIO()
-        sys.stdout = self._string_io
+        self._trace = tracing.start_trace()
 
     def stop_capture(self):
         """停止捕获并返回所有日志"""
-        if self._original_stdout:
-            sys.stdout = self._original_stdout
-            output = self._string_io.getvalue()
-            if output:
-                self.logs.extend(output.split('\n'))
-            self._string_io = None
-            self._original_stdout = None
+        if self._trace is not None:
+            tracing.end_trace(self._trace)
+            self.logs.extend(self._trace.render())
+            self._trace = None
         return self.logs
 
     def get_logs(self) -> List[str]:
@@ -44,7 +45,7 @@ class LogCollector:
 
 @contextmanager
 def capture_logs():
-    """上下文管理器，用于捕获代码块中的所有输出"""
+    """上下文管理器，用于捕获代码块中的所有日志"""
     collector = LogCollector()
     collector.start_capture()
     try:
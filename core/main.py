@@ -1,36 +1,154 @@
 """
 企业内部查询助手主入口
 """
-import uuid
-from typing import Dict, Any
+import asyncio
+import threading
+import time
+from typing import AsyncIterator, Dict, Any, List, Optional, Sequence, Tuple
 from langchain_core.messages import HumanMessage
 
 from .graph import create_enterprise_query_graph
+from .bm25_index import text_length
 from .knowledge_base import knowledge_base
+from .intent_classifier import intent_classifier, bootstrap_examples
+from .intent_rules import rule_classifier
 from .models import EnterpriseQueryState
-from .log_collector import LogCollector
+from . import tracing
+from .metrics import CHAT_DURATION, CHAT_ERRORS, STARTUP_DURATION, summary as metrics_summary
+from .semantic_cache import SemanticAnswerCache
+from .session_store import USER, ASSISTANT
+from .config import (
+    EMBEDDING_INTENT_ENABLED, FAST_INTENT_ENABLED, TRACE_LEVEL, BM25_SHORT_QUERY_CHARS, BATCH_MAX_CONCURRENCY, create_session_store, embedding_model, get_llm,
+    SEMANTIC_CACHE_ENABLED, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_TTL, SEMANTIC_CACHE_MAX_ENTRIES
+)
+
+# 流式输出LLM片段的节点（意图识别等节点的LLM输出不推送给用户）
+STREAMED_NODES = {"response_generation", "chitchat_handler"}
+
+# 规则即可识别、不查找语义缓存的意图（转人工的回答从不缓存）
+RULE_UNCACHED_INTENTS = {"greeting", "chitchat", "transfer_human"}
 
 
 class EnterpriseQueryBot:
     """企业内部查询助手类"""
 
-    def __init__(self):
-        """初始化查询助手"""
-        print("正在初始化企业内部查询助手...")
+    def __init__(self, warm_up: bool = True):
+        """
+        初始化查询助手
 
-        # 加载知识库
-        print("正在加载知识库...")
-        knowledge_base.load_knowledge_base()
+        Args:
+            warm_up: 是否立即加载知识库与模型；API服务传 False，启动后在后台调用 warm_up()
+        """
+        print("正在初始化企业内部查询助手...")
 
-        # 创建状态图
+        # 创建状态图（不依赖模型）
         print("正在创建状态图...")
         self.graph = create_enterprise_query_graph()
+        self._graph_png: Optional[bytes] = None
+        self._graph_lock = threading.Lock()
 
-        # 会话历史
-        self.sessions = {}
+        # 会话历史（有上限、空闲过期；SESSION_BACKEND=sqlite 时多个worker共享）
+        self.sessions = create_session_store()
+
+        # 语义答案缓存：相近问题直接返回已有回复，跳过状态图
+        self.answer_cache = SemanticAnswerCache(
+            threshold=SEMANTIC_CACHE_THRESHOLD,
+            ttl=SEMANTIC_CACHE_TTL,
+            max_entries=SEMANTIC_CACHE_MAX_ENTRIES
+        ) if SEMANTIC_CACHE_ENABLED else None
+
+        # 预热进度（/readyz 展示）
+        self.ready = threading.Event()
+        self.warmup_stage = "pending"
+        self.warmup_error: Optional[str] = None
+        self.warmup_durations: Dict[str, float] = {}
+
+        if warm_up:
+            self.warm_up()
 
         print("企业内部查询助手初始化完成！\n")
 
+    def _warm_stage(self, stage: str, func):
+        """执行一个预热步骤并记录耗时"""
+        self.warmup_stage = stage
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        self.warmup_durations[stage] = round(elapsed * 1000, 1)
+        STARTUP_DURATION.labels(stage).set(elapsed)
+        print(f"[预热] {stage} 完成，耗时 {elapsed:.2f} 秒")
+
+    @staticmethod
+    def _load_knowledge_base():
+        # 知识库文件缺失或无法读取时 load_knowledge_base 返回False，预热应失败（/readyz 返回503）
+        if not knowledge_base.load_knowledge_base():
+            raise RuntimeError("knowledge base failed to load")
+
+    def _load_intent_classifier(self):
+        # 用知识库中的问题训练本地意图分类器（知识库变化后自动重新训练）
+        self._fit_intent_classifier(knowledge_base)
+        knowledge_base.add_reload_listener(self._fit_intent_classifier)
+
+    def warm_up(self) -> bool:
+        """
+        加载知识库、embedding模型、意图分类器与LLM客户端，完成后标记为就绪
+
+        Returns:
+            是否预热成功
+        """
+        start = time.perf_counter()
+        try:
+            print("正在加载知识库...")
+            self._warm_stage("knowledge_base", self._load_knowledge_base)
+            # 加载模型并执行一次推理，首个请求不再承担初始化开销
+            self._warm_stage("embedding_model", lambda: embedding_model.embed_query("预热"))
+            if EMBEDDING_INTENT_ENABLED:
+                print("正在训练意图分类器...")
+                self._warm_stage("intent_classifier", self._load_intent_classifier)
+            self._warm_stage("llm", get_llm)
+
+            # 知识库文件修改后自动增量重新加载（KB_WATCH_INTERVAL > 0 时生效）
+            knowledge_base.start_watching()
+        except Exception as e:
+            self.warmup_error = f"{self.warmup_stage}: {e}"
+            print(f"⚠️ 预热失败（{self.warmup_error}）")
+            self.warmup_stage = "failed"
+            return False
+
+        elapsed = time.perf_counter() - start
+        self.warmup_durations["total"] = round(elapsed * 1000, 1)
+        STARTUP_DURATION.labels("warm_up").set(elapsed)
+        self.warmup_stage = "ready"
+        self.ready.set()
+        print(f"✅ 预热完成，耗时 {elapsed:.2f} 秒")
+        return True
+
+    def warmup_status(self) -> Dict[str, Any]:
+        """预热进度"""
+        return {
+            "ready": self.ready.is_set(),
+            "stage": self.warmup_stage,
+            "error": self.warmup_error,
+            "durations_ms": dict(self.warmup_durations),
+        }
+
+    def graph_mermaid(self) -> str:
+        """状态图的Mermaid源码（本地生成，不访问网络）"""
+        return self.graph.get_graph().draw_mermaid()
+
+    def graph_png(self) -> bytes:
+        """
+        状态图PNG（通过 mermaid.ink 远程渲染，首次调用时渲染并缓存）
+
+        Raises:
+            渲染服务不可用时抛出异常
+        """
+        if self._graph_png is None:
+            with self._graph_lock:
+                if self._graph_png is None:
+                    self._graph_png = self.graph.get_graph().draw_mermaid_png()
+        return self._graph_png
+
     def save_graph_to_png(self, output_path: str = "customer_service_graph.png"):
         """
         将状态图保存为PNG文件
@@ -40,7 +158,7 @@ class EnterpriseQueryBot:
         """
         try:
             # 获取图并保存为PNG
-            png_data = self.graph.get_graph().draw_mermaid_png()
+            png_data = self.graph_png()
 
             with open(output_path, "wb") as f:
                 f.write(png_data)
@@ -53,18 +171,165 @@ class EnterpriseQueryBot:
             traceback.print_exc()
             return False
 
+    @staticmethod
+    def _fit_intent_classifier(kb):
+        """用知识库问题与内置样例训练意图分类器"""
+        try:
+            intent_classifier.fit(bootstrap_examples(kb.file_path, kb.qa_pairs()))
+            print(f"✅ 意图分类器训练完成，共 {len(intent_classifier.intents)} 个意图 "
+                  f"(温度: {intent_classifier.temperature})")
+        except Exception as e:
+            print(f"⚠️ 意图分类器训练失败，将使用LLM识别意图: {e}")
+
+    def close(self):
+        """释放资源：停止知识库监视，写入尚未落库的会话数据"""
+        knowledge_base.stop_watching()
+        self.sessions.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """运行统计（缓存命中率等）"""
+        from .config import embeddings, query_embedding_model
+        from .embedding_batcher import MicroBatchingEmbeddings
+        from .faq import faq_fast_path
+        from .nodes import speculation_stats
+
+        batching = isinstance(query_embedding_model, MicroBatchingEmbeddings)
+        return {
+            "startup": self.warmup_status(),
+            "sessions": self.sessions.stats(),
+            "vector_store": knowledge_base.vector_store.memory_stats(),
+            "bm25_index": knowledge_base.bm25_index.stats() if knowledge_base.bm25_index else None,
+            "query_embedding_cache": embeddings.stats(),
+            "embedding_batcher": query_embedding_model.stats() if batching else None,
+            "semantic_cache": self.answer_cache.stats() if self.answer_cache else None,
+            "intent_rules": rule_classifier.stats(),
+            "intent_classifier": intent_classifier.stats(),
+            "speculation": speculation_stats.stats(),
+            "faq_fast_path": faq_fast_path.stats(),
+            "metrics": metrics_summary(),
+        }
+
+    @staticmethod
+    def answer_cache_applies(user_input: str) -> bool:
+        """
+        是否为该消息查找语义缓存（查找前需要embedding消息）
+
+        - 混合/BM25检索下的短查询只走BM25、不调用embedding模型，为查缓存做一次推理得不偿失
+        - 规则识别为问候/闲聊/转人工的消息由规则在几微秒内处理，不必等待embedding模型
+        """
+        if knowledge_base.retrieval_mode != "vector" and 0 < text_length(user_input) <= BM25_SHORT_QUERY_CHARS:
+            return False
+        if FAST_INTENT_ENABLED:
+            fast = rule_classifier.classify(user_input, record=False)
+            if fast is not None and fast["intent"] in RULE_UNCACHED_INTENTS:
+                return False
+        return True
+
+    def _lookup_answer_cache(self, user_input: str) -> Tuple[Optional[list], Optional[dict]]:
+        """
+        在语义缓存中查找相近的已回答问题
+
+        Returns:
+            (问题向量, 命中的缓存条目)；未启用缓存或不查找缓存时均为None
+        """
+        if self.answer_cache is None or not self.answer_cache_applies(user_input):
+            return None, None
+
+        from .config import embeddings
+
+        # 查询向量会进入查询向量缓存，后续知识库检索无需再次推理
+        vector = embeddings.embed_query(user_input)
+        cached = self.answer_cache.lookup(vector, knowledge_base.kb_sha256)
+        if cached is not None:
+            tracing.info("[语义缓存] 命中: %s (相似度: %.3f)，跳过状态图", cached["query"], cached["similarity"])
+        return vector, cached
+
+    def _store_answer_cache(self, vector: Optional[list], user_input: str, result: dict, latency_ms: float):
+        """缓存一次完整回答（转人工或出错的回答不缓存）"""
+        if vector is None or result.get("need_human") or result.get("error") or not result.get("final_response"):
+            return
+        self.answer_cache.store(
+            vector, user_input, result["final_response"], knowledge_base.kb_sha256,
+            intent=result.get("intent"), latency_ms=latency_ms
+        )
+
     def create_session(self, user_id: str = None) -> str:
         """创建新会话"""
-        session_id = str(uuid.uuid4())
-        if user_id is None:
-            user_id = f"user_{uuid.uuid4().hex[:8]}"
+        return self.sessions.create(user_id)
+
+    def _start_turn(self, user_input: str, session_id: Optional[str]) -> Tuple[str, HumanMessage, EnterpriseQueryState]:
+        """
+        开始一轮对话：确定会话、记录用户消息并构建初始状态
+
+        Returns:
+            (会话ID, 用户消息, 状态图初始状态)
+        """
+        # 如果没有提供session_id（或会话已过期/被淘汰），创建新会话
+        session = self.sessions.touch(session_id) if session_id else None
+        if session is None:
+            session_id = self.create_session()
+            session = self.sessions.touch(session_id)
+
+        # 添加用户消息
+        user_message = HumanMessage(content=user_input)
+        self.sessions.append(session_id, USER, user_input)
+
+        # 构建初始状态
+        initial_state: EnterpriseQueryState = {
+            "messages": [user_message],
+            "session_id": session_id,
+            "user_id": session.user_id,
+            "intent": None,
+            "intent_confidence": None,
+            "entities": None,
+            "retrieved_docs": None,
+            "tool_results": None,
+            "need_human": False,
+            "final_response": None,
+            "next_step": None,
+            "error": None
+        }
+        return session_id, user_message, initial_state
+
+    def _finish_turn(self, session_id: str, response: str, trace: Optional[tracing.Trace]):
+        """保存回复到会话历史并构建返回值（有 trace 时附带由事件渲染的日志）"""
+        self.sessions.append(session_id, ASSISTANT, response)
 
-        self.sessions[session_id] = {
-            "user_id": user_id,
-            "messages": []
+        if trace is None:
+            return response
+
+        return {
+            "response": response,
+            "logs": trace.render(),
+            "session_id": session_id,
+            "status": "success"
         }
 
-        return session_id
+    @staticmethod
+    def _observe_turn(started: float, cache_hit: bool):
+        """记录一轮对话的总耗时"""
+        CHAT_DURATION.labels("hit" if cache_hit else "miss").observe(time.perf_counter() - started)
+
+    @staticmethod
+    def _failed_turn(e: Exception, session_id: Optional[str], trace: Optional[tracing.Trace]):
+        """处理出错时的返回值"""
+        tracing.error("处理消息时出错: %s", e)
+        CHAT_ERRORS.inc()
+        import traceback
+        traceback.print_exc()
+
+        error_msg = "抱歉，处理您的请求时遇到了问题，请稍后再试。"
+
+        if trace is None:
+            return error_msg
+
+        return {
+            "response": error_msg,
+            "logs": trace.render(),
+            "session_id": session_id,
+            "status": "error",
+            "error": str(e)
+        }
 
     def chat(self, user_input: str, session_id: str = None, capture_logs: bool = False) -> Dict[str, Any]:
         """
@@ -79,82 +344,211 @@ class EnterpriseQueryBot:
             如果 capture_logs=False: 返回字符串响应（保持向后兼容）
             如果 capture_logs=True: 返回字典 {"response": str, "logs": List[str], "session_id": str}
         """
-        # 创建日志收集器
-        log_collector = None
-        if capture_logs:
-            log_collector = LogCollector()
-            log_collector.start_capture()
+        # 只有需要返回日志时才记录追踪事件（否则日志消息不会被格式化）
+        trace = tracing.start_trace(tracing.parse_level(TRACE_LEVEL)) if capture_logs else None
+        started = time.perf_counter()
 
         try:
-            # 如果没有提供session_id，创建新会话
-            if session_id is None or session_id not in self.sessions:
-                session_id = self.create_session()
-
-            # 获取会话历史
-            session = self.sessions[session_id]
-            user_id = session["user_id"]
-
-            # 添加用户消息
-            user_message = HumanMessage(content=user_input)
-            session["messages"].append(user_message)
-
-            # 构建初始状态
-            initial_state: EnterpriseQueryState = {
-                "messages": [user_message],
-                "session_id": session_id,
-                "user_id": user_id,
-                "intent": None,
-                "intent_confidence": None,
-                "entities": None,
-                "retrieved_docs": None,
-                "tool_results": None,
-                "need_human": False,
-                "final_response": None,
-                "next_step": None
-            }
-
-            # 执行状态图
-            result = self.graph.invoke(initial_state)
-
-            # 获取最终响应
-            response = result.get("final_response", "抱歉，我暂时无法回答这个问题。")
-
-            # 保存到会话历史
-            session["messages"].append(HumanMessage(content=response))
-
-            # 返回结果
-            if capture_logs:
-                logs = log_collector.stop_capture()
-                return {
-                    "response": response,
-                    "logs": [log for log in logs if log.strip()],  # 过滤空行
-                    "session_id": session_id,
-                    "status": "success"
-                }
+            session_id, user_message, initial_state = self._start_turn(user_input, session_id)
+
+            # 语义缓存命中时直接返回已有回复
+            query_vector, cached = self._lookup_answer_cache(user_input)
+            if cached is not None:
+                response = cached["response"]
             else:
-                return response
+                # 执行状态图
+                start = time.perf_counter()
+                result = self.graph.invoke(initial_state)
+                latency_ms = (time.perf_counter() - start) * 1000
+
+                # 获取最终响应
+                response = result.get("final_response", "抱歉，我暂时无法回答这个问题。")
+                self._store_answer_cache(query_vector, user_input, result, latency_ms)
+
+            self._observe_turn(started, cached is not None)
+            return self._finish_turn(session_id, response, trace)
 
         except Exception as e:
-            print(f"处理消息时出错: {e}")
-            import traceback
-            traceback.print_exc()
+            return self._failed_turn(e, session_id, trace)
+        finally:
+            if trace is not None:
+                tracing.end_trace(trace)
+
+    async def achat(self, user_input: str, session_id: str = None, capture_logs: bool = False) -> Dict[str, Any]:
+        """
+        处理用户输入并返回响应（异步）
+
+        与 chat 参数和返回值相同。状态图通过 ainvoke 执行：LLM调用不占用线程，
+        embedding推理和检索在线程池中执行，事件循环在等待期间可以处理其他请求。
+        """
+        trace = tracing.start_trace(tracing.parse_level(TRACE_LEVEL)) if capture_logs else None
+        started = time.perf_counter()
 
-            error_msg = "抱歉，处理您的请求时遇到了问题，请稍后再试。"
-
-            if capture_logs:
-                logs = log_collector.stop_capture() if log_collector else []
-                return {
-                    "response": error_msg,
-                    "logs": [log for log in logs if log.strip()],
-                    "session_id": session_id,
-                    "status": "error",
-                    "error": str(e)
-                }
+        try:
+            # 会话存储（SQLite）的读取可能等待数据库锁，放到线程池执行，不阻塞事件循环
+            session_id, user_message, initial_state = await asyncio.to_thread(self._start_turn, user_input, session_id)
+
+            query_vector, cached = await asyncio.to_thread(self._lookup_answer_cache, user_input)
+            if cached is not None:
+                response = cached["response"]
             else:
-                return error_msg
+                start = time.perf_counter()
+                result = await self.graph.ainvoke(initial_state)
+                latency_ms = (time.perf_counter() - start) * 1000
+
+                response = result.get("final_response", "抱歉，我暂时无法回答这个问题。")
+                self._store_answer_cache(query_vector, user_input, result, latency_ms)
+
+            self._observe_turn(started, cached is not None)
+            return self._finish_turn(session_id, response, trace)
+
+        except Exception as e:
+            return self._failed_turn(e, session_id, trace)
+        finally:
+            if trace is not None:
+                tracing.end_trace(trace)
+
+    async def abatch_chat(self, items: Sequence[Tuple[str, Optional[str]]],
+                          max_concurrency: int = BATCH_MAX_CONCURRENCY,
+                          include_logs: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """
+        批量处理消息，按完成顺序逐条返回结果
+
+        所有查询先合并为一次 embed_documents 调用预热查询向量缓存，
+        之后各消息的答案缓存查找与检索都直接命中缓存；
+        状态图最多同时执行 max_concurrency 条消息，吞吐随并发上限提升。
+        同一会话的消息按提交顺序依次执行，保证会话历史有序。
+
+        Args:
+            items: (消息, 会话ID) 列表，会话ID为空时各自创建新会话
+            max_concurrency: 同时执行的消息数上限
+            include_logs: 结果中是否附带执行日志
+
+        Yields:
+            与 achat(capture_logs=True) 相同的结果字典，另含 index（在 items 中的位置）
+        """
+        from .config import embeddings
+
+        try:
+            embedded = await asyncio.to_thread(embeddings.prime_queries, [message for message, _ in items])
+            tracing.info("[批量对话] %d 条消息，预热查询向量 %d 个", len(items), embedded)
+        except Exception as e:
+            # 预热失败不影响处理，各消息会单独embedding
+            tracing.warning("[批量对话] 预热查询向量失败: %s", e)
+
+        # 同一会话的消息归为一组依次执行，无会话的消息各自一组
+        groups: Dict[Any, List[int]] = {}
+        for index, (_, session_id) in enumerate(items):
+            groups.setdefault(session_id or ("new", index), []).append(index)
+
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def run_group(indices: List[int]):
+            for index in indices:
+                message, session_id = items[index]
+                async with semaphore:
+                    result = await self.achat(message, session_id, capture_logs=True)
+                if not include_logs:
+                    result.pop("logs", None)
+                results.put_nowait({"index": index, **result})
+
+        tasks = [asyncio.create_task(run_group(indices)) for indices in groups.values()]
+        try:
+            for _ in range(len(items)):
+                yield await results.get()
+        finally:
+            # 客户端断开时取消尚未完成的消息
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def _node_event(node: str, update: Optional[dict]) -> Dict[str, Any]:
+        """把节点输出压缩为进度事件（只保留前端关心的字段）"""
+        update = update or {}
+        event = {"event": "node", "node": node}
+        if update.get("intent") is not None:
+            event["intent"] = update["intent"]
+            event["confidence"] = update.get("intent_confidence")
+        if update.get("retrieved_docs") is not None:
+            event["docs"] = len(update["retrieved_docs"])
+        return event
+
+    async def astream_chat(self, user_input: str, session_id: str = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式处理用户输入
+
+        依次产生以下事件（每个事件带有自请求开始的 elapsed_ms）：
+            {"event": "session", "session_id"}
+            {"event": "node", "node", ...}         节点完成（意图识别结果、检索到的文档数等）
+            {"event": "token", "content"}          响应生成/闲聊节点的LLM输出片段
+            {"event": "done", "response", "session_id", "cached"}
+            {"event": "error", "error", "response"}
+        """
+        start = time.perf_counter()
+
+        def elapsed() -> float:
+            return round((time.perf_counter() - start) * 1000, 1)
+
+        try:
+            session_id, user_message, initial_state = await asyncio.to_thread(self._start_turn, user_input, session_id)
+            yield {"event": "session", "session_id": session_id, "elapsed_ms": elapsed()}
+
+            query_vector, cached = await asyncio.to_thread(self._lookup_answer_cache, user_input)
+            if cached is not None:
+                self._observe_turn(start, True)
+                self._finish_turn(session_id, cached["response"], None)
+                yield {"event": "done", "response": cached["response"], "session_id": session_id,
+                       "cached": True, "elapsed_ms": elapsed()}
+                return
+
+            result = dict(initial_state)
+            async for mode, payload in self.graph.astream(initial_state, stream_mode=["updates", "messages"]):
+                if mode == "messages":
+                    chunk, metadata = payload
+                    if metadata.get("langgraph_node") in STREAMED_NODES and chunk.content:
+                        yield {"event": "token", "content": chunk.content, "elapsed_ms": elapsed()}
+                    continue
+                for node, update in payload.items():
+                    result.update(update or {})
+                    yield dict(self._node_event(node, update), elapsed_ms=elapsed())
+
+            response = result.get("final_response") or "抱歉，我暂时无法回答这个问题。"
+            self._store_answer_cache(query_vector, user_input, result, (time.perf_counter() - start) * 1000)
+            self._observe_turn(start, False)
+            self._finish_turn(session_id, response, None)
+            yield {"event": "done", "response": response, "session_id": session_id,
+                   "cached": False, "elapsed_ms": elapsed()}
+
+        except Exception as e:
+            error_msg = self._failed_turn(e, session_id, None)
+            yield {"event": "error", "error": str(e), "response": error_msg, "elapsed_ms": elapsed()}
+
+    async def _print_stream(self, user_input: str, session_id: Optional[str]) -> str:
+        """逐片段打印流式回复，返回会话ID"""
+        streamed = False
+        async for event in self.astream_chat(user_input, session_id):
+            if event["event"] == "session":
+                session_id = event["session_id"]
+            elif event["event"] == "token":
+                if not streamed:
+                    print("\n助手: ", end="", flush=True)
+                    streamed = True
+                print(event["content"], end="", flush=True)
+            elif event["event"] in ("done", "error"):
+                if streamed:
+                    print("\n")
+                else:
+                    print(f"\n助手: {event['response']}\n")
+        return session_id
+
+    def run_interactive(self, stream: bool = False):
+        """
+        运行交互式命令行界面
 
-    def run_interactive(self):
-        """运行交互式命令行界面"""
+        Args:
+            stream: 是否逐片段输出回复（与 /api/v1/chat/stream 使用同一事件流）
+        """
         print("=" * 60)
         print("欢迎使用企业内部查询助手！")
         print("=" * 60)
@@ -166,6 +560,8 @@ class EnterpriseQueryBot:
         print()
 
         session_id = None
+        # 流式模式在整个会话期间复用同一个事件循环
+        loop = asyncio.new_event_loop() if stream else None
 
         while True:
             try:
@@ -187,12 +583,17 @@ class EnterpriseQueryBot:
                 if not user_input:
                     continue
 
-                # 处理消息
-                response = self.chat(user_input, session_id)
+                if stream:
+                    session_id = loop.run_until_complete(self._print_stream(user_input, session_id))
+                    print("-" * 60)
+                    continue
 
-                # 如果是新会话，获取session_id
+                # 如果是新会话，先创建会话
                 if session_id is None:
-                    session_id = list(self.sessions.keys())[-1]
+                    session_id = self.create_session()
+
+                # 处理消息
+                response = self.chat(user_input, session_id)
 
                 # 打印响应
                 print(f"\n助手: {response}\n")
@@ -204,15 +605,14 @@ class EnterpriseQueryBot:
             except Exception as e:
                 print(f"\n发生错误: {e}\n")
 
+        if loop is not None:
+            loop.close()
+
 
 def main():
     """主函数"""
     bot = EnterpriseQueryBot()
-
-    # 保存状态图到PNG
-    bot.save_graph_to_png("customer_service_graph.png")
-
-    bot.run_interactive()
+    bot.run_interactive(stream=True)
 
 
 if __name__ == "__main__":
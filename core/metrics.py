@@ -0,0 +1,372 @@
+"""
+运行指标（Prometheus文本格式）
+
+自带轻量的 Counter / Histogram 实现，不依赖 prometheus_client：
+直方图只保存各桶计数、总和与次数，记录一次耗时是一次二分查找加一次加锁累加；
+p50/p90/p99 由桶计数线性插值估算（与 Prometheus 的 histogram_quantile 相同）。
+
+指标在 /metrics 以 Prometheus 文本格式暴露，分位数摘要见 /api/v1/stats。
+"""
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# 默认耗时桶（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 批大小桶
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+# 提示词token数桶
+TOKEN_BUCKETS = (100, 200, 400, 600, 800, 1200, 1600, 2400, 3200, 4800, 6400)
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _CounterChild:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ("_lock", "_bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._lock = threading.Lock()
+        self._bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # 最后一个为 +Inf 桶
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """由桶计数线性插值估算分位数"""
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if total == 0:
+            return None
+
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                if i == len(self._bounds):
+                    return self._bounds[-1]
+                lower = self._bounds[i - 1] if i else 0.0
+                upper = self._bounds[i]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self._bounds[-1]
+
+
+class _Metric:
+    """带标签的指标，每组标签值对应一个子指标"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """获取（或创建）一组标签值对应的子指标；热路径上可缓存返回值"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """只增计数器"""
+
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+            for key, child in sorted(self._children.items())
+        ]
+
+    def values(self) -> Dict[str, float]:
+        return {",".join(key) or "total": child.value for key, child in sorted(self._children.items())}
+
+
+class Gauge(_Metric):
+    """当前值（如队列长度）"""
+
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+            for key, child in sorted(self._children.items())
+        ]
+
+
+class Histogram(_Metric):
+    """直方图"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, child in sorted(self._children.items()):
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+    def summary(self, scale: float = 1000.0, suffix: str = "_ms") -> Dict[str, dict]:
+        """各标签组的次数与 p50/p90/p99（默认把秒换算为毫秒）"""
+        result = {}
+        for key, child in sorted(self._children.items()):
+            entry = {"count": child.count}
+            for q in QUANTILES:
+                value = child.quantile(q)
+                entry[f"p{int(q * 100)}{suffix}"] = None if value is None else round(value * scale, 2)
+            result[",".join(key) or "total"] = entry
+        return result
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus文本格式"""
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+NODE_DURATION = REGISTRY.register(Histogram(
+    "enterprise_query_node_duration_seconds", "状态图节点耗时", ["node"]))
+NODE_ERRORS = REGISTRY.register(Counter(
+    "enterprise_query_node_errors_total", "状态图节点出错次数（抛出异常或返回error）", ["node"]))
+RETRIEVAL_DURATION = REGISTRY.register(Histogram(
+    "enterprise_query_retrieval_duration_seconds", "知识库检索耗时（含查询embedding）", ["method"]))
+RETRIEVALS = REGISTRY.register(Counter(
+    "enterprise_query_retrieval_total", "知识库检索次数（按实际使用的检索方式）", ["mode"]))
+PARTITION_RETRIEVALS = REGISTRY.register(Counter(
+    "enterprise_query_partition_retrieval_total",
+    "按意图分区检索次数（partition: 分区内检索，fallback: 分区结果较弱退回全局，global: 检索全部分区）",
+    ["intent", "result"]))
+FAQ_FAST_PATH = REGISTRY.register(Counter(
+    "enterprise_query_faq_fast_path_total",
+    "FAQ直接回答匹配次数（hit: 直接回答，miss: 相似度不足，ambiguous: 与第二名差距不足，skipped: 未启用或短查询）",
+    ["intent", "result"]))
+ANSWER_DURATION = REGISTRY.register(Histogram(
+    "enterprise_query_answer_duration_seconds", "生成回答的耗时（faq: FAQ匹配直接回答，llm: LLM响应生成）",
+    ["intent", "path"]))
+EMBEDDING_DURATION = REGISTRY.register(Histogram(
+    "enterprise_query_embedding_duration_seconds", "查询embedding模型推理耗时（缓存未命中时）"))
+EMBEDDING_BATCH_SIZE = REGISTRY.register(Histogram(
+    "enterprise_query_embedding_batch_size", "查询embedding微批处理每批的查询数", buckets=BATCH_BUCKETS))
+EMBEDDING_BATCH_WAIT = REGISTRY.register(Histogram(
+    "enterprise_query_embedding_batch_wait_seconds", "查询在微批处理队列中的等待时间"))
+EMBEDDING_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "enterprise_query_embedding_queue_depth", "微批处理队列中等待的查询数"))
+LLM_DURATION = REGISTRY.register(Histogram(
+    "enterprise_query_llm_duration_seconds", "LLM调用耗时", ["node"]))
+LLM_ERRORS = REGISTRY.register(Counter(
+    "enterprise_query_llm_errors_total", "LLM调用出错次数", ["node"]))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "enterprise_query_llm_tokens_total", "LLM token用量", ["node", "type"]))
+INTENTS = REGISTRY.register(Counter(
+    "enterprise_query_intent_total", "识别出的意图次数", ["intent", "source"]))
+ROUTES = REGISTRY.register(Counter(
+    "enterprise_query_route_total", "路由决策次数", ["route"]))
+PROMPT_TOKENS = REGISTRY.register(Histogram(
+    "enterprise_query_prompt_tokens", "响应生成提示词token数（估算；raw为直接拼接检索内容，packed为组装后）",
+    ["stage"], buckets=TOKEN_BUCKETS))
+STARTUP_DURATION = REGISTRY.register(Gauge(
+    "enterprise_query_startup_seconds", "启动各阶段耗时（导入、预热各步骤、到就绪的总耗时）", ["phase"]))
+CHAT_DURATION = REGISTRY.register(Histogram(
+    "enterprise_query_chat_duration_seconds", "一轮对话总耗时", ["cache"]))
+CHAT_ERRORS = REGISTRY.register(Counter(
+    "enterprise_query_chat_errors_total", "对话处理出错次数"))
+SESSION_WRITE_ERRORS = REGISTRY.register(Counter(
+    "enterprise_query_session_write_errors_total",
+    "会话存储后台写入失败次数（write: 批量写入，失败的操作保留重试；cleanup: 过期清理）", ["stage"]))
+SESSION_WRITES_DROPPED = REGISTRY.register(Counter(
+    "enterprise_query_session_writes_dropped_total", "待重试操作超出上限或关闭时仍写入失败而丢弃的会话写操作数"))
+
+
+def render() -> str:
+    """全部指标的Prometheus文本格式"""
+    return REGISTRY.render()
+
+
+def summary() -> dict:
+    """耗时分位数与计数摘要（用于 /api/v1/stats）"""
+    return {
+        "node_latency": NODE_DURATION.summary(),
+        "retrieval_latency": RETRIEVAL_DURATION.summary(),
+        "retrieval_modes": RETRIEVALS.values(),
+        "partition_retrievals": PARTITION_RETRIEVALS.values(),
+        "faq_fast_path": FAQ_FAST_PATH.values(),
+        "answer_latency": ANSWER_DURATION.summary(),
+        "embedding_latency": EMBEDDING_DURATION.summary(),
+        "embedding_batch_size": EMBEDDING_BATCH_SIZE.summary(scale=1.0, suffix=""),
+        "embedding_batch_wait": EMBEDDING_BATCH_WAIT.summary(),
+        "llm_latency": LLM_DURATION.summary(),
+        "chat_latency": CHAT_DURATION.summary(),
+        "prompt_tokens": PROMPT_TOKENS.summary(scale=1.0, suffix=""),
+        "node_errors": NODE_ERRORS.values(),
+        "session_write_errors": SESSION_WRITE_ERRORS.values(),
+        "session_writes_dropped": SESSION_WRITES_DROPPED.values(),
+        "llm_tokens": LLM_TOKENS.values(),
+        "intents": INTENTS.values(),
+        "routes": ROUTES.values(),
+    }
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """记录每次LLM调用的耗时、出错次数与token用量（按所在节点分组）"""
+
+    # 直接在调用线程中执行，异步调用时不额外占用线程池
+    run_inline = True
+
+    def __init__(self):
+        self._runs: Dict[UUID, Tuple[float, str]] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata: Optional[dict] = None, **kwargs):
+        self._runs[run_id] = (time.perf_counter(), (metadata or {}).get("langgraph_node", "none"))
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, metadata: Optional[dict] = None, **kwargs):
+        self._runs[run_id] = (time.perf_counter(), (metadata or {}).get("langgraph_node", "none"))
+
+    def _finish(self, run_id: UUID) -> Optional[str]:
+        started = self._runs.pop(run_id, None)
+        if started is None:
+            return None
+        start, node = started
+        LLM_DURATION.labels(node).observe(time.perf_counter() - start)
+        return node
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs):
+        node = self._finish(run_id)
+        if node is None:
+            return
+        prompt_tokens, completion_tokens = _token_usage(response)
+        if prompt_tokens:
+            LLM_TOKENS.labels(node, "prompt").inc(prompt_tokens)
+        if completion_tokens:
+            LLM_TOKENS.labels(node, "completion").inc(completion_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        node = self._finish(run_id)
+        if node is not None:
+            LLM_ERRORS.labels(node).inc()
+
+
+def _token_usage(response: LLMResult) -> Tuple[int, int]:
+    """从LLM返回中取出 (prompt_tokens, completion_tokens)；流式调用时供应商可能不返回用量"""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+llm_metrics_callback = LLMMetricsCallback()
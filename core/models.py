@@ -37,6 +37,9 @@ class EnterpriseQueryState(TypedDict):
     # 流程控制
     next_step: Optional[str]
 
+    # 节点执行出错时的错误信息（出错的回复不会写入语义缓存）
+    error: Optional[str]
+
 
 # 兼容性别名
 CustomerServiceState = EnterpriseQueryState
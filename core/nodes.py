@@ -1,28 +1,106 @@
 """
 LangGraph节点定义
 """
+import asyncio
 import json
-from typing import Any
+import threading
+import time
+from typing import Any, List, Optional
 from langchain_core.messages import HumanMessage, AIMessage
 
 from .models import EnterpriseQueryState
-from .config import llm, INTENT_CONFIDENCE_THRESHOLD
-from .knowledge_base import knowledge_base
+from .config import (
+    get_llm, INTENT_CONFIDENCE_THRESHOLD, FAST_INTENT_ENABLED,
+    EMBEDDING_INTENT_ENABLED, EMBEDDING_INTENT_THRESHOLD, PARTITIONED_RETRIEVAL
+)
+from .intent_rules import rule_classifier
+from .intent_classifier import SECTION_INTENTS, intent_classifier
+from .knowledge_base import PARTITION_FIELD, knowledge_base
+from .faq import faq_fast_path
+from .context_builder import context_builder, estimate_tokens
+from . import tracing
+from .metrics import INTENTS, PROMPT_TOKENS, ROUTES
 from .tools import query_employee_info, query_department_info
 
 
-def intent_recognition_node(state: EnterpriseQueryState) -> dict:
-    """
-    意图识别节点
-    """
-    messages = state["messages"]
-    last_message = messages[-1].content
+class SpeculationStats:
+    """推测执行检索的统计（被采用 / 被丢弃）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.used = 0
+        self.discarded = {}  # 检索节点丢弃预检索结果的原因 -> 次数
+
+    def record_run(self):
+        with self._lock:
+            self.runs += 1
+
+    def record_used(self):
+        with self._lock:
+            self.used += 1
+
+    def record_discarded(self, reason: str):
+        """记录检索节点丢弃预检索结果（未路由到检索节点的丢弃不在此记录）"""
+        with self._lock:
+            self.discarded[reason] = self.discarded.get(reason, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            wasted = self.runs - self.used
+            return {
+                "runs": self.runs,
+                "used": self.used,
+                "wasted": wasted,
+                "waste_rate": round(wasted / self.runs, 4) if self.runs else 0.0,
+                "discarded": dict(self.discarded),
+            }
+
+
+speculation_stats = SpeculationStats()
+
+
+def _rule_intent(last_message: str) -> Optional[dict]:
+    """规则快速分类，确定时返回状态更新"""
+    if not FAST_INTENT_ENABLED:
+        return None
+
+    fast = rule_classifier.classify(last_message)
+    if fast is None:
+        return None
+
+    tracing.info("[节点] 规则识别意图: %s (置信度: %.2f, 规则: %s)", fast["intent"], fast["confidence"], fast["rule"])
+    INTENTS.labels(fast["intent"], "rule").inc()
+    return {
+        "intent": fast["intent"],
+        "intent_confidence": fast["confidence"],
+        "entities": fast["entities"],
+        "next_step": "router"
+    }
+
+
+def _embedding_intent(last_message: str) -> Optional[dict]:
+    """embedding分类器识别，置信度足够时返回状态更新"""
+    if not EMBEDDING_INTENT_ENABLED:
+        return None
 
-    print(f"\n[节点] 进入意图识别节点 (intent_recognition_node)")
-    print(f"[节点] 用户消息: {last_message}")
+    predicted = intent_classifier.classify(last_message, EMBEDDING_INTENT_THRESHOLD)
+    if predicted is None:
+        return None
 
-    # 使用LLM进行意图分类
-    intent_prompt = f"""
+    tracing.info("[节点] 向量识别意图: %s (置信度: %.2f)", predicted["intent"], predicted["confidence"])
+    INTENTS.labels(predicted["intent"], "embedding").inc()
+    return {
+        "intent": predicted["intent"],
+        "intent_confidence": predicted["confidence"],
+        "entities": predicted["entities"],
+        "next_step": "router"
+    }
+
+
+def _intent_prompt(last_message: str) -> str:
+    """LLM意图识别提示词"""
+    return f"""
 分析以下用户消息的意图，返回JSON格式。
 
 用户消息：{last_message}
@@ -54,28 +132,78 @@ def intent_recognition_node(state: EnterpriseQueryState) -> dict:
 只返回JSON，不要其他内容。
 """
 
+
+def _parse_intent_response(content: str) -> dict:
+    """解析LLM返回的意图JSON"""
+    result = json.loads(content)
+    intent = result.get("intent", "general_inquiry")
+    # 模型可能把置信度写成字符串（"0.9"），无法转换时由调用方按识别失败处理
+    confidence = float(result.get("confidence", 0.5))
+
+    tracing.info("[节点] 识别意图: %s (置信度: %.2f)", intent, confidence)
+    INTENTS.labels(intent, "llm").inc()
+
+    return {
+        "intent": intent,
+        "intent_confidence": confidence,
+        "entities": result.get("entities", {}),
+        "next_step": "router"
+    }
+
+
+def _intent_failure(e: Exception) -> dict:
+    """意图识别失败时的状态更新（低置信度，路由到转人工）"""
+    tracing.error("意图识别失败: %s", e)
+    INTENTS.labels("general_inquiry", "fallback").inc()
+    return {
+        "intent": "general_inquiry",
+        "intent_confidence": 0.3,
+        "entities": {},
+        "next_step": "router",
+        "error": str(e)
+    }
+
+
+def intent_recognition_node(state: EnterpriseQueryState) -> dict:
+    """
+    意图识别节点
+    """
+    messages = state["messages"]
+    last_message = messages[-1].content
+
+    tracing.info("[节点] 用户消息: %s", last_message)
+
+    # 先用规则快速分类，再用embedding分类器识别，都无法确定时才调用LLM
+    local = _rule_intent(last_message) or _embedding_intent(last_message)
+    if local is not None:
+        return local
+
     try:
-        response = llm.invoke(intent_prompt)
-        result = json.loads(response.content)
-        intent = result.get("intent", "general_inquiry")
-        confidence = result.get("confidence", 0.5)
+        response = get_llm().invoke(_intent_prompt(last_message))
+        return _parse_intent_response(response.content)
+    except Exception as e:
+        return _intent_failure(e)
 
-        print(f"[节点] 识别意图: {intent} (置信度: {confidence:.2f})")
 
-        return {
-            "intent": intent,
-            "intent_confidence": confidence,
-            "entities": result.get("entities", {}),
-            "next_step": "router"
-        }
+async def aintent_recognition_node(state: EnterpriseQueryState) -> dict:
+    """
+    意图识别节点（异步）
+    """
+    messages = state["messages"]
+    last_message = messages[-1].content
+
+    tracing.info("[节点] 用户消息: %s", last_message)
+
+    # 规则分类耗时微秒级，直接执行；embedding推理占用CPU，放到线程池执行
+    local = _rule_intent(last_message) or await asyncio.to_thread(_embedding_intent, last_message)
+    if local is not None:
+        return local
+
+    try:
+        response = await get_llm().ainvoke(_intent_prompt(last_message))
+        return _parse_intent_response(response.content)
     except Exception as e:
-        print(f"意图识别失败: {e}")
-        return {
-            "intent": "general_inquiry",
-            "intent_confidence": 0.3,
-            "entities": {},
-            "next_step": "router"
-        }
+        return _intent_failure(e)
 
 
 def router_node(state: EnterpriseQueryState) -> str:
@@ -85,13 +213,13 @@ def router_node(state: EnterpriseQueryState) -> str:
     intent = state.get("intent", "general_inquiry")
     confidence = state.get("intent_confidence", 0.0)
 
-    print(f"\n[路由] 进入路由节点")
-    print(f"[路由] 意图: {intent}, 置信度: {confidence:.2f}")
+    tracing.info("[路由] 意图: %s, 置信度: %.2f", intent, confidence)
 
     # 低置信度或明确要求转人工
     if confidence < INTENT_CONFIDENCE_THRESHOLD or intent == "transfer_human":
         route = "transfer_to_human"
-        print(f"[路由] 决策: 转人工 (置信度过低或用户请求)")
+        tracing.info("[路由] 决策: 转人工 (置信度过低或用户请求)")
+        ROUTES.labels(route).inc()
         return route
 
     # 根据意图路由 - 所有企业查询都走知识库检索
@@ -108,7 +236,8 @@ def router_node(state: EnterpriseQueryState) -> str:
     }
 
     route = intent_routes.get(intent, "knowledge_retrieval")
-    print(f"[路由] 决策: 路由到 {route}\n")
+    tracing.info("[路由] 决策: 路由到 %s", route)
+    ROUTES.labels(route).inc()
     return route
 
 
@@ -134,32 +263,168 @@ def greeting_handler_node(state: EnterpriseQueryState) -> dict:
     }
 
 
-def knowledge_retrieval_node(state: EnterpriseQueryState) -> dict:
-    """
-    知识库检索节点（RAG）
+def _reuse_speculative_docs(state: EnterpriseQueryState) -> Optional[dict]:
     """
-    print("\n[节点] 进入知识库检索节点 (knowledge_retrieval_node)")
+    推测执行模式下检索已与意图识别并行完成，直接使用
 
-    messages = state["messages"]
-    query = messages[-1].content
+    预检索时意图尚未确定，检索的是全部分区；意图对应部门分区时，
+    只有全部文档都属于该分区才采用，否则丢弃，由检索节点按分区重新检索。
+    """
+    if state.get("retrieved_docs") is None:
+        return None
+
+    docs = state["retrieved_docs"]
+    partitions = _retrieval_partitions(state)
+    if partitions is not None and any(
+        (doc.metadata or {}).get(PARTITION_FIELD) not in partitions for doc in docs
+    ):
+        speculation_stats.record_discarded("partition")
+        tracing.info("[节点] 预检索结果包含 %s 分区以外的文档，按分区重新检索", partitions)
+        return None
+
+    speculation_stats.record_used()
+    tracing.info("[节点] 使用并行预检索的 %d 个文档", len(docs))
+    return {
+        "retrieved_docs": docs,
+        "next_step": "response_generation"
+    }
 
-    # 从知识库检索
-    docs = knowledge_base.search(query, k=3)
 
+def _retrieval_result(docs: list) -> dict:
+    """检索结果的状态更新"""
     if not docs:
-        print("[节点] 未检索到相关文档，将使用空上下文生成响应\n")
+        tracing.info("[节点] 未检索到相关文档，将使用空上下文生成响应")
         return {
             "retrieved_docs": [],
             "next_step": "response_generation"
         }
 
-    print(f"[节点] 成功检索到 {len(docs)} 个文档，准备生成响应\n")
+    tracing.info("[节点] 成功检索到 %d 个文档，准备生成响应", len(docs))
     return {
         "retrieved_docs": docs,
         "next_step": "response_generation"
     }
 
 
+# 意图 -> 检索的知识库分区（章节）；general_inquiry 等不在表中的意图检索全部分区
+INTENT_PARTITIONS = {
+    intent: [section] for section, intent in SECTION_INTENTS.items() if intent != "general_inquiry"
+}
+
+
+def _retrieval_partitions(state: EnterpriseQueryState) -> Optional[List[str]]:
+    """按意图选择检索分区，None表示全部分区"""
+    if not PARTITIONED_RETRIEVAL:
+        return None
+    return INTENT_PARTITIONS.get(state.get("intent", "general_inquiry"))
+
+
+def _faq_answer(state: EnterpriseQueryState) -> Optional[dict]:
+    """高置信度命中问答对时直接返回知识库答案，跳过响应生成（与检索相同，只匹配意图对应的分区）"""
+    query = state["messages"][-1].content
+    intent = state.get("intent", "general_inquiry")
+
+    start = time.perf_counter()
+    match, result = faq_fast_path.match(query, _retrieval_partitions(state))
+    faq_fast_path.record_check(intent, result, time.perf_counter() - start)
+    if match is None:
+        return None
+
+    if state.get("retrieved_docs") is not None:
+        # 推测执行的预检索结果不再使用，在此提前返回前计入丢弃，保证采用率统计准确
+        speculation_stats.record_discarded("faq")
+    tracing.info("[FAQ直答] 命中问题「%s」（相似度 %.2f，领先第二名 %.2f），跳过响应生成",
+                 match.question, match.score, match.margin)
+    return {
+        "retrieved_docs": [match.document],
+        "final_response": faq_fast_path.render(match),
+        "next_step": "end"
+    }
+
+
+def retrieval_router(state: EnterpriseQueryState) -> str:
+    """检索后路由：FAQ直接回答时结束，否则生成响应"""
+    return "end" if state.get("next_step") == "end" else "response_generation"
+
+
+def knowledge_retrieval_node(state: EnterpriseQueryState) -> dict:
+    """
+    知识库检索节点（RAG）
+    """
+    answered = _faq_answer(state)
+    if answered is not None:
+        return answered
+
+    reused = _reuse_speculative_docs(state)
+    if reused is not None:
+        return reused
+
+    messages = state["messages"]
+    query = messages[-1].content
+
+    # 从知识库检索（只检索意图对应部门的分区）
+    docs = knowledge_base.search(
+        query, k=3, partitions=_retrieval_partitions(state), intent=state.get("intent", "general_inquiry")
+    )
+    return _retrieval_result(docs)
+
+
+async def aknowledge_retrieval_node(state: EnterpriseQueryState) -> dict:
+    """
+    知识库检索节点（RAG，异步）
+    """
+    answered = await asyncio.to_thread(_faq_answer, state)
+    if answered is not None:
+        return answered
+
+    reused = _reuse_speculative_docs(state)
+    if reused is not None:
+        return reused
+
+    messages = state["messages"]
+    query = messages[-1].content
+
+    # 检索包含embedding推理和矩阵运算，放到线程池执行，不阻塞事件循环
+    docs = await asyncio.to_thread(
+        knowledge_base.search, query, 3,
+        partitions=_retrieval_partitions(state), intent=state.get("intent", "general_inquiry")
+    )
+    return _retrieval_result(docs)
+
+
+def speculative_retrieval_node(state: EnterpriseQueryState) -> dict:
+    """
+    推测执行检索节点 - 与意图识别并行执行
+
+    绝大多数意图最终都会走知识库检索，提前检索可把检索耗时移出关键路径；
+    若最终路由到问候/闲聊/转人工，检索结果被丢弃。
+    """
+    speculation_stats.record_run()
+    query = state["messages"][-1].content
+    docs = knowledge_base.search(query, k=3)
+
+    # 只写入 retrieved_docs，避免与并行的意图识别节点写同一字段
+    return {"retrieved_docs": docs}
+
+
+async def aspeculative_retrieval_node(state: EnterpriseQueryState) -> dict:
+    """
+    推测执行检索节点（异步）
+    """
+    speculation_stats.record_run()
+    query = state["messages"][-1].content
+    docs = await asyncio.to_thread(knowledge_base.search, query, 3)
+
+    return {"retrieved_docs": docs}
+
+
+def intent_join_node(state: EnterpriseQueryState) -> dict:
+    """
+    汇合节点 - 等待意图识别与并行预检索都完成后再路由
+    """
+    return {}
+
+
 def order_handler_node(state: EnterpriseQueryState) -> dict:
     """
     订单查询处理节点
@@ -282,6 +547,23 @@ def complaint_handler_node(state: EnterpriseQueryState) -> dict:
     }
 
 
+def _chitchat_prompt(user_message: str) -> str:
+    """闲聊提示词"""
+    return f"""
+你是一个友好的企业内部查询助手。用户说：{user_message}
+
+请给出简短友好的回复，然后引导用户提出企业相关的问题（如行政、人力、IT、法务、财务、采购等）。回复要简洁（不超过50字）。
+"""
+
+
+def _chitchat_failure(e: Exception) -> dict:
+    return {
+        "final_response": "感谢您的留言！请问有什么可以帮到您的吗？",
+        "next_step": "end",
+        "error": str(e)
+    }
+
+
 def chitchat_handler_node(state: EnterpriseQueryState) -> dict:
     """
     闲聊处理节点
@@ -289,48 +571,53 @@ def chitchat_handler_node(state: EnterpriseQueryState) -> dict:
     messages = state["messages"]
     user_message = messages[-1].content
 
-    chitchat_prompt = f"""
-你是一个友好的企业内部查询助手。用户说：{user_message}
-
-请给出简短友好的回复，然后引导用户提出企业相关的问题（如行政、人力、IT、法务、财务、采购等）。回复要简洁（不超过50字）。
-"""
-
     try:
-        response = llm.invoke(chitchat_prompt)
+        response = get_llm().invoke(_chitchat_prompt(user_message))
         return {
             "final_response": response.content,
             "next_step": "end"
         }
     except Exception as e:
-        return {
-            "final_response": "感谢您的留言！请问有什么可以帮到您的吗？",
-            "next_step": "end"
-        }
+        return _chitchat_failure(e)
 
 
-def response_generation_node(state: EnterpriseQueryState) -> dict:
+async def achitchat_handler_node(state: EnterpriseQueryState) -> dict:
     """
-    响应生成节点
+    闲聊处理节点（异步）
     """
-    print("\n[节点] 进入响应生成节点 (response_generation_node)")
+    messages = state["messages"]
+    user_message = messages[-1].content
 
+    try:
+        response = await get_llm().ainvoke(_chitchat_prompt(user_message))
+        return {
+            "final_response": response.content,
+            "next_step": "end"
+        }
+    except Exception as e:
+        return _chitchat_failure(e)
+
+
+def _generation_prompt(state: EnterpriseQueryState) -> str:
+    """根据检索文档和工具结果构建响应生成提示词"""
     messages = state["messages"]
     retrieved_docs = state.get("retrieved_docs", [])
     tool_results = state.get("tool_results", {})
 
     # 构建上下文
     context = ""
+    packed = None
 
     if retrieved_docs:
-        print(f"[响应生成] 使用RAG检索到的 {len(retrieved_docs)} 个文档作为上下文")
-        context += "参考企业知识库：\n"
-        for doc in retrieved_docs:
-            context += f"- {doc.page_content}\n"
+        tracing.info("[响应生成] 使用RAG检索到的 %d 个文档作为上下文", len(retrieved_docs))
+        # 去掉文档块之间的重叠与重复行，按相似度装入token预算
+        packed = context_builder.build(retrieved_docs)
+        context += f"参考企业知识库：\n{packed.text}\n"
     else:
-        print(f"[响应生成] 没有RAG文档，将直接使用LLM生成响应")
+        tracing.info("[响应生成] 没有RAG文档，将直接使用LLM生成响应")
 
     if tool_results:
-        print(f"[响应生成] 使用工具调用结果: {list(tool_results.keys())}")
+        tracing.info("[响应生成] 使用工具调用结果: %s", list(tool_results.keys()))
         context += f"\n查询结果：\n{json.dumps(tool_results, ensure_ascii=False, indent=2)}"
 
     # 生成响应
@@ -350,20 +637,67 @@ def response_generation_node(state: EnterpriseQueryState) -> dict:
 - 如果知识库中有联系方式或流程步骤，请详细列出
 """
 
+    # 报告组装前后的提示词token数（组装前 = 直接拼接全部检索内容）
+    prompt_tokens = estimate_tokens(prompt)
+    raw_prompt_tokens = prompt_tokens + (packed.raw_tokens - packed.tokens if packed else 0)
+    PROMPT_TOKENS.labels("raw").observe(raw_prompt_tokens)
+    PROMPT_TOKENS.labels("packed").observe(prompt_tokens)
+    if packed is not None:
+        tracing.info(
+            "[响应生成] 提示词 %d → %d tokens（检索内容 %d → %d，去重叠 %d 字符，去重复行 %d，%s）",
+            raw_prompt_tokens, prompt_tokens, packed.raw_tokens, packed.tokens,
+            packed.overlap_chars, packed.duplicate_lines, "已按预算截断" if packed.truncated else "未截断",
+        )
+    return prompt
+
+
+def _generation_failure(e: Exception) -> dict:
+    tracing.error("生成响应失败: %s", e)
+    return {
+        "final_response": "抱歉，我遇到了一些问题。请稍后再试或转接人工客服。",
+        "next_step": "end",
+        "error": str(e)
+    }
+
+
+def response_generation_node(state: EnterpriseQueryState) -> dict:
+    """
+    响应生成节点
+    """
+    prompt = _generation_prompt(state)
+
     try:
-        print("[响应生成] 正在调用LLM生成最终响应...")
-        response = llm.invoke(prompt)
-        print("[响应生成] 响应生成成功\n")
+        tracing.debug("[响应生成] 正在调用LLM生成最终响应...")
+        start = time.perf_counter()
+        response = get_llm().invoke(prompt)
+        faq_fast_path.record_generation(state.get("intent", "general_inquiry"), time.perf_counter() - start)
+        tracing.info("[响应生成] 响应生成成功")
         return {
             "final_response": response.content,
             "next_step": "end"
         }
     except Exception as e:
-        print(f"生成响应失败: {e}")
+        return _generation_failure(e)
+
+
+async def aresponse_generation_node(state: EnterpriseQueryState) -> dict:
+    """
+    响应生成节点（异步）
+    """
+    prompt = _generation_prompt(state)
+
+    try:
+        tracing.debug("[响应生成] 正在调用LLM生成最终响应...")
+        start = time.perf_counter()
+        response = await get_llm().ainvoke(prompt)
+        faq_fast_path.record_generation(state.get("intent", "general_inquiry"), time.perf_counter() - start)
+        tracing.info("[响应生成] 响应生成成功")
         return {
-            "final_response": "抱歉，我遇到了一些问题。请稍后再试或转接人工客服。",
+            "final_response": response.content,
             "next_step": "end"
         }
+    except Exception as e:
+        return _generation_failure(e)
 
 
 def transfer_to_human_node(state: EnterpriseQueryState) -> dict:
@@ -0,0 +1,126 @@
+"""
+向量量化存储
+
+NumpyVectorStore 的 float16 / int8 模式使用：
+- ScalarQuantizer: 逐维度的标量量化。int8 模式每个维度记录 offset/scale，x ≈ offset + scale * code，
+  查询与量化向量的内积可以直接在量化域计算：q·x ≈ q·offset + (q*scale)·code
+- MappedMatrix: 保存精确float32向量的内存映射文件，常驻内存的只有量化后的向量，
+  精确向量只在重排序时按行读取（由操作系统页缓存管理）
+
+int8 每个384维向量常驻384字节，float16 为768字节，float32 为1536字节。
+"""
+import os
+import tempfile
+from typing import Optional
+
+import numpy as np
+
+PRECISIONS = ("float32", "float16", "int8")
+
+# 量化域打分时分块转换为float32，限制临时内存
+SCORE_BLOCK_SIZE = 2048
+# 数值范围扩大时预留的余量（占跨度的比例），减少逐批写入时的重新量化次数
+RANGE_MARGIN = 0.05
+
+
+class ScalarQuantizer:
+    """逐维度标量量化（float16 直接截断精度，int8 按维度 offset/scale 线性映射到 [-127, 127]）"""
+
+    def __init__(self, precision: str, dim: int):
+        if precision not in ("float16", "int8"):
+            raise ValueError(f"不支持的量化精度: {precision}")
+        self.precision = precision
+        self.dim = dim
+        self.dtype = np.float16 if precision == "float16" else np.int8
+        self.low: Optional[np.ndarray] = None
+        self.high: Optional[np.ndarray] = None
+        self.offset = np.zeros(dim, dtype=np.float32)
+        self.scale = np.ones(dim, dtype=np.float32)
+
+    def needs_refit(self, vectors: np.ndarray) -> bool:
+        """新向量是否超出当前量化范围（超出时需要扩大范围并重新量化已有向量）"""
+        if self.precision != "int8" or not len(vectors):
+            return False
+        if self.low is None:
+            return True
+        return bool((vectors.min(axis=0) < self.low).any() or (vectors.max(axis=0) > self.high).any())
+
+    def fit(self, vectors: np.ndarray) -> None:
+        """把量化范围扩大到覆盖 vectors（只扩大不缩小）"""
+        if self.precision != "int8" or not len(vectors):
+            return
+        low, high = vectors.min(axis=0), vectors.max(axis=0)
+        if self.low is not None:
+            low, high = np.minimum(low, self.low), np.maximum(high, self.high)
+        margin = (high - low) * RANGE_MARGIN
+        self.low, self.high = low - margin, high + margin
+        self.offset = ((self.low + self.high) / 2).astype(np.float32)
+        scale = ((self.high - self.low) / 254).astype(np.float32)
+        scale[scale == 0] = 1.0
+        self.scale = scale
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        if self.precision == "float16":
+            return vectors.astype(np.float16)
+        codes = np.rint((vectors - self.offset) / self.scale)
+        return np.clip(codes, -127, 127).astype(np.int8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        if self.precision == "float16":
+            return codes.astype(np.float32)
+        return self.offset + self.scale * codes.astype(np.float32)
+
+    def scores(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """
+        量化域内积
+
+        Args:
+            codes: (n, dim) 量化向量
+            queries: (n_queries, dim) float32 查询
+
+        Returns:
+            (n_queries, n) 近似内积
+        """
+        if self.precision == "float16":
+            weights, bias = queries, np.zeros(len(queries), dtype=np.float32)
+        else:
+            weights, bias = queries * self.scale, queries @ self.offset
+        result = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BLOCK_SIZE):
+            block = codes[start:start + SCORE_BLOCK_SIZE].astype(np.float32)
+            result[:, start:start + len(block)] = weights @ block.T
+        return result + bias[:, None]
+
+
+class MappedMatrix:
+    """
+    按行存放float32向量的内存映射文件（可扩容）
+
+    文件创建后立即删除目录项（POSIX系统），进程退出后自动回收，不会留下临时文件。
+    """
+
+    def __init__(self, dim: int, capacity: int, directory: Optional[str] = None):
+        self.dim = dim
+        fd, path = tempfile.mkstemp(prefix="vectors-", suffix=".f32", dir=directory or None)
+        self._file = os.fdopen(fd, "w+b")
+        try:
+            os.unlink(path)
+        except OSError:
+            pass  # Windows 不允许删除已打开的文件
+        self.array: Optional[np.memmap] = None
+        self.resize(capacity)
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self.array is None else self.array.shape[0]
+
+    def resize(self, capacity: int) -> None:
+        """扩容（已有数据保留在文件中）"""
+        if self.array is not None:
+            self.array.flush()
+        self._file.truncate(capacity * self.dim * 4)
+        self.array = np.memmap(self._file, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def close(self) -> None:
+        self.array = None
+        self._file.close()
@@ -0,0 +1,152 @@
+"""
+语义答案缓存
+
+对已经回答过的问题，若新问题的向量与其余弦相似度超过阈值，直接返回缓存的最终回复，
+完全跳过状态图（省去意图识别和响应生成两次LLM调用）。
+
+缓存条目带有TTL和知识库版本：知识库重新加载（版本变化）后所有条目失效。
+"""
+import threading
+import time
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """基于向量相似度的答案缓存"""
+
+    def __init__(self, threshold: float = 0.95, ttl: float = 3600, max_entries: int = 2048):
+        """
+        Args:
+            threshold: 命中所需的最小余弦相似度
+            ttl: 条目有效期（秒）
+            max_entries: 最多缓存的条目数，超出时淘汰最久未命中的条目
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._vectors: Optional[np.ndarray] = None  # (max_entries, dim)，已归一化
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._expires_at = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._entries = [None] * max_entries
+        self._kb_version = None
+        self._lock = threading.Lock()
+
+        self.lookups = 0
+        self.hits = 0
+        self.invalidations = 0
+        self.latency_saved_ms = 0.0
+
+    def _check_version(self, kb_version: Optional[str]) -> None:
+        """知识库版本变化时清空缓存（调用方需持有锁）"""
+        if kb_version != self._kb_version:
+            if self._valid.any():
+                self.invalidations += 1
+            self._valid[:] = False
+            self._entries = [None] * self.max_entries
+            self._kb_version = kb_version
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, vector: Sequence[float], kb_version: Optional[str]) -> Optional[dict]:
+        """
+        查找语义相近的已回答问题
+
+        Args:
+            vector: 新问题的向量
+            kb_version: 当前知识库版本
+
+        Returns:
+            命中时返回缓存条目 {"query", "response", "intent", "kb_version", "latency_ms", "similarity"}
+        """
+        if self.max_entries <= 0:
+            return None
+
+        query = self._normalize(vector)
+        now = time.time()
+        with self._lock:
+            self.lookups += 1
+            self._check_version(kb_version)
+
+            live = self._valid & (self._expires_at > now)
+            self._valid &= live
+            if self._vectors is None or not live.any():
+                return None
+
+            scores = np.where(live, self._vectors @ query, -np.inf)
+            slot = int(np.argmax(scores))
+            similarity = float(scores[slot])
+            if similarity < self.threshold:
+                return None
+
+            self.hits += 1
+            self._last_used[slot] = now
+            entry = self._entries[slot]
+            self.latency_saved_ms += entry["latency_ms"]
+            return dict(entry, similarity=similarity)
+
+    def store(self, vector: Sequence[float], query: str, response: str, kb_version: Optional[str],
+              intent: Optional[str] = None, latency_ms: float = 0.0) -> None:
+        """
+        缓存一次完整回答
+
+        Args:
+            vector: 问题向量
+            query: 问题原文
+            response: 最终回复
+            kb_version: 生成回复时的知识库版本
+            intent: 识别出的意图
+            latency_ms: 生成该回复的耗时（命中时计入节省的延迟）
+        """
+        if self.max_entries <= 0:
+            return
+
+        vector = self._normalize(vector)
+        now = time.time()
+        with self._lock:
+            self._check_version(kb_version)
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._valid[:] = False
+
+            free = np.flatnonzero(~self._valid)
+            slot = int(free[0]) if free.size else int(np.argmin(self._last_used))
+
+            self._vectors[slot] = vector
+            self._valid[slot] = True
+            self._expires_at[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._entries[slot] = {
+                "query": query,
+                "response": response,
+                "intent": intent,
+                "kb_version": kb_version,
+                "latency_ms": latency_ms,
+            }
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._valid[:] = False
+            self._entries = [None] * self.max_entries
+
+    def stats(self) -> dict:
+        """缓存统计"""
+        with self._lock:
+            return {
+                "entries": int(self._valid.sum()),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "invalidations": self.invalidations,
+                "latency_saved_ms": round(self.latency_saved_ms, 1),
+            }
@@ -0,0 +1,577 @@
+"""
+会话存储
+
+会话数有上限（超出时淘汰最久未活跃的会话），空闲超过TTL的会话自动过期；
+每个会话只保留最近 max_messages 条消息（环形缓冲），消息以 (角色, 文本) 元组紧凑存储，
+需要时再转换为LangChain消息对象。
+
+- InMemorySessionStore: 进程内存储，适合单进程部署
+- SQLiteSessionStore: SQLite（WAL）存储，同一主机上的多个worker进程共享，无需会话粘滞路由；
+  数据库是本地文件，跨主机的多个副本不能共享（WAL不支持网络文件系统），需要会话粘滞或外部存储
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Deque, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from . import tracing
+from .metrics import SESSION_WRITE_ERRORS, SESSION_WRITES_DROPPED
+
+USER = "user"
+ASSISTANT = "assistant"
+
+
+class Session:
+    """单个会话"""
+
+    __slots__ = ("session_id", "user_id", "created_at", "last_active", "messages", "bytes")
+
+    def __init__(self, session_id: str, user_id: str, max_messages: int,
+                 created_at: Optional[float] = None, last_active: Optional[float] = None):
+        now = time.time()
+        self.session_id = session_id
+        self.user_id = user_id
+        self.created_at = created_at or now
+        self.last_active = last_active or now
+        self.messages: Deque[Tuple[str, str]] = deque(maxlen=max_messages)
+        self.bytes = 0
+
+    def append(self, role: str, text: str) -> int:
+        """追加一条消息，返回占用字节数的变化"""
+        if self.messages.maxlen == 0:
+            return 0
+        delta = len(text.encode("utf-8"))
+        if self.messages.maxlen is not None and len(self.messages) == self.messages.maxlen:
+            delta -= len(self.messages[0][1].encode("utf-8"))
+        self.messages.append((role, text))
+        self.bytes += delta
+        return delta
+
+    def to_messages(self) -> List[BaseMessage]:
+        """转换为LangChain消息列表"""
+        return [HumanMessage(content=text) if role == USER else AIMessage(content=text)
+                for role, text in self.messages]
+
+
+def new_session_id() -> str:
+    return str(uuid.uuid4())
+
+
+def default_user_id() -> str:
+    return f"user_{uuid.uuid4().hex[:8]}"
+
+
+class SessionStore(ABC):
+    """会话存储接口"""
+
+    @abstractmethod
+    def create(self, user_id: Optional[str] = None) -> str:
+        """创建会话，返回会话ID"""
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Session]:
+        """获取会话（并刷新活跃时间），不存在或已过期时返回None"""
+
+    @abstractmethod
+    def append(self, session_id: str, role: str, text: str) -> None:
+        """向会话追加一条消息"""
+
+    def touch(self, session_id: str) -> Optional[Session]:
+        """校验会话并刷新活跃时间（热路径，返回的会话不保证包含消息）"""
+        return self.get(session_id)
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """删除会话"""
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """存储统计"""
+
+    def close(self) -> None:
+        """释放资源"""
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+
+class InMemorySessionStore(SessionStore):
+    """进程内会话存储（LRU + 空闲TTL）"""
+
+    def __init__(self, max_sessions: int = 10000, ttl: float = 3600, max_messages: int = 50):
+        """
+        Args:
+            max_sessions: 最多保留的会话数，超出时淘汰最久未活跃的会话
+            ttl: 会话空闲过期时间（秒），0表示不过期
+            max_messages: 每个会话保留的最近消息数
+        """
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_messages = max_messages
+
+        # 按最近活跃时间排序：最久未活跃的在最前面
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        self.created = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.bytes
+
+    def _expire(self, now: float) -> None:
+        """从最久未活跃的会话开始清理已过期会话（调用方需持有锁）"""
+        if self.ttl <= 0:
+            return
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_active < self.ttl:
+                break
+            self._remove(session_id)
+            self.expirations += 1
+
+    def _touch(self, session_id: str, now: float) -> Optional[Session]:
+        """查找会话并刷新活跃时间（调用方需持有锁）"""
+        self._expire(now)
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_active = now
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def create(self, user_id: Optional[str] = None) -> str:
+        session_id = new_session_id()
+        session = Session(session_id, user_id or default_user_id(), self.max_messages)
+        with self._lock:
+            self._expire(session.created_at)
+            self._sessions[session_id] = session
+            self.created += 1
+            while len(self._sessions) > self.max_sessions:
+                self._remove(next(iter(self._sessions)))
+                self.evictions += 1
+        return session_id
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            return self._touch(session_id, time.time())
+
+    def append(self, session_id: str, role: str, text: str) -> None:
+        with self._lock:
+            session = self._touch(session_id, time.time())
+            if session is not None:
+                self._bytes += session.append(role, text)
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            if session_id not in self._sessions:
+                return False
+            self._remove(session_id)
+            return True
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire(time.time())
+            return {
+                "backend": "memory",
+                "live_sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "ttl": self.ttl,
+                "max_messages": self.max_messages,
+                "messages": sum(len(session.messages) for session in self._sessions.values()),
+                "bytes": self._bytes,
+                "created": self.created,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SQLite（WAL模式）会话存储，同一主机上的多个worker进程共享同一个数据库文件（不能跨主机共享）
+
+    - 创建会话同步写入，其他worker立即可见
+    - 消息追加与活跃时间刷新放入队列，由后台线程按批在一个事务中写入
+    - 每个进程保留一个小的热缓存（会话元数据），热路径上的会话校验无需读库；
+      缓存条目 hot_ttl 秒后重新校验，以发现其他worker的过期清理与淘汰
+    - 过期会话、超出上限的会话以及超出 max_messages 的旧消息由后台线程定期清理
+    - 批量写入失败时保留该批操作，每隔 retry_interval 秒与新操作一起重试；
+      待重试操作超过 max_retry_ops 时丢弃最早的操作（计入指标）
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_active REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_sessions_last_active ON sessions (last_active);
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        role TEXT NOT NULL,
+        text TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id);
+    """
+
+    def __init__(self, path: str, max_sessions: int = 10000, ttl: float = 3600, max_messages: int = 50,
+                 flush_interval: float = 0.05, batch_size: int = 256, hot_size: int = 1024, hot_ttl: float = 5.0,
+                 cleanup_interval: float = 60.0, retry_interval: float = 1.0, max_retry_ops: int = 10000):
+        """
+        Args:
+            path: 数据库文件路径
+            max_sessions: 最多保留的会话数，超出时淘汰最久未活跃的会话
+            ttl: 会话空闲过期时间（秒），0表示不过期
+            max_messages: 每个会话保留的最近消息数
+            flush_interval: 批量写入的最长等待时间（秒）
+            batch_size: 单批最多写入的操作数
+            hot_size: 进程内热缓存的会话数
+            hot_ttl: 热缓存条目的有效期（秒）
+            cleanup_interval: 清理过期会话与旧消息的间隔（秒）
+            retry_interval: 写入失败后的重试间隔（秒）
+            max_retry_ops: 最多保留等待重试的操作数
+        """
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.hot_size = hot_size
+        self.hot_ttl = hot_ttl
+        self.cleanup_interval = cleanup_interval
+        self.retry_interval = retry_interval
+        self.max_retry_ops = max_retry_ops
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+        conn.close()
+
+        # 热缓存：session_id -> (Session元数据, 缓存时间)
+        self._hot: "OrderedDict[str, Tuple[Session, float]]" = OrderedDict()
+        self._hot_lock = threading.Lock()
+
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._stop = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, name="session-writer", daemon=True)
+        self._writer.start()
+
+        self._stats_lock = threading.Lock()
+        self.created = 0
+        self.hot_hits = 0
+        self.hot_misses = 0
+        self.batches = 0
+        self.batched_ops = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.write_errors = 0
+        self.retry_pending = 0
+        self.dropped_writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        """当前线程的读连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # ===== 热缓存 =====
+
+    def _hot_get(self, session_id: str, now: float) -> Optional[Session]:
+        with self._hot_lock:
+            entry = self._hot.get(session_id)
+            if entry is None:
+                return None
+            session, cached_at = entry
+            if now - cached_at > self.hot_ttl or (self.ttl > 0 and now - session.last_active >= self.ttl):
+                del self._hot[session_id]
+                return None
+            self._hot.move_to_end(session_id)
+            return session
+
+    def _hot_put(self, session: Session, now: float) -> None:
+        with self._hot_lock:
+            self._hot[session.session_id] = (session, now)
+            self._hot.move_to_end(session.session_id)
+            while len(self._hot) > self.hot_size:
+                self._hot.popitem(last=False)
+
+    def _hot_discard(self, session_id: str) -> None:
+        with self._hot_lock:
+            self._hot.pop(session_id, None)
+
+    # ===== 读写接口 =====
+
+    def create(self, user_id: Optional[str] = None) -> str:
+        session = Session(new_session_id(), user_id or default_user_id(), self.max_messages)
+        # 同步写入：后续请求可能落在其他worker上
+        self._reader().execute(
+            "INSERT INTO sessions (session_id, user_id, created_at, last_active) VALUES (?, ?, ?, ?)",
+            (session.session_id, session.user_id, session.created_at, session.last_active)
+        )
+        self._hot_put(session, session.created_at)
+        with self._stats_lock:
+            self.created += 1
+        return session.session_id
+
+    def touch(self, session_id: str) -> Optional[Session]:
+        """
+        校验会话并刷新活跃时间（热路径）
+
+        Returns:
+            会话元数据（不含消息），不存在或已过期时返回None
+        """
+        now = time.time()
+        session = self._hot_get(session_id, now)
+        with self._stats_lock:
+            if session is not None:
+                self.hot_hits += 1
+            else:
+                self.hot_misses += 1
+
+        if session is None:
+            row = self._reader().execute(
+                "SELECT user_id, created_at, last_active FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None or (self.ttl > 0 and now - row[2] >= self.ttl):
+                return None
+            session = Session(session_id, row[0], self.max_messages, created_at=row[1], last_active=row[2])
+            self._hot_put(session, now)
+
+        session.last_active = now
+        self._queue.put(("touch", session_id, now))
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """获取会话及其消息（先写入本进程尚未落库的操作）"""
+        session = self.touch(session_id)
+        if session is None:
+            return None
+
+        self.flush()
+        full = Session(session_id, session.user_id, self.max_messages,
+                       created_at=session.created_at, last_active=session.last_active)
+        rows = self._reader().execute(
+            "SELECT role, text FROM (SELECT id, role, text FROM messages WHERE session_id = ? "
+            "ORDER BY id DESC LIMIT ?) ORDER BY id", (session_id, self.max_messages)
+        ).fetchall()
+        for role, text in rows:
+            full.append(role, text)
+        return full
+
+    def append(self, session_id: str, role: str, text: str) -> None:
+        self._queue.put(("append", session_id, role, text, time.time()))
+
+    def delete(self, session_id: str) -> bool:
+        self.flush()
+        self._hot_discard(session_id)
+        conn = self._reader()
+        deleted = conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount
+        conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        return deleted > 0
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.touch(session_id) is not None
+
+    def __len__(self) -> int:
+        return self._reader().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """等待队列中的写操作全部落库"""
+        if not self._writer.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        done.wait(timeout)
+
+    def close(self) -> None:
+        """写入剩余操作并停止后台线程"""
+        self.flush()
+        self._stop.set()
+        self._queue.put(("stop",))
+        self._writer.join(timeout=5)
+
+    # ===== 后台写入 =====
+
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        last_cleanup = time.time()
+        retry: List[tuple] = []  # 写入失败、等待重试的操作（按原顺序）
+        while not self._stop.is_set():
+            try:
+                batch = retry + [self._queue.get(timeout=self.retry_interval if retry else self.cleanup_interval)]
+            except queue.Empty:
+                batch = list(retry)
+
+            # 在 flush_interval 内尽量凑满一批
+            deadline = time.monotonic() + self.flush_interval
+            while batch and len(batch) < self.batch_size and batch[-1][0] not in ("flush", "stop"):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                self._write_batch(conn, batch)
+                retry = []
+            except Exception as e:
+                retry = self._keep_for_retry(batch, e)
+            finally:
+                for op in batch:
+                    if op[0] == "flush":
+                        op[1].set()
+
+            if time.time() - last_cleanup >= self.cleanup_interval:
+                last_cleanup = time.time()
+                try:
+                    self._cleanup(conn)
+                except Exception as e:
+                    SESSION_WRITE_ERRORS.labels("cleanup").inc()
+                    tracing.error("会话过期清理失败: %s", e)
+
+        if retry:
+            # 关闭前最后重试一次
+            try:
+                self._write_batch(conn, retry)
+            except Exception as e:
+                self._drop(len(retry))
+                tracing.error("关闭会话存储时 %d 个写操作仍写入失败，已丢弃: %s", len(retry), e)
+        conn.close()
+
+    def _keep_for_retry(self, batch: List[tuple], error: Exception) -> List[tuple]:
+        """批量写入失败：保留该批的写操作等待重试，超出上限时丢弃最早的操作"""
+        ops = [op for op in batch if op[0] in ("touch", "append")]
+        dropped = max(len(ops) - self.max_retry_ops, 0)
+        if dropped:
+            ops = ops[dropped:]
+            self._drop(dropped)
+        SESSION_WRITE_ERRORS.labels("write").inc()
+        with self._stats_lock:
+            self.write_errors += 1
+            self.retry_pending = len(ops)
+        tracing.error("会话写入失败，%d 个操作将在 %.1f 秒后重试（丢弃 %d 个）: %s",
+                      len(ops), self.retry_interval, dropped, error)
+        return ops
+
+    def _drop(self, count: int) -> None:
+        SESSION_WRITES_DROPPED.inc(count)
+        with self._stats_lock:
+            self.dropped_writes += count
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[tuple]) -> None:
+        touches = {}
+        appends = []
+        for op in batch:
+            if op[0] == "touch":
+                touches[op[1]] = max(op[2], touches.get(op[1], 0))
+            elif op[0] == "append":
+                _, session_id, role, text, at = op
+                appends.append((session_id, role, text))
+                touches[session_id] = max(at, touches.get(session_id, 0))
+        if not touches:
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "UPDATE sessions SET last_active = MAX(last_active, ?) WHERE session_id = ?",
+                [(at, session_id) for session_id, at in touches.items()]
+            )
+            if appends:
+                conn.executemany("INSERT INTO messages (session_id, role, text) VALUES (?, ?, ?)", appends)
+                # 每个会话只保留最近 max_messages 条消息
+                conn.executemany(
+                    "DELETE FROM messages WHERE session_id = ? AND id <= COALESCE(("
+                    "SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?), -1)",
+                    [(session_id, session_id, self.max_messages) for session_id in {a[0] for a in appends}]
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        with self._stats_lock:
+            self.batches += 1
+            self.batched_ops += len(batch)
+            self.retry_pending = 0
+
+    def _cleanup(self, conn: sqlite3.Connection) -> None:
+        """删除过期会话、超出上限的最久未活跃会话以及它们的消息"""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            expired = 0
+            if self.ttl > 0:
+                expired = conn.execute(
+                    "DELETE FROM sessions WHERE last_active < ?", (time.time() - self.ttl,)
+                ).rowcount
+            evicted = conn.execute(
+                "DELETE FROM sessions WHERE session_id IN (SELECT session_id FROM sessions "
+                "ORDER BY last_active DESC LIMIT -1 OFFSET ?)", (self.max_sessions,)
+            ).rowcount
+            conn.execute("DELETE FROM messages WHERE session_id NOT IN (SELECT session_id FROM sessions)")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        with self._stats_lock:
+            self.expirations += expired
+            self.evictions += evicted
+
+    def stats(self) -> dict:
+        conn = self._reader()
+        sessions, messages, bytes_held = conn.execute(
+            "SELECT (SELECT COUNT(*) FROM sessions), COUNT(*), COALESCE(SUM(LENGTH(CAST(text AS BLOB))), 0) "
+            "FROM messages"
+        ).fetchone()
+        with self._stats_lock:
+            hot_lookups = self.hot_hits + self.hot_misses
+            return {
+                "backend": "sqlite",
+                "path": self.path,
+                "live_sessions": sessions,
+                "max_sessions": self.max_sessions,
+                "ttl": self.ttl,
+                "max_messages": self.max_messages,
+                "messages": messages,
+                "bytes": bytes_held,
+                "created": self.created,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "pending_writes": self._queue.qsize(),
+                "retry_pending": self.retry_pending,
+                "write_errors": self.write_errors,
+                "dropped_writes": self.dropped_writes,
+                "batches": self.batches,
+                "avg_batch_size": round(self.batched_ops / self.batches, 2) if self.batches else 0.0,
+                "hot_cache_size": len(self._hot),
+                "hot_hit_rate": round(self.hot_hits / hot_lookups, 4) if hot_lookups else 0.0,
+            }
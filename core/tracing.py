@@ -0,0 +1,223 @@
+"""
+请求级追踪
+
+每个请求在自己的上下文（contextvars）中持有一个 Trace，节点和检索记录结构化事件：
+- log: 分级日志，消息按 %-格式延迟格式化，只在渲染时才拼接字符串
+- node / retrieval: 带耗时和输出大小的执行片段
+
+asyncio 任务、asyncio.to_thread 以及LangGraph的线程池都会复制上下文，
+因此并发请求各自只记录自己的事件。没有活动 Trace 时，事件交给标准库 logging
+（默认级别下 DEBUG/INFO 被直接丢弃，几乎没有开销）。
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+_LEVEL_NAMES = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR}
+
+# 片段事件的渲染前缀
+_KIND_LABELS = {"node": "节点", "retrieval": "RAG检索"}
+
+logger = logging.getLogger("enterprise_query")
+
+
+def parse_level(name: str) -> int:
+    """把级别名称（DEBUG/INFO/WARNING/ERROR）转换为数值级别"""
+    return _LEVEL_NAMES.get(name.strip().upper(), INFO)
+
+
+def payload_size(value: Any) -> int:
+    """估算节点输出大小（字符数）：字符串长度、文档正文长度，容器递归求和"""
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, Document):
+        return len(value.page_content)
+    if isinstance(value, dict):
+        return sum(payload_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(payload_size(item) for item in value)
+    return 0
+
+
+class TraceEvent:
+    """一条追踪事件"""
+
+    __slots__ = ("kind", "level", "offset_ms", "message", "args", "name", "duration_ms", "size")
+
+    def __init__(self, kind: str, level: int, offset_ms: float, message: str, args: tuple = (),
+                 name: Optional[str] = None, duration_ms: Optional[float] = None, size: Optional[int] = None):
+        self.kind = kind
+        self.level = level
+        self.offset_ms = offset_ms
+        self.message = message
+        self.args = args
+        self.name = name
+        self.duration_ms = duration_ms
+        self.size = size
+
+    @property
+    def text(self) -> str:
+        """格式化后的消息；参数与格式不匹配时（与 logging 相同）不抛出异常，原样附上参数"""
+        if not self.args:
+            return self.message
+        try:
+            return self.message % self.args
+        except Exception:
+            return f"{self.message} {self.args!r}"
+
+    def render(self) -> str:
+        """渲染为一行日志"""
+        if self.kind == "log":
+            return self.text
+        details = [f"{self.duration_ms:.1f}ms"]
+        if self.size is not None:
+            details.append(f"输出 {self.size} 字符")
+        return f"[{_KIND_LABELS.get(self.kind, self.kind)}] {self.text} ({', '.join(details)})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "level": logging.getLevelName(self.level),
+            "offset_ms": round(self.offset_ms, 1),
+            "message": self.text,
+            "name": self.name,
+            "duration_ms": None if self.duration_ms is None else round(self.duration_ms, 1),
+            "size": self.size,
+        }
+
+
+class Trace:
+    """单个请求的事件记录"""
+
+    def __init__(self, level: int = INFO):
+        self.level = level
+        self.events: List[TraceEvent] = []
+        self._start = time.perf_counter()
+        self._token = None
+
+    def enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    def add(self, kind: str, level: int, message: str, args: tuple = (), **fields) -> None:
+        offset_ms = (time.perf_counter() - self._start) * 1000
+        # list.append 是原子操作，并行分支的节点可以同时记录
+        self.events.append(TraceEvent(kind, level, offset_ms, message, args, **fields))
+
+    def render(self) -> List[str]:
+        """渲染为日志行（按记录顺序）"""
+        return [event.render() for event in self.events]
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [event.to_dict() for event in self.events]
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    """当前上下文的 Trace（没有则为None）"""
+    return _current.get()
+
+
+def start_trace(level: int = INFO) -> Trace:
+    """在当前上下文开始一个 Trace，需与 end_trace 成对调用"""
+    trace = Trace(level)
+    trace._token = _current.set(trace)
+    return trace
+
+
+def end_trace(trace: Trace) -> None:
+    """结束 start_trace 开始的 Trace，恢复之前的上下文"""
+    if trace._token is not None:
+        _current.reset(trace._token)
+        trace._token = None
+
+
+@contextmanager
+def tracing(level: int = INFO):
+    """上下文管理器形式的 start_trace / end_trace"""
+    trace = start_trace(level)
+    try:
+        yield trace
+    finally:
+        end_trace(trace)
+
+
+def log(level: int, message: str, *args) -> None:
+    """记录一条日志事件；参数按 %-格式延迟格式化"""
+    trace = _current.get()
+    if trace is not None:
+        if trace.enabled(level):
+            trace.add("log", level, message, args)
+    elif logger.isEnabledFor(level):
+        logger.log(level, message, *args)
+
+
+def debug(message: str, *args) -> None:
+    log(DEBUG, message, *args)
+
+
+def info(message: str, *args) -> None:
+    log(INFO, message, *args)
+
+
+def warning(message: str, *args) -> None:
+    log(WARNING, message, *args)
+
+
+def error(message: str, *args) -> None:
+    log(ERROR, message, *args)
+
+
+class Span:
+    """执行片段；payload 在片段结束时才计算大小"""
+
+    __slots__ = ("payload", "size")
+
+    def __init__(self):
+        self.payload = None
+        self.size: Optional[int] = None
+
+
+@contextmanager
+def span(kind: str, message: str, *args, name: Optional[str] = None, level: int = INFO):
+    """
+    记录一个带耗时的执行片段
+
+    Args:
+        kind: 事件类型（node / retrieval）
+        message: 片段描述（%-格式，延迟格式化）
+        name: 片段名称（如节点名）
+        level: 事件级别
+
+    Yields:
+        Span：可设置 payload（按 payload_size 计算大小）或直接设置 size
+    """
+    trace = _current.get()
+    recording = trace.enabled(level) if trace is not None else logger.isEnabledFor(level)
+    current = Span()
+    if not recording:
+        yield current
+        return
+
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        size = current.size
+        if size is None and current.payload is not None:
+            size = payload_size(current.payload)
+        if trace is not None:
+            trace.add(kind, level, message, args, name=name, duration_ms=duration_ms, size=size)
+        else:
+            logger.log(level, "[%s] " + message + " (%.1fms)", _KIND_LABELS.get(kind, kind), *args, duration_ms)
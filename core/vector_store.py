@@ -0,0 +1,505 @@
+"""
+基于NumPy的向量存储
+
+所有文档向量保存在一个连续的float32矩阵中（按行存放，已L2归一化），
+一次查询只需一次矩阵-向量乘法，Top-K使用部分排序（argpartition）选出；
+多个查询可以合并为一次矩阵乘法批量检索。
+
+实现了langchain VectorStore接口，可直接替换InMemoryVectorStore。
+
+index_type="ivf" 时使用IVF-Flat近似最近邻索引（见 ann_index.py），
+只对与查询最接近的若干簇内的向量打分；带过滤条件的检索始终为精确检索。
+
+precision="float16"/"int8" 时常驻内存的只有量化向量（见 quantization.py），
+精确float32向量保存在内存映射文件中：先在量化域打分选出 k * rerank_factor 个候选，
+再读取候选的精确向量重排序，返回的分数为精确余弦相似度。
+"""
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from .ann_index import IVFFlatIndex
+from .quantization import PRECISIONS, SCORE_BLOCK_SIZE, MappedMatrix, ScalarQuantizer
+
+
+# 过滤后的行号最多由这么多段连续区间组成时，逐段在矩阵切片上打分（否则复制选中的行）
+MAX_SLICED_RUNS = 32
+
+# 过滤条件：metadata字段到取值的字典（列表/元组/集合表示任一取值），或对文档的判断函数
+MetadataFilter = Union[Dict[str, Any], Callable[[Document], bool]]
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """按行L2归一化（零向量保持不变）"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def contiguous_runs(rows: np.ndarray, max_runs: int) -> Optional[List[Tuple[int, int]]]:
+    """把行号拆成连续区间 [(start, stop), ...]（顺序与 rows 一致），超过 max_runs 段时返回None"""
+    if not len(rows):
+        return []
+    breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+    if len(breaks) >= max_runs:
+        return None
+    starts = np.concatenate(([0], breaks))
+    stops = np.concatenate((breaks, [len(rows)]))
+    return [(int(rows[a]), int(rows[b - 1]) + 1) for a, b in zip(starts, stops)]
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    返回分数最高的k个下标（按分数降序）
+
+    只对前k个候选做完整排序，其余元素用argpartition在O(n)内排除。
+    """
+    n = scores.shape[-1]
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(n)
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class NumpyVectorStore(VectorStore):
+    """连续float32矩阵实现的向量存储"""
+
+    # 矩阵扩容时的最小容量
+    _MIN_CAPACITY = 64
+
+    INDEX_TYPES = ("flat", "ivf")
+
+    def __init__(self, embedding: Embeddings, index_type: str = "flat", nlist: int = 0,
+                 nprobe: int = 8, min_index_size: int = 10000, precision: str = "float32",
+                 rerank_factor: int = 8, mmap_dir: Optional[str] = None):
+        """
+        Args:
+            embedding: embedding模型
+            index_type: 索引类型，flat（精确检索）或 ivf（近似检索）
+            nlist: IVF簇数，0表示按数据量自动选择
+            nprobe: IVF检索时探查的簇数
+            min_index_size: 文档数少于该值时不建IVF索引，直接精确检索
+            precision: 常驻内存的向量精度，float32 / float16 / int8
+            rerank_factor: 量化模式下用精确向量重排序的候选数为 k 的多少倍
+            mmap_dir: 量化模式下精确向量内存映射文件所在目录，默认为系统临时目录
+        """
+        if index_type not in self.INDEX_TYPES:
+            raise ValueError(f"未知的索引类型: {index_type}，可选: {self.INDEX_TYPES}")
+        if precision not in PRECISIONS:
+            raise ValueError(f"未知的向量精度: {precision}，可选: {PRECISIONS}")
+
+        self.embedding = embedding
+        self.index_type = index_type
+        self.nprobe = nprobe
+        self.min_index_size = min_index_size
+        self._index = IVFFlatIndex(nlist=nlist, nprobe=nprobe) if index_type == "ivf" else None
+        self._index_dirty = False
+
+        self.precision = precision
+        self.rerank_factor = max(1, rerank_factor)
+        self.mmap_dir = mmap_dir
+        self._mapped: Optional[MappedMatrix] = None  # 量化模式下 _matrix 为其内存映射
+        self._codes: Optional[np.ndarray] = None  # 量化向量 (capacity, dim)
+        self._quantizer: Optional[ScalarQuantizer] = None
+
+        self._matrix = None  # (capacity, dim) float32，前 _size 行有效
+        self._size = 0
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[dict] = []
+        self._id_to_row = {}
+        self._metadata_index: Dict[str, Dict[Any, np.ndarray]] = {}  # 字段 -> 取值 -> 行号（按需构建）
+        self._lock = threading.RLock()
+
+    # ===== 基本属性 =====
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    @property
+    def dim(self) -> Optional[int]:
+        """向量维度，尚未添加文档时为None"""
+        return None if self._matrix is None else self._matrix.shape[1]
+
+    @property
+    def ids(self) -> List[str]:
+        """所有文档ID（按存储顺序）"""
+        return list(self._ids)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """有效的向量矩阵视图 (n, dim)"""
+        if self._matrix is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._matrix[:self._size]
+
+    @property
+    def quantized(self) -> bool:
+        return self.precision != "float32"
+
+    @property
+    def ann_index(self) -> Optional[IVFFlatIndex]:
+        """近似检索索引（flat类型时为None）"""
+        return self._index
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._id_to_row
+
+    # ===== 写入 =====
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """embedding文本并添加到存储"""
+        texts = list(texts)
+        vectors = self.embedding.embed_documents(texts) if texts else []
+        return self.add_embeddings(texts, vectors, metadatas=metadatas, ids=ids)
+
+    def add_embeddings(self, texts: Sequence[str], embeddings, metadatas: Optional[Sequence[dict]] = None,
+                       ids: Optional[Sequence[Optional[str]]] = None) -> List[str]:
+        """
+        添加已计算好向量的文档，不调用embedding模型
+
+        Args:
+            texts: 文档文本
+            embeddings: 向量，形状 (n, dim) 的矩阵或向量列表
+            metadatas: 元数据
+            ids: 文档ID，已存在的ID会被覆盖
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+
+        vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1))
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        ids = [doc_id or str(uuid.uuid4()) for doc_id in ids] if ids is not None \
+            else [str(uuid.uuid4()) for _ in texts]
+        if not (len(metadatas) == len(ids) == len(texts)):
+            raise ValueError(
+                f"texts/metadatas/ids 长度不一致: {len(texts)}/{len(metadatas)}/{len(ids)}"
+            )
+
+        with self._lock:
+            if self._matrix is not None and vectors.shape[1] != self._matrix.shape[1]:
+                raise ValueError(f"向量维度不一致: 期望 {self._matrix.shape[1]}，实际 {vectors.shape[1]}")
+
+            self._reserve(self._size + len(texts), vectors.shape[1])
+            rows = []
+            for doc_id, text, metadata, vector in zip(ids, texts, metadatas, vectors):
+                row = self._id_to_row.get(doc_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._id_to_row[doc_id] = row
+                    self._ids.append(doc_id)
+                    self._texts.append(text)
+                    self._metadatas.append(metadata)
+                else:
+                    self._texts[row] = text
+                    self._metadatas[row] = metadata
+                self._matrix[row] = vector
+                rows.append(row)
+            if self.quantized:
+                self._quantize_rows(rows, vectors)
+            self._index_dirty = True
+            self._metadata_index.clear()
+
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """删除文档（用最后一行填补空位，保持矩阵连续）"""
+        if not ids:
+            return None
+
+        with self._lock:
+            for doc_id in ids:
+                row = self._id_to_row.pop(doc_id, None)
+                if row is None:
+                    continue
+                last = self._size - 1
+                if row != last:
+                    self._matrix[row] = self._matrix[last]
+                    if self._codes is not None:
+                        self._codes[row] = self._codes[last]
+                    self._ids[row] = self._ids[last]
+                    self._texts[row] = self._texts[last]
+                    self._metadatas[row] = self._metadatas[last]
+                    self._id_to_row[self._ids[row]] = row
+                self._ids.pop()
+                self._texts.pop()
+                self._metadatas.pop()
+                self._size = last
+                self._index_dirty = True
+                self._metadata_index.clear()
+        return True
+
+    def _reserve(self, capacity: int, dim: int) -> None:
+        """确保矩阵容量足够（按倍数扩容，均摊O(1)）"""
+        if self.quantized:
+            self._reserve_quantized(capacity, dim)
+        elif self._matrix is None:
+            self._matrix = np.empty((max(capacity, self._MIN_CAPACITY), dim), dtype=np.float32)
+        elif capacity > self._matrix.shape[0]:
+            new_capacity = max(capacity, self._matrix.shape[0] * 2)
+            matrix = np.empty((new_capacity, dim), dtype=np.float32)
+            matrix[:self._size] = self._matrix[:self._size]
+            self._matrix = matrix
+
+    def _reserve_quantized(self, capacity: int, dim: int) -> None:
+        if self._mapped is None:
+            capacity = max(capacity, self._MIN_CAPACITY)
+            self._mapped = MappedMatrix(dim, capacity, self.mmap_dir)
+            self._quantizer = ScalarQuantizer(self.precision, dim)
+            self._codes = np.empty((capacity, dim), dtype=self._quantizer.dtype)
+        elif capacity > self._mapped.capacity:
+            capacity = max(capacity, self._mapped.capacity * 2)
+            self._mapped.resize(capacity)
+            codes = np.empty((capacity, dim), dtype=self._quantizer.dtype)
+            codes[:self._size] = self._codes[:self._size]
+            self._codes = codes
+        self._matrix = self._mapped.array
+
+    def _quantize_rows(self, rows: List[int], vectors: np.ndarray) -> None:
+        """量化新写入的行；新向量超出量化范围时扩大范围并从精确向量重新量化全部行"""
+        if self._quantizer.needs_refit(vectors):
+            self._quantizer.fit(vectors)
+            for start in range(0, self._size, SCORE_BLOCK_SIZE):
+                end = min(start + SCORE_BLOCK_SIZE, self._size)
+                self._codes[start:end] = self._quantizer.encode(self._matrix[start:end])
+        else:
+            self._codes[rows] = self._quantizer.encode(vectors)
+
+    def memory_stats(self) -> dict:
+        """每个向量占用的内存（字节）：resident 为常驻内存，mapped 为内存映射文件中的精确向量"""
+        dim = self.dim or 0
+        resident = dim * (self._codes.itemsize if self.quantized and self._codes is not None else 4)
+        return {
+            "precision": self.precision,
+            "vectors": self._size,
+            "dim": dim,
+            "resident_bytes_per_vector": resident,
+            "mapped_bytes_per_vector": dim * 4 if self.quantized else 0,
+            "resident_bytes": resident * self._size,
+        }
+
+    def close(self) -> None:
+        """释放内存映射文件"""
+        with self._lock:
+            if self._mapped is not None:
+                self._matrix = None
+                self._codes = None
+                self._mapped.close()
+                self._mapped = None
+                self._size = 0
+                self._ids, self._texts, self._metadatas, self._id_to_row = [], [], [], {}
+
+    # ===== 索引 =====
+
+    def build_index(self) -> bool:
+        """
+        （重新）训练近似检索索引
+
+        写入后会在下一次检索时自动重建，批量写入完成后显式调用可避免首个查询承担训练耗时。
+
+        Returns:
+            当前是否使用近似检索
+        """
+        with self._lock:
+            if self._index is None:
+                return False
+            if self._index_dirty or not self._index.trained:
+                if self._size >= self.min_index_size:
+                    self._index.train(self.vectors)
+                else:
+                    self._index.centroids = None
+                self._index_dirty = False
+            return self._index.trained
+
+    def _candidate_rows(self, query: np.ndarray, nprobe: Optional[int]) -> Optional[np.ndarray]:
+        """近似检索的候选行号，使用精确检索时返回None"""
+        if self._index is None or not self.build_index():
+            return None
+        return self._index.candidates(query, nprobe or self.nprobe)
+
+    # ===== 读取 =====
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        """按ID获取文档"""
+        rows = [self._id_to_row[doc_id] for doc_id in ids if doc_id in self._id_to_row]
+        return [self._document(row) for row in rows]
+
+    def get_vectors(self, ids: Sequence[str]) -> np.ndarray:
+        """按ID获取（归一化后的）向量矩阵"""
+        rows = [self._id_to_row[doc_id] for doc_id in ids]
+        return self._matrix[rows] if rows else np.empty((0, self.dim or 0), dtype=np.float32)
+
+    def _document(self, row: int) -> Document:
+        return Document(id=self._ids[row], page_content=self._texts[row], metadata=self._metadatas[row])
+
+    # ===== 检索 =====
+
+    def filter_ids(self, filter: MetadataFilter) -> List[str]:
+        """满足过滤条件的文档ID"""
+        with self._lock:
+            rows = self._filter_rows(filter)
+            return list(self._ids[:self._size]) if rows is None else [self._ids[row] for row in rows]
+
+    def metadata_values(self, field: str) -> List[Any]:
+        """metadata字段出现过的全部取值（不含缺失值）"""
+        with self._lock:
+            return [value for value in self._field_rows(field) if value is not None]
+
+    def _field_rows(self, field: str) -> Dict[Any, np.ndarray]:
+        """metadata字段的倒排表：取值 -> 行号（升序），首次按该字段过滤时构建，写入后失效"""
+        index = self._metadata_index.get(field)
+        if index is None:
+            groups: Dict[Any, List[int]] = {}
+            for row in range(self._size):
+                value = self._metadatas[row].get(field)
+                try:
+                    groups.setdefault(value, []).append(row)
+                except TypeError:
+                    continue  # 不可哈希的取值不参与字典过滤
+            index = {value: np.array(rows, dtype=np.int64) for value, rows in groups.items()}
+            self._metadata_index[field] = index
+        return index
+
+    def _filter_rows(self, filter: Optional[MetadataFilter]) -> Optional[np.ndarray]:
+        """
+        返回满足过滤条件的行号（升序），无过滤条件时返回None
+
+        字典条件通过metadata倒排表直接取出行号，不需要逐个文档判断；
+        多个字段之间为"且"，同一字段的多个取值之间为"或"。
+        """
+        if not filter:
+            return None
+        if callable(filter):
+            return np.array([row for row in range(self._size) if filter(self._document(row))], dtype=np.int64)
+
+        rows = None
+        for field, value in filter.items():
+            values = value if isinstance(value, (list, tuple, set, frozenset)) else (value,)
+            index = self._field_rows(field)
+            matched = [index[v] for v in values if v in index]
+            field_rows = np.unique(np.concatenate(matched)) if matched else np.empty(0, dtype=np.int64)
+            rows = field_rows if rows is None else np.intersect1d(rows, field_rows, assume_unique=True)
+        return rows
+
+    def _scores(self, queries: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """
+        (n_queries, n_rows) 打分：float32模式为精确内积，量化模式为量化域近似内积
+
+        rows 由少数几段连续行组成时（如按分区排列的文档按分区过滤），逐段在矩阵切片（视图）上打分，
+        不复制被选中的行。
+        """
+        if rows is None:
+            return self._score_block(queries, 0, self._size)
+        runs = contiguous_runs(rows, MAX_SLICED_RUNS)
+        if runs:
+            return np.concatenate([self._score_block(queries, start, stop) for start, stop in runs], axis=1)
+        if self.quantized:
+            return self._quantizer.scores(self._codes[rows], queries)
+        return queries @ self._matrix[rows].T
+
+    def _score_block(self, queries: np.ndarray, start: int, stop: int) -> np.ndarray:
+        """对第 [start, stop) 行打分"""
+        if self.quantized:
+            return self._quantizer.scores(self._codes[start:stop], queries)
+        return queries @ self._matrix[start:stop].T
+
+    def _top_k(self, query: np.ndarray, scores: np.ndarray, rows: Optional[np.ndarray],
+               k: int) -> List[Tuple[int, float]]:
+        """选出Top-K (行号, 分数)；量化模式下先取 k * rerank_factor 个候选，再读取精确向量重排序"""
+        if self.quantized:
+            candidates = top_k_indices(scores, k * self.rerank_factor)
+            candidate_rows = candidates if rows is None else rows[candidates]
+            exact = self._matrix[candidate_rows] @ query
+            return [(int(candidate_rows[i]), float(exact[i])) for i in top_k_indices(exact, k)]
+        top = top_k_indices(scores, k)
+        if rows is not None:
+            return [(int(rows[i]), float(scores[i])) for i in top]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[MetadataFilter] = None,
+                                               nprobe: Optional[int] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        按向量检索，返回 (文档, 余弦相似度)
+
+        Args:
+            embedding: 查询向量
+            k: 返回结果数
+            filter: 过滤条件（metadata字典或判断函数），指定时只对满足条件的文档做精确检索
+            nprobe: IVF检索时探查的簇数，默认使用构造时的设置
+        """
+        query = normalize_rows(np.asarray(embedding, dtype=np.float32).reshape(1, -1))[0]
+        with self._lock:
+            if self._size == 0:
+                return []
+            rows = self._filter_rows(filter)
+            if rows is None:
+                rows = self._candidate_rows(query, nprobe)
+            if rows is not None and not rows.size:
+                return []
+            scores = self._scores(query[None, :], rows)[0]
+            return [(self._document(row), score) for row, score in self._top_k(query, scores, rows, k)]
+
+    def batch_similarity_search_with_score_by_vectors(self, embeddings, k: int = 4
+                                                      ) -> List[List[Tuple[Document, float]]]:
+        """
+        批量按向量检索
+
+        所有查询合并为一次矩阵乘法 (n_docs, dim) x (dim, n_queries)；
+        使用IVF索引时逐个查询做近似检索。
+        """
+        queries = normalize_rows(np.atleast_2d(np.asarray(embeddings, dtype=np.float32)))
+        with self._lock:
+            if self._size == 0:
+                return [[] for _ in range(len(queries))]
+            if self._index is not None and self.build_index():
+                return [self.similarity_search_with_score_by_vector(query, k=k) for query in queries]
+            scores = self._scores(queries, None)  # (n_queries, n_docs)
+            return [
+                [(self._document(row), score) for row, score in self._top_k(query, row_scores, None, k)]
+                for query, row_scores in zip(queries, scores)
+            ]
+
+    def batch_similarity_search_with_score(self, queries: List[str], k: int = 4
+                                           ) -> List[List[Tuple[Document, float]]]:
+        """批量检索文本查询（查询向量一次性批量计算）"""
+        if not queries:
+            return []
+        return self.batch_similarity_search_with_score_by_vectors(
+            self.embedding.embed_documents(list(queries)), k=k
+        )
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        return self._cosine_relevance_score_fn
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(embedding=embedding)
+        store.add_texts(texts, metadatas=metadatas, **kwargs)
+        return store
@@ -1,55 +1,142 @@
 """
-测试向量相似度
+对比不同embedding后端：吞吐、延迟与相似度一致性
+
+对每个后端报告：
+- 加载耗时（创建模型并完成首次推理）
+- 批量吞吐（embed_documents，文本/秒）与单条查询延迟（embed_query，p50/p99）
+- 与基准后端的一致性：对应向量的平均余弦相似度（同一向量空间时才有意义）、Top-1匹配文档一致率
+- 问答匹配准确率：每个问题的最相似文档是否为对应答案
+
+用法:
+    python test_embedding.py
+    python test_embedding.py --backends huggingface int8 onnx hashing --reference huggingface
 """
-from core.config import embeddings
+import argparse
+import time
+
+import numpy as np
+
+from core.config import EMBEDDING_MODEL_NAME, EMBEDDING_ONNX_FILE
+from core.embedding_backends import available_backends, create_embeddings
 
-# 测试问题
+# 测试问题与对应的知识库片段（第i个问题应匹配第i个片段）
 questions = [
     "如何申请年假？",
     "如何报销差旅费？",
-    "如何采购物品？"
+    "如何采购物品？",
+    "VPN连不上怎么办？",
+    "新员工入职要准备哪些材料？",
+    "合同审批需要经过哪些部门？",
+    "忘记邮箱密码怎么重置？",
+    "加班可以申请调休吗？",
 ]
 
-# 知识库片段
 docs = [
-    "问：如何申请年假？答：年假申请流程...",
-    "问：如何报销差旅费？答：差旅费报销流程...",
-    "问：如何发起采购申请？答：采购申请流程..."
+    "问：如何申请年假？答：年假申请流程：登录OA系统提交休假申请，直属上级审批后生效。",
+    "问：如何报销差旅费？答：差旅费报销流程：出差结束后15天内提交报销单并附上发票。",
+    "问：如何发起采购申请？答：采购申请流程：在采购系统填写需求，部门负责人审批后由采购部执行。",
+    "问：VPN无法连接怎么处理？答：请先检查网络，重新安装VPN客户端，仍无法连接请联系IT服务台。",
+    "问：新员工入职需要准备什么？答：请携带身份证、学历证明、离职证明和一寸照片到人力资源部报到。",
+    "问：合同审批流程是什么？答：合同需经业务部门、法务部和财务部依次审批后方可签署。",
+    "问：邮箱密码忘了怎么办？答：可在自助服务门户通过手机验证码重置邮箱密码。",
+    "问：加班后能调休吗？答：工作日加班可申请等时长调休，需在三个月内使用。",
 ]
 
-print("=" * 60)
-print("测试Embedding模型对中文的理解")
-print("=" * 60)
 
-# 生成embeddings
-question_embeddings = embeddings.embed_documents(questions)
-doc_embeddings = embeddings.embed_documents(docs)
+def percentile_ms(samples, q):
+    return float(np.percentile(np.array(samples) * 1000, q))
+
+
+def evaluate(backend: str, model_name: str, repeats: int):
+    """返回该后端的指标与向量；后端不可用时返回 None"""
+    start = time.perf_counter()
+    try:
+        embeddings = create_embeddings(backend, model_name, onnx_file=EMBEDDING_ONNX_FILE)
+        embeddings.embed_query(questions[0])
+    except Exception as e:
+        print(f"⚠️ 跳过 {backend}: {e}")
+        return None
+    load_s = time.perf_counter() - start
+
+    # 批量吞吐
+    batch = docs * repeats
+    start = time.perf_counter()
+    embeddings.embed_documents(batch)
+    throughput = len(batch) / (time.perf_counter() - start)
+
+    # 单条查询延迟
+    latencies = []
+    for _ in range(repeats):
+        for question in questions:
+            start = time.perf_counter()
+            embeddings.embed_query(question)
+            latencies.append(time.perf_counter() - start)
+
+    question_vectors = np.array(embeddings.embed_documents(questions), dtype=np.float32)
+    doc_vectors = np.array(embeddings.embed_documents(docs), dtype=np.float32)
+    return {
+        "load_s": load_s,
+        "throughput": throughput,
+        "p50_ms": percentile_ms(latencies, 50),
+        "p99_ms": percentile_ms(latencies, 99),
+        "questions": question_vectors,
+        "docs": doc_vectors,
+        "top1": (question_vectors @ doc_vectors.T).argmax(axis=1),
+    }
+
+
+def mean_cosine(a: np.ndarray, b: np.ndarray):
+    """对应向量的平均余弦相似度；维度不同时返回 None"""
+    if a.shape != b.shape:
+        return None
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return float(np.mean(np.sum(a * b, axis=1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比不同embedding后端")
+    parser.add_argument("--backends", nargs="+", default=available_backends(), help="要对比的后端")
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME, help="embedding模型")
+    parser.add_argument("--reference", default=None, help="一致性对比的基准后端（默认为第一个可用后端）")
+    parser.add_argument("--repeats", type=int, default=8, help="吞吐与延迟测试的重复轮数")
+    args = parser.parse_args()
+
+    results = {}
+    for backend in args.backends:
+        print(f"正在测试 {backend} ...")
+        result = evaluate(backend, args.model, args.repeats)
+        if result is not None:
+            results[backend] = result
+
+    if not results:
+        print("没有可用的后端")
+        return
+
+    reference = args.reference if args.reference in results else next(iter(results))
+    ref = results[reference]
+    expected = np.arange(len(questions))
+
+    print("\n" + "=" * 100)
+    print(f"Embedding后端对比（模型: {args.model}，一致性基准: {reference}）")
+    print("=" * 100)
+    print(f"{'后端':<12} | {'加载(s)':>8} | {'批量(文本/秒)':>13} | {'查询p50/p99(ms)':>16} | "
+          f"{'向量余弦':>8} | {'Top-1一致':>9} | {'问答准确率':>10}")
+    print("-" * 100)
+    for backend, result in results.items():
+        both = np.vstack([result["questions"], result["docs"]])
+        ref_both = np.vstack([ref["questions"], ref["docs"]])
+        cosine = mean_cosine(both, ref_both)
+        cosine_str = f"{cosine:8.4f}" if cosine is not None else f"{'-':>8}"
+        agreement = float(np.mean(result["top1"] == ref["top1"]))
+        accuracy = float(np.mean(result["top1"] == expected))
+        print(f"{backend:<12} | {result['load_s']:8.2f} | {result['throughput']:13.1f} | "
+              f"{result['p50_ms']:7.2f}/{result['p99_ms']:<8.2f} | {cosine_str} | "
+              f"{agreement:9.0%} | {accuracy:10.0%}")
+    print("=" * 100)
+    print("说明：向量余弦只在同一向量空间（同一模型的不同推理后端）之间有意义；")
+    print("hashing 后端只反映字面重合度，用于离线测试，不代表语义检索效果。")
 
-# 计算相似度 (余弦相似度)
-import numpy as np
 
-def cosine_similarity(a, b):
-    return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-
-print("\n相似度矩阵（行=问题，列=文档）：")
-print("           年假    差旅费   采购")
-for i, q in enumerate(questions):
-    print(f"\n{q}")
-    similarities = []
-    for j, d in enumerate(doc_embeddings):
-        sim = cosine_similarity(question_embeddings[i], d)
-        similarities.append(sim)
-
-    for j, sim in enumerate(similarities):
-        doc_name = ["年假", "差旅费", "采购"][j]
-        print(f"  与{doc_name}: {sim:.4f} {'✅' if sim > 0.7 else '❌'}")
-
-    # 最相似的文档
-    max_idx = np.argmax(similarities)
-    print(f"  → 最匹配: {['年假', '差旅费', '采购'][max_idx]} (相似度: {similarities[max_idx]:.4f})")
-
-print("\n" + "=" * 60)
-print("结论：")
-print("如果'如何报销差旅费'没有匹配到'差旅费'文档，")
-print("说明英文embedding模型对中文的语义理解不够好。")
-print("=" * 60)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+推测执行检索与按意图分区检索的组合测试
+
+推测执行模式下预检索与意图识别并行，检索的是全部分区；意图确定后检索节点只能采用
+意图对应分区内的文档，包含其他分区文档的预检索结果应被丢弃并按分区重新检索。
+
+使用 hashing 后端（不加载模型）、不读写索引包、关闭FAQ直接回答，只验证检索节点的行为。
+
+用法:
+    python test_speculative_partitions.py
+"""
+import asyncio
+import os
+
+os.environ["EMBEDDING_BACKEND"] = "hashing"
+os.environ["INDEX_BUNDLE_ENABLED"] = "false"
+os.environ["INDEX_BUNDLE_AUTO_SAVE"] = "false"
+os.environ["FAQ_FAST_PATH_ENABLED"] = "false"
+os.environ["PARTITIONED_RETRIEVAL"] = "true"
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+from core.knowledge_base import PARTITION_FIELD, knowledge_base  # noqa: E402
+from core.nodes import (  # noqa: E402
+    INTENT_PARTITIONS, aknowledge_retrieval_node, knowledge_retrieval_node,
+    speculation_stats, speculative_retrieval_node
+)
+
+QUERY = "差旅费报销需要提供哪些票据？"
+INTENT = "finance_inquiry"
+PARTITION = INTENT_PARTITIONS[INTENT][0]
+
+
+def make_state(docs, intent=INTENT):
+    return {
+        "messages": [HumanMessage(content=QUERY)],
+        "intent": intent,
+        "retrieved_docs": docs,
+    }
+
+
+def sections(docs):
+    return [(doc.metadata or {}).get(PARTITION_FIELD) for doc in docs]
+
+
+def discarded():
+    return speculation_stats.stats()["discarded"].get("partition", 0)
+
+
+def test_cross_partition_docs_discarded():
+    """预检索结果包含其他分区的文档：丢弃并按分区重新检索"""
+    speculative = knowledge_base.search(QUERY, k=3, filter={PARTITION_FIELD: ["人力资源"]})
+    assert speculative and PARTITION not in sections(speculative)
+
+    before = discarded()
+    result = knowledge_retrieval_node(make_state(speculative))
+    docs = result["retrieved_docs"]
+    assert docs, "按分区重新检索应有结果"
+    assert set(sections(docs)) == {PARTITION}, sections(docs)
+    assert discarded() == before + 1
+    print(f"✓ 跨分区预检索结果被丢弃，重新检索得到 {sections(docs)}")
+
+
+def test_async_cross_partition_docs_discarded():
+    """异步检索节点的行为一致"""
+    speculative = knowledge_base.search(QUERY, k=3, filter={PARTITION_FIELD: ["IT办公"]})
+    before = discarded()
+    result = asyncio.run(aknowledge_retrieval_node(make_state(speculative)))
+    assert set(sections(result["retrieved_docs"])) == {PARTITION}
+    assert discarded() == before + 1
+    print("✓ 异步检索节点同样按分区重新检索")
+
+
+def test_in_partition_docs_reused():
+    """预检索结果都在意图分区内：直接采用"""
+    speculative = knowledge_base.search(QUERY, k=3, filter={PARTITION_FIELD: [PARTITION]})
+    used = speculation_stats.stats()["used"]
+    result = knowledge_retrieval_node(make_state(speculative))
+    assert result["retrieved_docs"] == speculative
+    assert speculation_stats.stats()["used"] == used + 1
+    print("✓ 分区内的预检索结果直接采用")
+
+
+def test_unpartitioned_intent_reuses_global_docs():
+    """意图不对应分区（general_inquiry）：全局预检索结果直接采用"""
+    speculative = speculative_retrieval_node(make_state(None))["retrieved_docs"]
+    result = knowledge_retrieval_node(make_state(speculative, intent="general_inquiry"))
+    assert result["retrieved_docs"] == speculative
+    print("✓ 不分区的意图直接采用全局预检索结果")
+
+
+if __name__ == "__main__":
+    assert knowledge_base.load_knowledge_base(), "知识库加载失败"
+    test_cross_partition_docs_discarded()
+    test_async_cross_partition_docs_discarded()
+    test_in_partition_docs_reused()
+    test_unpartitioned_intent_reuses_global_docs()
+    print("丢弃的预检索结果:", speculation_stats.stats()["discarded"])